@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Documents and timing helpers shared by the benchmark scripts.
+
+The scripts are run from a checkout, e.g. ``python benchmarks/provn_parse.py``,
+and measure process time, i.e. the CPU time of the calling process.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import datetime
+import gc
+import os
+import resource
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+# The models still compare integers with "is".
+warnings.simplefilter('ignore', SyntaxWarning)
+
+from prov.model import Literal
+from voprov.models.model import VOProvDocument
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+
+def best_time(function, repeat=3):
+    """
+    Returns the best process time of several calls of a function and the
+    result of the last call.
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.process_time()
+        result = function()
+        times.append(time.process_time() - start)
+    return min(times), result
+
+
+def max_rss():
+    """Returns the peak resident memory of the process, in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def rich_document(steps, compact=False):
+    """
+    Returns a document using the VOProv descriptions and configurations, with
+    ``steps`` entities used by an activity, each deriving a value entity.
+    """
+    document = VOProvDocument(compact=compact)
+    document.add_namespace('ex', 'http://example.org/')
+    activity_description = document.activityDescription('ex:ad', 'calibrate', version='1.0', type='Calibration')
+    activity = document.activity('ex:act', startTime='2020-01-01T00:00:00', endTime=datetime.datetime(2020, 1, 2),
+                                 name='Calibration', activityDescription=activity_description)
+    agent = document.agent('ex:ag', name='bob', email='bob@example.org')
+    usage_description = document.usageDescription('ex:ud', activity_description, 'input', multiplicity=2)
+    generation_description = document.generationDescription('ex:gd', activity_description, 'output')
+    value_description = document.valueDescription('ex:vd', 'threshold', 'xsd:int')
+    parameter_description = document.parameterDescription('ex:pd', activity_description, 'gain', 'float',
+                                                          unit='e/ADU', min=0, max=10.5)
+    parameter = document.parameter('ex:p', 'gain', 3.5, parameterDescription=parameter_description)
+    document.configuration(activity, parameter)
+    for i in range(steps):
+        entity = document.entity('ex:raw%d' % i, name='raw %d' % i, location='/data/raw%d.fits' % i,
+                                 other_attributes={
+                                     'ex:size': i,
+                                     'ex:valid': True,
+                                     'ex:ratio': 1.5,
+                                     'ex:caption': Literal('image', langtag='en'),
+                                     'ex:observed': datetime.datetime(2020, 3, 4, 5, 6, i % 60),
+                                     'ex:source': document.valid_qualified_name('ex:telescope'),
+                                 })
+        document.used(activity, entity, role='input', time='2020-01-01T00:00:01', usageDescription=usage_description)
+        value = document.valueEntity('ex:value%d' % i, 42 + i, name='threshold', valueDescription=value_description)
+        document.wasGeneratedBy(value, activity, role='output', generationDescription=generation_description)
+        document.wasDerivedFrom(value, entity, activity)
+    document.wasAssociatedWith(activity, agent, role='operator')
+    return document
+
+
+def plain_document(steps, compact=False):
+    """
+    Returns a document of PROV records only: ``steps`` entities used by an
+    activity, each generating and deriving another entity.
+    """
+    document = VOProvDocument(compact=compact)
+    document.add_namespace('ex', 'http://example.org/')
+    activity = document.activity('ex:act', startTime='2020-01-01T00:00:00', endTime='2020-01-02T00:00:00')
+    for i in range(steps):
+        entity = document.entity('ex:in%d' % i, other_attributes={'ex:size': i, 'prov:label': 'file %d' % i,
+                                                                   'ex:ratio': 1.5})
+        document.used(activity, entity, time='2020-01-01T00:00:01')
+        output = document.entity('ex:out%d' % i)
+        document.wasGeneratedBy(output, activity)
+        document.wasDerivedFrom(output, entity)
+    return document
+
+
+def pipeline_document(records, compact=False):
+    """
+    Returns a document of about ``records`` records: entities, their usage by
+    an activity, the generation of other entities and activities.
+    """
+    document = VOProvDocument(compact=compact)
+    document.add_namespace('ex', 'http://example.org/')
+    activity = document.activity('ex:act', name='A', startTime=datetime.datetime(2020, 1, 1))
+    for i in range(records // 4):
+        entity = document.entity('ex:e%d' % i, name='e')
+        document.used(activity, entity, role='input', time=datetime.datetime(2020, 1, 2))
+        document.wasGeneratedBy('ex:out%d' % i, activity)
+        document.activity('ex:act%d' % i, startTime=datetime.datetime(2020, 1, 1),
+                          endTime=datetime.datetime(2020, 1, 2))
+    return document
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Memory per record of the default and compact modes of VOProvDocument, traced
+with tracemalloc, and the cost of a record having many other attributes.
+
+Usage: python benchmarks/compact_memory.py [steps] [attributes]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import sys
+import tracemalloc
+
+from common import best_time
+from voprov.models.model import VOProvDocument
+
+
+def steps_document(steps, compact):
+    document = VOProvDocument(compact=compact)
+    document.add_namespace('ex', 'http://example.org/')
+    activity = document.activity('ex:act', startTime='2020-01-01T00:00:00', name='A')
+    for i in range(steps):
+        entity = document.entity('ex:e%d' % i, name='n%d' % i, location='/data/%d' % i)
+        document.used(activity, entity, role='input')
+        document.wasGeneratedBy('ex:out%d' % i, activity)
+    return document
+
+
+def wide_entity(attributes, compact):
+    document = VOProvDocument(compact=compact)
+    document.add_namespace('ex', 'http://example.org/')
+    return document.entity('ex:e', other_attributes=dict(('ex:a%d' % i, i) for i in range(attributes)))
+
+
+def main(steps=20000, attributes=8000):
+    outputs = []
+    for compact in (False, True):
+        tracemalloc.start()
+        document = steps_document(steps, compact)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print('compact=%s: %d bytes per record (%d records)' % (compact, size / len(document._records),
+                                                              len(document._records)))
+        outputs.append((document.get_provn(), document.serialize(format='xml'), document.serialize(format='json')))
+        del document
+    print('same output: %s' % (outputs[0] == outputs[1]))
+    for compact in (False, True):
+        seconds, _ = best_time(lambda: wide_entity(attributes, compact), 1)
+        print('compact=%s: entity with %d other attributes %.2f s' % (compact, attributes, seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Process time and peak memory above the document of the graph of a document:
+to_csr() and to_scipy() against prov_to_graph(), the NetworkX graph. The
+document is a chain of activities, each using an entity, generating the next
+one and associated with one of 100 agents. Each measurement runs in its own
+process, the peak memory of a process never decreasing.
+
+Usage: python benchmarks/csr.py [steps]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import gc
+import subprocess
+import sys
+import time
+
+from common import max_rss
+from voprov.models.model import VOProvDocument
+
+
+def chain_document(steps):
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    for i in range(steps):
+        activity = 'ex:act%d' % i
+        document.activity(activity)
+        document.entity('ex:e%d' % (i + 1))
+        document.used(activity, 'ex:e%d' % i)
+        document.wasGeneratedBy('ex:e%d' % (i + 1), activity)
+        document.wasAssociatedWith(activity, 'ex:agent%d' % (i % 100))
+    return document
+
+
+def measure(steps, mode):
+    # The modules are imported before the measurement.
+    import scipy.sparse
+    from voprov.visualization.graph import prov_to_graph
+    document = chain_document(steps)
+    gc.collect()
+    base = max_rss()
+    start = time.process_time()
+    if mode == 'csr':
+        matrix = document.to_csr().to_scipy()
+        nodes, edges = matrix.shape[0], matrix.nnz
+    else:
+        graph = prov_to_graph(document)
+        nodes, edges = graph.number_of_nodes(), graph.number_of_edges()
+    print('%s, %d records: %d nodes, %d edges, %.1f s, peak extra memory %d MB'
+          % (mode, len(document._records), nodes, edges, time.process_time() - start, max_rss() - base))
+
+
+def main(steps=333333):
+    for mode in ('csr', 'networkx'):
+        subprocess.check_call([sys.executable, __file__, str(steps), mode])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(int(sys.argv[1]), sys.argv[2])
+    else:
+        main(*[int(arg) for arg in sys.argv[1:]])
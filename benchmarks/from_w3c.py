@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Process time of VOProvDocument.from_w3c() on the W3C PROV conversion of
+documents of entities, usages, generations and activities, against the
+records being re-created one by one through new_record().
+
+Usage: python benchmarks/from_w3c.py [records ...]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import sys
+
+from common import best_time, pipeline_document
+from prov.model import PROV_TYPE
+from voprov.models.model import W3C_REC_TYPES, VOProvDocument
+
+
+def by_hand(w3c_document):
+    """
+    Re-creates each record with new_record(), its VOProv type being given by
+    its asserted voprov type and its formal attributes renamed by local part.
+    """
+    document = VOProvDocument()
+    for namespace in w3c_document.namespaces:
+        document.add_namespace(namespace)
+    for record in w3c_document._records:
+        rec_type = record.get_type()
+        vo_type = [W3C_REC_TYPES[rec_type, value] for value in record._attributes.get(PROV_TYPE, ())
+                   if (rec_type, value) in W3C_REC_TYPES][0]
+        formal = dict((attr.localpart, attr) for attr in document._record_class(vo_type).FORMAL_ATTRIBUTES or ())
+        attributes = [(formal[attr.localpart] if attr.namespace.prefix == 'prov' and attr.localpart in formal
+                       else attr, value)
+                      for attr, value in record.attributes if not (attr == PROV_TYPE and value == vo_type)]
+        document.new_record(vo_type, record.identifier, attributes)
+    return document
+
+
+def main(*sizes):
+    for size in sizes or (100000, 1000000):
+        w3c_document = pipeline_document(size).get_w3c()
+        seconds, document = best_time(lambda: VOProvDocument.from_w3c(w3c_document), 1)
+        by_hand_seconds, _ = best_time(lambda: by_hand(w3c_document), 1)
+        print('%d records: from_w3c %.1f s, new_record %.1f s'
+              % (len(document._records), seconds, by_hand_seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Process time of the lineage queries: building the lineage index, then
+ancestors() and descendants() on a deep chain of activities and on a wide
+fan of activities using the same raw file, against one hop of a scan of the
+records, i.e. the lookup of the relations of a single element.
+
+Usage: python benchmarks/lineage.py [deep steps] [wide steps]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import sys
+import time
+
+from common import best_time
+from voprov.models.model import VOProvDocument
+from voprov.models.voprovLineage import LINEAGE_RELATION_TYPES
+
+
+def deep_document(steps):
+    """Returns a chain of ``steps`` activities, each using the entity generated by the previous one."""
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    for i in range(steps):
+        document.used('ex:act%d' % i, 'ex:e%d' % i)
+        document.wasGeneratedBy('ex:e%d' % (i + 1), 'ex:act%d' % i)
+    return document, 'ex:e%d' % steps, 'ex:e0'
+
+
+def wide_document(steps):
+    """Returns ``steps`` activities using the same raw file, each generating a product."""
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    for i in range(steps):
+        document.used('ex:act%d' % i, 'ex:raw')
+        document.wasGeneratedBy('ex:product%d' % i, 'ex:act%d' % i)
+    return document, 'ex:product7', 'ex:raw'
+
+
+def scan_hop(document, identifier):
+    """Returns the elements an element directly depends on, scanning every record."""
+    identifier = document.valid_qualified_name(identifier)
+    return [record.formal_attributes[1][1] for record in document.get_records()
+            if record.get_type() in LINEAGE_RELATION_TYPES and record.formal_attributes[0][1] == identifier]
+
+
+def measure(name, document, product, raw):
+    start = time.process_time()
+    document.lineage()
+    build = time.process_time() - start
+    ancestors_seconds, ancestors = best_time(lambda: document.ancestors(product))
+    descendants_seconds, descendants = best_time(lambda: document.descendants(raw))
+    scan_seconds, _ = best_time(lambda: scan_hop(document, product))
+    print('%s, %d records: build %.2f s, %d ancestors %.4f s, %d descendants %.4f s, one scan hop %.3f s'
+          % (name, len(document._records), build, len(ancestors), ancestors_seconds, len(descendants),
+             descendants_seconds, scan_seconds))
+
+
+def main(deep=10000, wide=100000):
+    measure('deep', *deep_document(deep))
+    measure('wide', *wide_document(wide))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Writing and reading PROV-JSON with prov's serializer and with
+VOProvJSONSerializer, with the json and orjson backends. The peak memory of
+the writers, beyond their output, is traced with tracemalloc.
+
+Usage: python benchmarks/provjson.py [steps]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import sys
+import tracemalloc
+
+from prov.serializers.provjson import ProvJSONSerializer
+from common import best_time, plain_document, rich_document
+from voprov.serializers.provjson import VOProvJSONSerializer
+
+
+def write_peak(write):
+    stream = io.BytesIO()
+    tracemalloc.start()
+    write(stream)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (peak - len(stream.getvalue())) / 1e6
+
+
+def main(steps=20000):
+    for name, document in (('plain', plain_document(steps)), ('rich', rich_document(steps))):
+        print('%s document, %d records' % (name, len(document._records)))
+        writers = [('prov', lambda stream: ProvJSONSerializer(document).serialize(stream)),
+                   ('voprov json', lambda stream: VOProvJSONSerializer(document).serialize(stream))]
+        try:
+            import orjson
+            writers.append(('voprov orjson',
+                            lambda stream: VOProvJSONSerializer(document).serialize(stream, backend='orjson')))
+        except ImportError:
+            pass
+        for label, write in writers:
+            seconds, _ = best_time(lambda: write(io.BytesIO()))
+            print('  write %-13s %.1f s, peak extra memory %.0f MB' % (label, seconds, write_peak(write)))
+
+        stream = io.BytesIO()
+        ProvJSONSerializer(document).serialize(stream)
+        data = stream.getvalue()
+        for label, serializer in (('prov', ProvJSONSerializer), ('voprov', VOProvJSONSerializer)):
+            try:
+                seconds, _ = best_time(lambda: serializer().deserialize(io.BytesIO(data)), 1)
+                print('  read  %-13s %.1f s' % (label, seconds))
+            except Exception as error:
+                print('  read  %-13s fails (%s)' % (label, error.__class__.__name__))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the PROV-N parser, VOProvNSerializer.deserialize, on a document
+using the VOProv descriptions (6 records per step).
+
+Usage: python benchmarks/provn_parse.py [steps]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import sys
+
+from common import best_time, rich_document
+from voprov.models.model import VOProvDocument
+
+
+def main(steps=20000):
+    document = rich_document(steps)
+    text = document.get_provn()
+    size = len(text.encode('utf-8')) / 1e6
+    records = len(document._records)
+    print('%.1f MB, %d records' % (size, records))
+    seconds, parsed = best_time(lambda: VOProvDocument.deserialize(io.StringIO(text), format='provn'), 1)
+    assert parsed.get_provn() == text
+    print('parse %.1f s, %.2f MB/s, %d records/s' % (seconds, size / seconds, records / seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
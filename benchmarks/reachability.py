@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Process time of the reachability index: building it, 100k depends_on()
+queries between random elements against searches of the ancestors, saving
+and loading it, and 2000 relations appended once it is built. The documents
+are a chain of activities, activities using the same raw file, and layers of
+activities each using two random earlier entities.
+
+Usage: python benchmarks/reachability.py [deep steps] [wide steps] [layered steps]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import random
+import sys
+import time
+
+from common import best_time
+from voprov.models.model import VOProvDocument
+
+QUERIES = 100000
+ANCESTORS_QUERIES = 200
+
+
+def new_document():
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    return document
+
+
+def deep_document(steps, rng):
+    document = new_document()
+    for i in range(steps):
+        document.used('ex:act%d' % i, 'ex:e%d' % i)
+        document.wasGeneratedBy('ex:e%d' % (i + 1), 'ex:act%d' % i)
+    pairs = [('ex:e%d' % rng.randint(0, steps), 'ex:e%d' % rng.randint(0, steps)) for _ in range(QUERIES)]
+    return document, pairs
+
+
+def wide_document(steps, rng):
+    document = new_document()
+    for i in range(steps):
+        document.used('ex:act%d' % i, 'ex:raw')
+        document.wasGeneratedBy('ex:product%d' % i, 'ex:act%d' % i)
+    pairs = [('ex:product%d' % rng.randrange(steps), rng.choice(['ex:raw', 'ex:act%d' % rng.randrange(steps)]))
+             for _ in range(QUERIES)]
+    return document, pairs
+
+
+def layered_document(steps, rng):
+    document = new_document()
+    for i in range(steps):
+        for _ in range(2):
+            document.used('ex:act%d' % i, 'ex:e%d' % rng.randrange(max(i, 1)))
+        document.wasGeneratedBy('ex:e%d' % i, 'ex:act%d' % i)
+    pairs = [('ex:e%d' % rng.randrange(steps), 'ex:e%d' % rng.randrange(steps)) for _ in range(QUERIES)]
+    return document, pairs
+
+
+def measure(name, document, pairs, steps, rng):
+    pairs = [(document.valid_qualified_name(identifier), document.valid_qualified_name(ancestor))
+             for identifier, ancestor in pairs]
+    start = time.process_time()
+    document.lineage()
+    lineage_seconds = time.process_time() - start
+    start = time.process_time()
+    document.reachability().build()
+    index_seconds = time.process_time() - start
+    print('%s, %d records: lineage %.2f s, index %.2f s'
+          % (name, len(document._records), lineage_seconds, index_seconds))
+
+    seconds, found = best_time(lambda: sum(document.depends_on(identifier, ancestor)
+                                           for identifier, ancestor in pairs))
+    ancestors_seconds, _ = best_time(lambda: [ancestor in document.ancestors(identifier)
+                                              for identifier, ancestor in pairs[:ANCESTORS_QUERIES]], 1)
+    print('  %d depends_on: %.2f s (%.1f us each, %d true); %d ancestors searches: %.2f s'
+          % (len(pairs), seconds, seconds * 1e6 / len(pairs), found, ANCESTORS_QUERIES, ancestors_seconds))
+
+    stream = io.BytesIO()
+    start = time.process_time()
+    document.reachability().save(stream)
+    save_seconds = time.process_time() - start
+    stream.seek(0)
+    start = time.process_time()
+    document.load_reachability(stream)
+    load_seconds = time.process_time() - start
+    print('  save %.2f s, load %.2f s, %.1f MB' % (save_seconds, load_seconds, len(stream.getvalue()) / 1e6))
+
+    start = time.process_time()
+    for i in range(1000):
+        document.wasGeneratedBy('ex:new%d' % i, 'ex:act%d' % rng.randrange(steps))
+        document.used('ex:next%d' % i, 'ex:new%d' % i)
+    print('  2000 appends: %.3f s' % (time.process_time() - start))
+
+
+def main(deep=10000, wide=100000, layered=100000):
+    rng = random.Random(0)
+    for name, build, steps in [('deep', deep_document, deep), ('wide', wide_document, wide),
+                               ('layered', layered_document, layered)]:
+        document, pairs = build(steps, rng)
+        measure(name, document, pairs, steps, rng)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of VOProvBundle.unified_relations() on documents of N usages, half of
+them duplicated.
+
+Usage: python benchmarks/unified_relations.py [N ...]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import sys
+
+from common import best_time
+from voprov.models.model import VOProvDocument
+
+
+def usages_document(size):
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    activity = document.activity('ex:act')
+    for i in range(size):
+        document.used(activity, 'ex:e%d' % (i % (size // 2)))
+    return document
+
+
+def main(*sizes):
+    for size in sizes or (10000, 20000, 40000):
+        document = usages_document(size)
+        seconds, _ = best_time(document.unified_relations, 1)
+        print('N=%d: %.2f s, %d records left' % (size, seconds, len(document._records)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Size and loading time of the vobin encoding against the other formats.
+
+Usage: python benchmarks/vobin.py [steps]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import sys
+
+from common import best_time, plain_document, rich_document
+from voprov.models.model import VOProvDocument
+
+
+def main(steps=20000):
+    for name, document in (('plain', plain_document(steps)), ('rich', rich_document(steps))):
+        print('%s document, %d records' % (name, len(document._records)))
+        for format in ('json', 'xml', 'provn', 'vobin'):
+            data = document.serialize(format=format)
+            if not isinstance(data, bytes):
+                data = data.encode('utf-8')
+            try:
+                seconds, _ = best_time(lambda: VOProvDocument.deserialize(content=data, format=format), 1)
+                load = '%.1f s' % seconds
+            except Exception as error:
+                load = 'fails (%s)' % error.__class__.__name__
+            print('  %-6s %5.1f MB, load %s' % (format, len(data) / 1e6, load))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
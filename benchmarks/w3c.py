@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+CPU time of get_w3c() on documents of entities, usages, generations and
+activities.
+
+Usage: python benchmarks/w3c.py [records ...]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import sys
+
+from common import best_time, pipeline_document
+
+
+def main(*sizes):
+    for size in sizes or (100000, 1000000):
+        document = pipeline_document(size)
+        seconds, converted = best_time(document.get_w3c, 1)
+        print('%d records: %.1f s' % (len(converted.records), seconds))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
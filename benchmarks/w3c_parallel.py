@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+CPU time of get_w3c() converting the bundles of a document serially and in
+worker processes. With workers, the time of the calling process bounds the
+wall time on as many cores as workers.
+
+Usage: python benchmarks/w3c_parallel.py [bundles] [records per bundle] [workers]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import resource
+import sys
+import time
+
+from common import best_time
+from voprov.models.model import VOProvDocument
+
+
+def bundles_document(bundles, records):
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    for b in range(bundles):
+        bundle = document.bundle('ex:bundle%d' % b)
+        activity = bundle.activity('ex:act%d' % b, startTime='2020-01-01T00:00:00')
+        for i in range(records // 3):
+            entity = bundle.entity('ex:e%d_%d' % (b, i), name='e')
+            bundle.used(activity, entity, role='input')
+            bundle.wasGeneratedBy('ex:out%d_%d' % (b, i), activity)
+    return document
+
+
+def children_time():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main(bundles=200, records=300, workers=2):
+    document = bundles_document(bundles, records)
+    serial, expected = best_time(document.get_w3c, 1)
+    print('serial conversion: %.1f s' % serial)
+    children = children_time()
+    start = time.time()
+    parallel, converted = best_time(lambda: document.get_w3c(workers=workers), 1)
+    print('%d workers: calling process %.1f s, workers %.1f s in total, wall %.1f s'
+          % (workers, parallel, children_time() - children, time.time() - start))
+    assert converted.get_provn() == expected.get_provn()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
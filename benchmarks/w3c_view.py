@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Serialization of a document in the W3C PROV formats through a copy, i.e.
+get_w3c(), and through w3c_view(): process time and peak memory above the
+document. Each measurement runs in its own process, the peak memory of a
+process never decreasing.
+
+Usage: python benchmarks/w3c_view.py [records]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import gc
+import os
+import subprocess
+import sys
+import time
+
+from common import max_rss, pipeline_document
+
+
+def resident():
+    """Returns the current resident memory of the process, in MB."""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf(str('SC_PAGE_SIZE')) // (1024 * 1024)
+
+
+def measure(records, format, mode):
+    document = pipeline_document(records)
+    gc.collect()
+    base = resident()
+    start = time.process_time()
+    with open(os.devnull, 'w') as stream:
+        converted = document.get_w3c() if mode == 'copy' else document.w3c_view()
+        converted.serialize(stream, format=format)
+    print('%s %s: %.1f s, peak extra memory %d MB' % (format, mode, time.process_time() - start, max_rss() - base))
+
+
+def main(records=100000):
+    for format in ('provn', 'json', 'xml'):
+        for mode in ('copy', 'view'):
+            subprocess.check_call([sys.executable, __file__, str(records), format, mode])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4:
+        measure(int(sys.argv[1]), sys.argv[2], sys.argv[3])
+    else:
+        main(*[int(arg) for arg in sys.argv[1:]])
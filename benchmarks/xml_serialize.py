@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of VOProvXMLSerializer: the conversion of the records to the description
+of their elements, and the whole tree and streaming serializations.
+
+Usage: python benchmarks/xml_serialize.py [steps]
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import sys
+
+from common import best_time, plain_document, rich_document
+from voprov.serializers.xml import VOProvXMLSerializer
+
+
+def convert(document):
+    serializer = VOProvXMLSerializer(document)
+    return [serializer._record_elements(record) for record in document._records]
+
+
+def main(steps=20000):
+    for name, document in (('rich', rich_document(steps)), ('plain', plain_document(steps))):
+        print('%s document, %d records' % (name, len(document._records)))
+        for label, function in (
+                ('conversion', lambda: convert(document)),
+                ('tree', lambda: VOProvXMLSerializer(document).serialize(io.BytesIO())),
+                ('streaming', lambda: VOProvXMLSerializer(document).serialize(io.BytesIO(), streaming=True))):
+            print('  %-10s %.1f s' % (label, best_time(function)[0]))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
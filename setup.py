@@ -15,7 +15,8 @@ requirements = [
 ]
 
 test_requirements = [
-    'pydot>=1.2.0'
+    'pydot>=1.2.0',
+    'pytest',
 ]
 
 setup(
@@ -32,6 +33,7 @@ setup(
     install_requires=requirements,
     extras_require={
         'dot': ['pydot>=1.2.0'],
+        'csr': ['numpy', 'scipy'],
     },
     license="MIT",
     zip_safe=False,
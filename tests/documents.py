@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import datetime
+
+from prov.model import PROV_ATTR_ENDTIME, PROV_ATTR_STARTTIME, PROV_ATTR_TIME, PROV_REC_CLS, Literal, ProvElement
+from voprov.models.constants import *
+from voprov.models.model import VOProvDocument
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+_TIMES = {PROV_ATTR_TIME, PROV_ATTR_STARTTIME, PROV_ATTR_ENDTIME,
+          VOPROV_ATTR_TIME, VOPROV_ATTR_STARTTIME, VOPROV_ATTR_ENDTIME}
+
+
+def sample_document(size=3, compact=False):
+    """
+    Returns a document using every VOProv record type of PROV-N, with ``size``
+    entities used and generated by an activity, typed attribute values, a
+    bundle and a relation having an identifier.
+    """
+    document = VOProvDocument(compact=compact)
+    document.add_namespace('ex', 'http://example.org/')
+
+    activity_description = document.activityDescription('ex:ad', 'calibrate', version='1.0', type='Calibration')
+    activity = document.activity('ex:act', startTime='2020-01-01T00:00:00', endTime=datetime.datetime(2020, 1, 2),
+                                 name='Calibration é', activityDescription=activity_description)
+    agent = document.agent('ex:ag', name='bob', email='bob@example.org')
+    usage_description = document.usageDescription('ex:ud', activity_description, 'input', multiplicity=2)
+    generation_description = document.generationDescription('ex:gd', activity_description, 'output')
+    document.entityDescription('ex:ed', 'image')
+    value_description = document.valueDescription('ex:vd', 'threshold', 'xsd:int')
+    document.datasetDescription('ex:dd', 'images', 'application/fits')
+    config_file_description = document.configFileDescription('ex:cfd', activity_description, 'config',
+                                                             'text/plain')
+    parameter_description = document.parameterDescription('ex:pd', activity_description, 'gain', 'float',
+                                                          unit='e/ADU', min=0, max=10.5)
+    config_file = document.configFile('ex:cf', 'config', '/etc/calibration.conf',
+                                      configFileDescription=config_file_description)
+    parameter = document.parameter('ex:p', 'gain', 3.5, parameterDescription=parameter_description)
+    document.configuration(activity, config_file, 'ConfigFile')
+    document.configuration(activity, parameter)
+
+    for i in range(size):
+        entity = document.entity('ex:raw%d' % i, name='raw %d' % i, location='/data/raw%d.fits' % i,
+                                 other_attributes={
+                                     'ex:size': i,
+                                     'ex:valid': True,
+                                     'ex:ratio': 1.5,
+                                     'ex:caption': Literal('image', langtag='en'),
+                                     'ex:observed': datetime.datetime(2020, 3, 4, 5, 6, i % 60),
+                                     'ex:source': document.valid_qualified_name('ex:telescope'),
+                                 })
+        document.used(activity, entity, role='input', time='2020-01-01T00:00:01', usageDescription=usage_description)
+        value = document.valueEntity('ex:value%d' % i, 42 + i, name='threshold', valueDescription=value_description)
+        document.wasGeneratedBy(value, activity, role='output', generationDescription=generation_description)
+        document.wasDerivedFrom(value, entity, activity)
+
+    dataset = document.datasetEntity('ex:ds', name='dataset')
+    document.description('ex:ds', 'ex:dd')
+    document.wasAssociatedWith(activity, agent, plan='ex:plan', role='operator')
+    document.wasAttributedTo(dataset, agent)
+    document.actedOnBehalfOf(agent, 'ex:boss')
+    document.wasInformedBy(activity, 'ex:previous', identifier='ex:informed')
+    document.wasStartedBy(activity, 'ex:trigger', time='2020-01-01T00:00:00')
+    document.wasEndedBy(activity, 'ex:trigger')
+    document.wasInvalidatedBy('ex:old', activity)
+    document.specializationOf('ex:raw0', 'ex:generic')
+    document.alternateOf('ex:raw0', 'ex:copy')
+    document.hadMember(dataset, 'ex:raw0')
+    document.wasInfluencedBy('ex:copy', 'ex:raw0')
+    document.mentionOf('ex:raw0', 'ex:copy', 'ex:bundle')
+    document.relate('ex:x', 'ex:y')
+    document.reference('ex:x', 'ex:y')
+    document.collection('ex:collection')
+    document.revision('ex:copy', 'ex:raw0')
+    document.quotation('ex:copy', 'ex:raw0')
+    document.primary_source('ex:copy', 'ex:raw0')
+
+    bundle = document.bundle('ex:bundle')
+    bundle.add_namespace('obs', 'http://observatory.example.org/')
+    bundle.entity('obs:frame', name='frame')
+    bundle.used('ex:act', 'obs:frame')
+    return document
+
+
+def all_types_document():
+    """
+    Returns a document having a record of each type of
+    :py:data:`prov.model.PROV_REC_CLS`, all its formal attributes being set.
+    """
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    for position, (rec_type, record_class) in enumerate(PROV_REC_CLS.items()):
+        attributes = []
+        for attr in record_class.FORMAL_ATTRIBUTES or ():
+            if attr in _TIMES:
+                value = datetime.datetime(2020, 1, 1, 0, 0, position % 60)
+            elif attr in PROV_ATTRIBUTE_QNAMES:
+                value = 'ex:%s%d' % (attr.localpart, position)
+            else:
+                value = '%s %d' % (attr.localpart, position)
+            attributes.append((attr, value))
+        attributes.append(('ex:position', position))
+        identifier = 'ex:record%d' % position if issubclass(record_class, ProvElement) else None
+        document.new_record(rec_type, identifier, attributes)
+    return document
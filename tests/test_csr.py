@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from collections import Counter
+
+import pytest
+
+from prov.identifier import QualifiedName
+from voprov.models.constants import *
+from voprov.models.model import VOProvDocument
+from tests.documents import all_types_document, sample_document
+
+# NumPy and SciPy are the csr extra.
+numpy = pytest.importorskip('numpy')
+
+
+def csr_edges(csr):
+    """Returns the edges of a graph as a counter of (source URI, target URI, relation type)."""
+    edges = Counter()
+    for node in range(len(csr.nodes)):
+        for edge in range(csr.indptr[node], csr.indptr[node + 1]):
+            edges[csr.nodes[node].uri, csr.nodes[csr.indices[edge]].uri,
+                  csr.relation_types[csr.edge_types[edge]]] += 1
+    return edges
+
+
+def record_edges(document, relation_types=None):
+    """
+    Returns the edges of the relations of a document and of its bundles, from the value of their first formal
+    attribute to the value of their second one.
+    """
+    edges = Counter()
+    for bundle in [document] + list(document.bundles):
+        for record in bundle.get_records():
+            if not record.is_relation() or (relation_types is not None and record.get_type() not in relation_types):
+                continue
+            values = [value for _, value in record.formal_attributes[:2]]
+            if len(values) == 2 and all(isinstance(value, QualifiedName) for value in values):
+                edges[values[0].uri, values[1].uri, record.get_type()] += 1
+    return edges
+
+
+def assert_valid(csr):
+    assert csr.indptr[0] == 0 and csr.indptr[-1] == len(csr.indices) == len(csr.edge_types)
+    assert len(csr.indptr) == len(csr.nodes) + 1
+    assert numpy.all(numpy.diff(csr.indptr) >= 0)
+    assert len(set(node.uri for node in csr.nodes)) == len(csr.nodes)
+    assert len(set(csr.relation_types)) == len(csr.relation_types)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_sample_document(compact):
+    document = sample_document(3, compact)
+    csr = document.to_csr()
+    assert_valid(csr)
+    assert csr_edges(csr) == record_edges(document)
+    # Every element is a node, whether or not it has relations.
+    for bundle in [document] + list(document.bundles):
+        for record in bundle.get_records():
+            if record.is_element():
+                assert csr.nodes[csr.node_index(record.identifier)].uri == record.identifier.uri
+    assert csr.node_index(document.valid_qualified_name('ex:unknown')) is None
+
+
+def test_all_types_document():
+    document = all_types_document()
+    csr = document.to_csr()
+    assert_valid(csr)
+    edges = record_edges(document)
+    assert csr_edges(csr) == edges
+    assert set(csr.relation_types) == set(rec_type for _, _, rec_type in edges)
+
+
+@pytest.mark.parametrize('relation_types', [
+    [VOPROV_USAGE],
+    [VOPROV_GENERATION, VOPROV_USAGE, VOPROV_GENERATION],
+    [VOPROV_ASSOCIATION, VOPROV_INVALIDATION],
+    [],
+])
+def test_relation_types(relation_types):
+    document = sample_document(3)
+    csr = document.to_csr(relation_types)
+    assert_valid(csr)
+    assert csr_edges(csr) == record_edges(document, relation_types)
+    # The types having edges, in the given order.
+    kept = []
+    for rec_type in relation_types:
+        if rec_type not in kept and document.records_of_type(rec_type):
+            kept.append(rec_type)
+    assert csr.relation_types == kept
+
+
+def test_bundles_sharing_identifiers():
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    document.entity('ex:raw')
+    document.used('ex:act', 'ex:raw')
+    first = document.bundle('ex:first')
+    first.entity('ex:raw')
+    first.wasGeneratedBy('ex:product', 'ex:act')
+    second = document.bundle('ex:second')
+    second.add_namespace('other', 'http://example.org/')
+    second.used('other:act', 'other:raw')
+    second.wasDerivedFrom('ex:product', 'ex:raw')
+
+    csr = document.to_csr()
+    assert_valid(csr)
+    assert sorted(node.uri for node in csr.nodes) == \
+        ['http://example.org/act', 'http://example.org/product', 'http://example.org/raw']
+    assert csr_edges(csr) == record_edges(document)
+    assert csr_edges(csr)['http://example.org/act', 'http://example.org/raw', VOPROV_USAGE] == 2
+
+
+def test_to_scipy():
+    pytest.importorskip('scipy')
+    document = sample_document(3)
+    csr = document.to_csr()
+    matrix = csr.to_scipy()
+    assert matrix.shape == (len(csr.nodes), len(csr.nodes))
+    expected = Counter()
+    for (source, target, _), count in record_edges(document).items():
+        expected[source, target] += count
+    rows, columns = matrix.nonzero()
+    assert dict(((csr.nodes[row].uri, csr.nodes[column].uri), matrix[row, column])
+                for row, column in zip(rows, columns)) == expected
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import pytest
+
+from prov.model import ProvException
+from voprov.models.constants import *
+from voprov.models.voprovMapped import VOProvMappedDocument
+from tests.documents import sample_document
+
+
+@pytest.fixture
+def document():
+    return sample_document(20)
+
+
+@pytest.fixture
+def path(document, tmp_path):
+    path = str(tmp_path / 'document.vobix')
+    document.serialize(path, format='vobix')
+    return path
+
+
+def test_same_document(document, path):
+    with VOProvMappedDocument(path) as mapped:
+        assert mapped.get_provn() == document.get_provn()
+        assert len(mapped.records_of_type(VOPROV_USAGE)) == len(document.records_of_type(VOPROV_USAGE))
+        assert mapped.get_record('ex:raw7') == document.get_record('ex:raw7')
+        assert mapped.get_record('ex:missing') == []
+
+
+def test_content(document):
+    data = document.serialize(format='vobix')
+    assert VOProvMappedDocument(data).get_provn() == document.get_provn()
+
+
+def test_cache_size(document, path):
+    with VOProvMappedDocument(path, cache_size=10) as mapped:
+        records = list(mapped.records)
+        assert len(records) == len(document.records)
+        assert len(mapped._cache) == 10
+        # The last records decoded are kept, the others are decoded again.
+        assert mapped._records[-1] is records[-1]
+        assert mapped._records[0] is not records[0]
+        assert mapped._records[0] == records[0]
+        assert len(mapped._cache) == 10
+
+
+def test_cache_disabled(path):
+    with VOProvMappedDocument(path, cache_size=0) as mapped:
+        assert mapped.get_record('ex:act')[0] is not mapped.get_record('ex:act')[0]
+        assert len(mapped._cache) == 0
+
+
+def test_least_recently_used(path):
+    with VOProvMappedDocument(path, cache_size=2) as mapped:
+        first, = mapped.get_record('ex:raw1')
+        second, = mapped.get_record('ex:raw2')
+        assert mapped.get_record('ex:raw1')[0] is first
+        mapped.get_record('ex:raw3')
+        # ex:raw2 was the least recently used record.
+        assert mapped.get_record('ex:raw1')[0] is first
+        assert mapped.get_record('ex:raw2')[0] is not second
+
+
+@pytest.mark.parametrize('change', [
+    lambda document: document.entity('ex:new'),
+    lambda document: document.add_namespace('new', 'http://new.example.org/'),
+    lambda document: document.set_default_namespace('http://new.example.org/'),
+    lambda document: document.add_record(list(document.records)[0]),
+    lambda document: document.add_bundle(list(document.bundles)[0]),
+    lambda document: document.update(sample_document(1)),
+    lambda document: document.unified_relations(),
+    lambda document: list(document.bundles)[0].entity('ex:new'),
+])
+def test_read_only(path, change):
+    with VOProvMappedDocument(path) as mapped:
+        records = len(mapped.records)
+        with pytest.raises(ProvException):
+            change(mapped)
+        assert len(mapped.records) == records
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+
+import pytest
+
+from prov.model import PROV_TYPE
+from voprov.models.constants import *
+from voprov.models.model import VOProvDocument
+from voprov.serializers.provn import PROVN_RECORD_IDS_MAP, PROVN_SUBTYPE_IDS_MAP, ProvNException
+from tests.documents import sample_document
+
+
+def parse(text):
+    return VOProvDocument.deserialize(content=text, format='provn')
+
+
+def assert_round_trip(document):
+    text = document.get_provn()
+    assert parse(text).get_provn() == text
+    assert VOProvDocument.deserialize(io.BytesIO(text.encode('utf-8')), format='provn').get_provn() == text
+
+
+@pytest.mark.parametrize('size', [0, 1, 3])
+@pytest.mark.parametrize('compact', [False, True])
+def test_round_trip(size, compact):
+    assert_round_trip(sample_document(size, compact))
+
+
+@pytest.mark.parametrize('name', sorted(PROVN_RECORD_IDS_MAP))
+def test_every_record_type(name):
+    rec_type = PROVN_RECORD_IDS_MAP[name]
+    document = sample_document(1)
+    if rec_type == VOPROV_BUNDLE:
+        assert list(document.bundles)
+    else:
+        assert document.records_of_type(rec_type)
+    parsed = parse(document.get_provn())
+    if rec_type == VOPROV_BUNDLE:
+        assert [b.identifier for b in parsed.bundles] == [b.identifier for b in document.bundles]
+    else:
+        assert len(parsed.records_of_type(rec_type)) == len(document.records_of_type(rec_type))
+
+
+@pytest.mark.parametrize('name', sorted(PROVN_SUBTYPE_IDS_MAP))
+def test_subtype_names(name):
+    rec_type, subtype = PROVN_SUBTYPE_IDS_MAP[name]
+    arguments = 'ex:a, ex:b, -, -, -' if rec_type == VOPROV_DERIVATION else 'ex:a'
+    document = parse('document\n  prefix ex <http://example.org/>\n  %s(%s)\nendDocument\n' % (name, arguments))
+    record, = document.records_of_type(rec_type)
+    assert list(record.get_attribute(PROV_TYPE)) == [subtype]
+    assert_round_trip(document)
+
+
+def test_default_namespace_and_identifiers():
+    document = VOProvDocument()
+    document.set_default_namespace('http://default.example.org/')
+    document.add_namespace('ex', 'http://example.org/')
+    document.entity('local', other_attributes={'ex:note': 'a, b]', 'ex:count': -3})
+    document.activity('ex:act', other_attributes={'prov:label': 'with (parens)'})
+    document.used('ex:act', 'local', identifier='ex:use')
+    document.wasDerivedFrom('ex:copy', 'local', identifier='ex:derivation')
+    bundle = document.bundle('ex:bundle')
+    bundle.set_default_namespace('http://bundle.example.org/')
+    bundle.entity('inner')
+    assert_round_trip(document)
+    parsed = parse(document.get_provn())
+    assert parsed.get_record('ex:use')[0].get_type() == VOPROV_USAGE
+    assert parsed.get_record('ex:derivation')[0].get_type() == VOPROV_DERIVATION
+
+
+def test_strings():
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    document.entity('ex:e', other_attributes={
+        'ex:lines': 'line 1\nline "2"\n',
+        'ex:escaped': 'back\\slash',
+        'ex:comment': '// not a comment /* either */',
+    })
+    assert_round_trip(document)
+
+    text = ('document\n'
+            '  prefix ex <http://example.org/>\n'
+            '  entity(ex:e, [ex:c="""first\n'
+            'second "quoted" """])\n'
+            'endDocument\n')
+    entity, = parse(text).records_of_type(VOPROV_ENTITY)
+    assert list(entity.get_attribute('ex:c')) == ['first\nsecond "quoted" ']
+
+
+def test_comments_and_multi_line_statements():
+    text = ('// header\n'
+            'document\n'
+            '  prefix ex <http://example.org/>  // the ex namespace\n'
+            '  /* block\n'
+            '     comment */\n'
+            '  wasGeneratedBy(ex:e,\n'
+            '      ex:a, 2020-01-01T00:00:00)\n'
+            'endDocument\n')
+    generation, = parse(text).records_of_type(VOPROV_GENERATION)
+    assert generation.get_provn() == 'wasGeneratedBy(ex:e, ex:a, 2020-01-01T00:00:00)'
+
+
+@pytest.mark.parametrize('text, line', [
+    ('document\n  prefix ex <http://example.org/>\n  foo(ex:a)\nendDocument\n', 3),
+    ('document\n  entity(zz:a)\nendDocument\n', 2),
+    ('document\n  prefix ex <http://example.org/>\n\n  entity(ex:a, [ex:b=])\nendDocument\n', 4),
+    ('document\n  prefix ex <http://example.org/>\n  entity(ex:a,\n    [ex:b=1]) x\nendDocument\n', 3),
+    ('document\n  prefix ex <http://example.org/>\n  entity(ex:a\n', 3),
+    ('entity(ex:a)\n', 1),
+    ('document\n  prefix ex <http://example.org/>\n  entity(ex:a)\n', 3),
+])
+def test_error_line(text, line):
+    with pytest.raises(ProvNException) as error:
+        parse(text)
+    assert str(error.value).startswith('line %d: ' % line)
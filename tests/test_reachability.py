@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import random
+from collections import defaultdict
+
+import pytest
+
+from prov.model import ProvException
+from voprov.models import voprovReachability
+from voprov.models.model import VOProvDocument
+
+NODES = ['ex:n%d' % i for i in range(30)]
+
+# Relations followed by the index, from the element depending on the other one.
+RELATIONS = ['used', 'wasGeneratedBy', 'wasDerivedFrom', 'wasInformedBy']
+
+
+def new_document():
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    return document
+
+
+def add_random_relations(bundle, edges, count, rng):
+    """Adds relations between random nodes to a bundle, and the edges followed by the index to ``edges``."""
+    for _ in range(count):
+        influenced, influencer = rng.choice(NODES), rng.choice(NODES)
+        name = rng.choice(RELATIONS + ['wasAttributedTo'])
+        getattr(bundle, name)(influenced, influencer)
+        if name != 'wasAttributedTo':
+            edges[influenced].add(influencer)
+
+
+def brute_force_ancestors(edges, node):
+    """Returns the nodes reached from a node by a breadth-first search of at least one edge."""
+    found = set()
+    frontier = [node]
+    while frontier:
+        following = []
+        for current in frontier:
+            for influencer in edges[current]:
+                if influencer not in found:
+                    found.add(influencer)
+                    following.append(influencer)
+        frontier = following
+    return found
+
+
+def assert_matches(document, edges, nodes=NODES):
+    for node in nodes:
+        ancestors = brute_force_ancestors(edges, node)
+        for other in nodes:
+            if other != node:
+                assert document.depends_on(node, other) == (other in ancestors), (node, other)
+
+
+@pytest.fixture(params=[voprovReachability.MAX_INTERVALS, 1, 2])
+def max_intervals(request, monkeypatch):
+    # Few intervals make most labels approximate, their queries searching the components depended on.
+    monkeypatch.setattr(voprovReachability, 'MAX_INTERVALS', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('count', [10, 40, 120])
+def test_random_graphs(seed, count, max_intervals):
+    rng = random.Random(seed)
+    document = new_document()
+    edges = defaultdict(set)
+    add_random_relations(document, edges, count, rng)
+    add_random_relations(document.bundle('ex:bundle'), edges, count // 4, rng)
+    assert_matches(document, edges)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_dags(seed, max_intervals):
+    # Without cycles, the elements are in components of their own, with long labels.
+    rng = random.Random(seed)
+    document = new_document()
+    edges = defaultdict(set)
+    nodes = ['ex:d%d' % i for i in range(80)]
+    for _ in range(160):
+        influencer, influenced = sorted(rng.sample(range(len(nodes)), 2))
+        getattr(document, rng.choice(RELATIONS))(nodes[influenced], nodes[influencer])
+        edges[nodes[influenced]].add(nodes[influencer])
+    assert_matches(document, edges, nodes)
+    assert sum(document.reachability()._approximate) or max_intervals > 2
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_adds(seed, max_intervals):
+    rng = random.Random(seed)
+    document = new_document()
+    edges = defaultdict(set)
+    add_random_relations(document, edges, 15, rng)
+    assert_matches(document, edges)
+    # The relations added after the index is built update it, or make it built again when they close a cycle.
+    for _ in range(8):
+        add_random_relations(document, edges, 5, rng)
+        assert_matches(document, edges)
+    bundle = new_document().bundle('ex:late')
+    add_random_relations(bundle, edges, 10, rng)
+    document.add_bundle(bundle)
+    assert_matches(document, edges)
+    add_random_relations(bundle, edges, 5, rng)
+    assert_matches(document, edges)
+
+
+def test_chain_and_unknown_elements():
+    document = new_document()
+    for i in range(100):
+        document.used('ex:act%d' % i, 'ex:e%d' % i)
+        document.wasGeneratedBy('ex:e%d' % (i + 1), 'ex:act%d' % i)
+    assert document.depends_on('ex:e100', 'ex:e0')
+    assert not document.depends_on('ex:e0', 'ex:e100')
+    assert not document.depends_on('ex:e5', 'ex:e5')
+    assert not document.depends_on('ex:e5', 'ex:unknown')
+    assert not document.depends_on('ex:unknown', 'ex:e5')
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_save_and_load(seed, max_intervals):
+    rng = random.Random(seed)
+    document = new_document()
+    edges = defaultdict(set)
+    add_random_relations(document, edges, 60, rng)
+    add_random_relations(document.bundle('ex:bundle'), edges, 15, rng)
+    stream = io.BytesIO()
+    document.reachability().save(stream)
+
+    document._reachability = None
+    stream.seek(0)
+    document.load_reachability(stream)
+    assert not document.reachability()._stale
+    assert_matches(document, edges)
+    # A loaded index is updated like a built one.
+    add_random_relations(document, edges, 10, rng)
+    assert_matches(document, edges)
+
+
+def test_save_and_load_file(tmpdir):
+    document = new_document()
+    edges = defaultdict(set)
+    add_random_relations(document, edges, 40, random.Random(0))
+    path = str(tmpdir.join('document.reach'))
+    document.reachability().save(path)
+    document._reachability = None
+    document.load_reachability(path)
+    assert_matches(document, edges)
+
+
+def test_load_checks_the_document():
+    document = new_document()
+    add_random_relations(document, defaultdict(set), 20, random.Random(0))
+    stream = io.BytesIO()
+    document.reachability().save(stream)
+    document.used('ex:n0', 'ex:n1')
+    stream.seek(0)
+    with pytest.raises(ProvException):
+        document.load_reachability(stream)
+    with pytest.raises(ProvException):
+        document.load_reachability(io.BytesIO(b'not an index'))
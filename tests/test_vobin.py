@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+
+import pytest
+
+from prov.model import PROV_REC_CLS
+from voprov.models.model import VOProvDocument
+from tests.documents import all_types_document, sample_document
+
+
+def round_trip(document, format):
+    stream = io.BytesIO()
+    document.serialize(stream, format=format)
+    return VOProvDocument.deserialize(io.BytesIO(stream.getvalue()), format=format)
+
+
+def records(bundle):
+    return [(record.get_type(), record.identifier, sorted((attr.uri, repr(value)) for attr, value in record.attributes))
+            for record in bundle.records]
+
+
+@pytest.mark.parametrize('format', ['vobin', 'vobix'])
+def test_every_record_class(format):
+    document = all_types_document()
+    assert set(record.get_type() for record in document.records) == set(PROV_REC_CLS)
+    loaded = round_trip(document, format)
+    assert records(loaded) == records(document)
+    assert [record.__class__ for record in loaded.records] == [record.__class__ for record in document.records]
+
+
+@pytest.mark.parametrize('format', ['vobin', 'vobix'])
+@pytest.mark.parametrize('compact', [False, True])
+def test_round_trip(format, compact):
+    document = sample_document(3, compact)
+    loaded = round_trip(document, format)
+    assert loaded.get_provn() == document.get_provn()
+    assert records(loaded) == records(document)
+    loaded_bundles = dict((bundle.identifier, bundle) for bundle in loaded.bundles)
+    for bundle in document.bundles:
+        assert records(loaded_bundles[bundle.identifier]) == records(bundle)
+        assert loaded_bundles[bundle.identifier].namespaces == bundle.namespaces
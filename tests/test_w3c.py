@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import pytest
+
+from prov.model import PROV_TYPE
+from voprov.models.constants import *
+from tests.documents import sample_document
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_copy_and_view(compact):
+    document = sample_document(3, compact)
+    w3c = document.get_w3c()
+    assert document.w3c_view().get_provn() == w3c.get_provn()
+    assert document.get_w3c(workers=2).get_provn() == w3c.get_provn()
+    usage = w3c.get_record('ex:act')[0]
+    assert list(usage.get_attribute(PROV_TYPE)) == [VOPROV_ACTIVITY]
+
+
+def test_bundle_namespaces():
+    document = sample_document(3)
+    bundle, = document.get_w3c().bundles
+    # The document namespaces used by the records of the bundle are declared in the W3C bundle.
+    assert set((namespace.prefix, namespace.uri) for namespace in bundle.namespaces) == \
+        {('ex', 'http://example.org/'), ('obs', 'http://observatory.example.org/')}
+    assert bundle.get_record('obs:frame')
+    view, = document.w3c_view().bundles
+    assert view.namespaces == bundle.namespaces
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import datetime
+import io
+import os
+
+import pytest
+
+from prov.identifier import Identifier
+from prov.model import PROV_TYPE, XSD_ANYURI, Literal
+from voprov.models.constants import *
+from voprov.models.model import VOProvDocument
+from tests.documents import sample_document
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def typed_document():
+    """Returns a document with a value of each kind the XML serializer writes differently."""
+    document = VOProvDocument()
+    document.add_namespace('ex', 'http://example.org/')
+    description = document.activityDescription('ex:ad', 'reduce', type='Reduction')
+    activity = document.activity('ex:act', startTime=datetime.datetime(2020, 1, 1, 12, 30),
+                                 endTime=datetime.datetime(2020, 1, 2, 0, 0, 0, 250000),
+                                 activityDescription=description,
+                                 other_attributes={VOPROV_TYPE: document.valid_qualified_name('ex:Pipeline')})
+    document.entity('ex:image', name='image', other_attributes={
+        PROV_TYPE: document.valid_qualified_name('ex:Image'),
+        'ex:caption': Literal('image', langtag='en'),
+        'ex:page': Identifier('http://example.org/image.html'),
+        'ex:link': Literal('http://example.org/image.fits', XSD_ANYURI),
+        'ex:observed': datetime.datetime(2020, 3, 4, 5, 6, 7),
+        'ex:size': 2048,
+        'ex:ratio': 0.5,
+        'ex:valid': False,
+        'ex:text': 'a < b & "c"',
+    })
+    document.used(activity, 'ex:image', role='input', time=datetime.datetime(2020, 1, 1, 12, 31),
+                  identifier='ex:usage')
+    bundle = document.bundle('ex:bundle')
+    bundle.add_namespace('obs', 'http://observatory.example.org/')
+    bundle.entity('obs:frame', other_attributes={VOPROV_TYPE: 'frame', 'obs:exposure': 30.0})
+    return document
+
+
+def serialize(document, **kwargs):
+    stream = io.BytesIO()
+    document.serialize(stream, format='xml', **kwargs)
+    return stream.getvalue()
+
+
+def parse(data):
+    return VOProvDocument.deserialize(io.BytesIO(data), format='xml')
+
+
+@pytest.mark.parametrize('force_types, name', [(False, 'typed.xml'), (True, 'typed_forced.xml')])
+def test_tree_output(force_types, name):
+    # The files were written by the serializer before the conversion of the records was optimized.
+    with open(os.path.join(DATA, name), 'rb') as expected:
+        assert serialize(typed_document(), force_types=force_types) == expected.read()
+
+
+@pytest.mark.parametrize('force_types', [False, True])
+def test_streaming_output(force_types):
+    document = sample_document(3)
+    tree = serialize(document, force_types=force_types)
+    streamed = serialize(document, force_types=force_types, streaming=True)
+    assert serialize(parse(streamed), force_types=force_types) == tree
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_round_trip(compact):
+    for document in (sample_document(3, compact), typed_document()):
+        data = serialize(document)
+        assert serialize(parse(data)) == data
@@ -9,35 +9,87 @@ __email__ = 'jeanfrancois.sornay@gmail.com'
 __all__ = ["Error", "models", "read"]
 
 
-def read(source, format=None):
+def read(source, format=None, compression=None):
     """
     Convenience function returning a VOProvDocument instance.
 
-    It does a lazy format detection by simply using try/except for all known
-    formats. The deserializers should fail fairly early when data of the
-    wrong type is passed to them thus the try/except is likely cheap. One
-    could of course also do some more advanced format auto-detection but I am
-    not sure that is necessary.
+    When no format is given, it is guessed from the first few kilobytes of
+    the source and from its file name, and the matching deserializer is
+    called once. Only when the content is not conclusive are all known
+    formats tried in turn, in which case a non seekable stream is first
+    buffered in memory so that each attempt reads it from the start.
 
-    The downside is that no proper error messages will be produced, use the
-    format parameter to get the actual traceback.
+    The downside of trying the formats is that no proper error messages will
+    be produced, use the format parameter to get the actual traceback.
+
+    Compressed sources are decompressed on the fly.
+
+    :param source: A file path or a stream, text or binary.
+    :param format: The serialization format, guessed if not given.
+    :param compression: 'gzip', 'bz2' or 'lzma', guessed from the first bytes
+        of the source if not given, False if the source is not compressed.
     """
     # Lazy imports to not globber the namespace.
     from voprov.models.model import VOProvDocument
 
     from voprov.serializers import Registry
-    Registry.load_serializers()
+    from voprov.serializers.sniff import SNIFF_SIZE, guess_format
+    from voprov.serializers.compression import (compressed_stream,
+                                                compression_from_head,
+                                                strip_compression_extension)
+    from voprov.serializers.streams import buffered, peek, seekable
+    if Registry.serializers is None:
+        Registry.load_serializers()
     serializers = Registry.serializers.keys()
 
     if format:
-        return VOProvDocument.deserialize(source=source, format=format.lower())
+        return VOProvDocument.deserialize(source=source, format=format.lower(),
+                                          compression=compression)
 
-    for format in serializers:
-        try:
-            return VOProvDocument.deserialize(source=source, format=format)
-        except:
-            pass
+    if hasattr(source, "read"):
+        head, source = peek(source, SNIFF_SIZE)
+        name = getattr(source, "name", None)
     else:
-        raise TypeError("Could not read from the source. To get a proper "
-                        "error message, specify the format with the 'format' "
-                        "parameter.")
+        with open(source, "rb") as f:
+            head = f.read(SNIFF_SIZE)
+        name = source
+
+    opened = []
+    try:
+        if compression is None:
+            compression = compression_from_head(head)
+        if compression:
+            # The format is the one of the decompressed content.
+            if not hasattr(source, "read"):
+                source = open(source, "rb")
+                opened.append(source)
+            source = compressed_stream(source, compression)
+            opened.append(source)
+            head, source = peek(source, SNIFF_SIZE)
+            name = strip_compression_extension(name)
+
+        format, options = guess_format(head, name)
+        if format:
+            return VOProvDocument.deserialize(source=source, format=format,
+                                              compression=False, **options)
+
+        if hasattr(source, "read"):
+            if not seekable(source):
+                source = buffered(source)
+            position = source.tell()
+
+        for format in serializers:
+            try:
+                return VOProvDocument.deserialize(source=source, format=format,
+                                                  compression=False)
+            except:
+                if hasattr(source, "read"):
+                    source.seek(position)
+        else:
+            raise TypeError("Could not read from the source. To get a proper "
+                            "error message, specify the format with the "
+                            "'format' parameter.")
+    finally:
+        for stream in reversed(opened):
+            stream.close()
+
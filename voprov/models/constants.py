@@ -157,6 +157,8 @@ PROV_BASE_CLS.update({
     VOPROV_ENTITY_DESCRIPTION:          VOPROV_ENTITY_DESCRIPTION,
     VOPROV_VALUE_DESCRIPTION:           VOPROV_VALUE_DESCRIPTION,
     VOPROV_DATASET_DESCRIPTION:         VOPROV_DATASET_DESCRIPTION,
+    VOPROV_CONFIG_FILE_DESCRIPTION:     VOPROV_CONFIG_FILE_DESCRIPTION,
+    VOPROV_PARAMETER_DESCRIPTION:       VOPROV_PARAMETER_DESCRIPTION,
 
     # voprov configuration
     VOPROV_CONFIGURATION_FILE:          VOPROV_CONFIGURATION_FILE,
@@ -2,25 +2,33 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import datetime
 import io
 import itertools
 import os
 import logging
-import shutil
+import multiprocessing
 import tempfile
 import dateutil.parser
+from collections import defaultdict
 from prov.model import (ProvException, ProvDocument, ProvBundle, ProvActivity,
                         ProvUsage, ProvAgent, ProvGeneration, ProvAssociation, ProvEntity,
                         ProvCommunication, ProvStart, ProvEnd, ProvInvalidation, ProvDerivation,
                         ProvAttribution, ProvDelegation, ProvInfluence, ProvSpecialization,
                         ProvAlternate, ProvMention, ProvMembership,
-                        PROV_REC_CLS, DEFAULT_NAMESPACES, NamespaceManager, first)
+                        ProvRecord, PROV_REC_CLS, parse_xsd_datetime, DEFAULT_NAMESPACES, NamespaceManager, QualifiedName,
+                        first)
 from six.moves.urllib.parse import urlparse
 
 from voprov import serializers
+from voprov.serializers.compression import (compressed_stream,
+                                            compression_from_head,
+                                            compression_from_name)
+from voprov.serializers.streams import peek
 from voprov.models.voprovDescriptions import *
 from voprov.models.voprovConfigurations import *
 from voprov.models.voprovRelations import *
+from voprov.models.voprovCompact import compact_record_class
 
 __author__ = 'Jean-Francois Sornay'
 __email__ = 'jeanfrancois.sornay@gmail.com'
@@ -29,6 +37,91 @@ logger = logging.getLogger(__name__)
 
 DEFAULT_NAMESPACES.update({'voprov': VOPROV})
 
+# Number of bytes read to recognize a compressed input.
+_MAGIC_SIZE = 6
+
+# Conversion tables of the VOProv record classes to W3C PROV, see _w3c_conversion().
+_W3C_CONVERSIONS = dict()
+
+# Conversion tables of the W3C PROV records back to the VOProv record classes, see _voprov_conversion().
+_VOPROV_CONVERSIONS = dict()
+
+
+def _replace(source, destination):
+    """
+    Renames a file, replacing the destination if it exists.
+    """
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+    else:
+        if os.name == "nt" and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def _fsync_directory(directory):
+    """
+    Flushes to disk the entries of a directory, where the platform allows it.
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class _DestinationFile(object):
+    """
+    Temporary file written next to a destination file path, which it replaces
+    once complete, so that the destination is never left half written.
+    """
+
+    def __init__(self, path, buffer_size=-1, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        self.directory, filename = os.path.split(os.path.abspath(path))
+        fd, self.name = tempfile.mkstemp(prefix='.%s.' % filename,
+                                         suffix='.tmp', dir=self.directory)
+        self.stream = io.open(fd, "wb", buffering=buffer_size)
+
+    def commit(self):
+        """Closes the temporary file and renames it to the destination."""
+        try:
+            if self.fsync:
+                self.stream.flush()
+                os.fsync(self.stream.fileno())
+            self.stream.close()
+            _replace(self.name, self.path)
+        except BaseException:
+            self.discard()
+            raise
+        if self.fsync:
+            _fsync_directory(self.directory)
+
+    def discard(self):
+        """Closes and removes the temporary file."""
+        try:
+            self.stream.close()
+        finally:
+            if os.path.exists(self.name):
+                os.remove(self.name)
+
+
+def _serialize_compressed(serializer, stream, compression, level, args):
+    """
+    Serializes to a stream, through a compressor if a compression is given.
+    """
+    if not compression:
+        serializer.serialize(stream, **args)
+        return
+    with compressed_stream(stream, compression, 'wb', level) as compressed:
+        serializer.serialize(compressed, **args)
+
 
 def _ensure_datetime(value):
     if isinstance(value, six.string_types):
@@ -37,6 +130,134 @@ def _ensure_datetime(value):
         return value
 
 
+def _record_key(record):
+    """Structural key of a record: its type, identifier, formal attributes and extra attributes."""
+    return (record.get_type(), record.identifier, record.formal_attributes,
+            frozenset(record.extra_attributes))
+
+
+def _w3c_conversion(record_class, w3c_class):
+    """
+    Returns the conversion table of a VOProv record class to its W3C PROV class, computed once per class: the index
+    among the W3C formal attributes of the one having the same local part as each VOProv formal attribute (or None,
+    the attribute being dropped), by URI.
+    """
+    key = (record_class, w3c_class)
+    try:
+        return _W3C_CONVERSIONS[key]
+    except KeyError:
+        pass
+    conversion = dict()
+    for attr in record_class.FORMAL_ATTRIBUTES or ():
+        conversion[attr._uri] = None
+        for index, w3c_attr in enumerate(w3c_class.FORMAL_ATTRIBUTES):
+            if attr.localpart == w3c_attr.localpart:
+                conversion[attr._uri] = index
+                break
+    _W3C_CONVERSIONS[key] = conversion
+    return conversion
+
+
+def _w3c_record(record, bundle, w3c_class):
+    """
+    Adds the W3C PROV version of a VOProv record to a bundle, as a record of the W3C PROV class having the VOProv
+    type as prov:type, its formal attributes being converted in a single pass through the conversion table of the
+    record class.
+
+    :param record: The VOProv record.
+    :param bundle: The W3C PROV bundle.
+    :param w3c_class: The W3C PROV class of the record (e.g. :py:class:`ProvUsage`).
+    :return: The W3C PROV record.
+    """
+    conversion = _w3c_conversion(record.__class__, w3c_class)
+    formal_values = [None] * len(w3c_class.FORMAL_ATTRIBUTES)
+    extra_attributes = []
+    for attr, values in record._attributes.items():
+        try:
+            index = conversion[attr._uri]
+        except KeyError:
+            extra_attributes.extend((attr, value) for value in values)
+            continue
+        if index is not None and values:
+            formal_values[index] = first(values) or None
+    extra_attributes.append((PROV_TYPE, record._prov_type))
+    return bundle.new_record(
+        w3c_class._prov_type, record.identifier,
+        list(zip(w3c_class.FORMAL_ATTRIBUTES, formal_values)), extra_attributes
+    )
+
+
+def _voprov_conversion(record_class, w3c_class):
+    """
+    Returns the conversion table of a W3C PROV record class back to a VOProv record class, computed once per class:
+    the VOProv formal attribute of each W3C formal attribute, by URI, the relations specific to VOProv being written
+    as influences by :py:meth:`VOProvRelation.get_w3c`.
+    """
+    key = (record_class, w3c_class)
+    try:
+        return _VOPROV_CONVERSIONS[key]
+    except KeyError:
+        pass
+    formal_attributes = record_class.FORMAL_ATTRIBUTES or ()
+    conversion = dict()
+    if issubclass(record_class, VOProvRelation) and w3c_class.FORMAL_ATTRIBUTES == ProvInfluence.FORMAL_ATTRIBUTES:
+        for w3c_attr, attr in zip(w3c_class.FORMAL_ATTRIBUTES, formal_attributes):
+            conversion[w3c_attr._uri] = attr
+    else:
+        for w3c_attr in w3c_class.FORMAL_ATTRIBUTES:
+            for attr in formal_attributes:
+                if attr.localpart == w3c_attr.localpart:
+                    conversion[w3c_attr._uri] = attr
+                    break
+    _VOPROV_CONVERSIONS[key] = conversion
+    return conversion
+
+
+def _voprov_record(bundle, record):
+    """
+    Adds the VOProv version of a W3C PROV record to a bundle, its class being found in :py:const:`W3C_REC_TYPES`
+    from its type and the VOProv type asserted by :py:meth:`get_w3c`, which is removed from its prov:type values.
+    The values being those of a W3C PROV record, the record is filled directly instead of through add_attributes().
+
+    :param bundle: The VOProv bundle.
+    :param record: The W3C PROV record.
+    :return: The VOProv record.
+    """
+    rec_type = record.get_type()
+    attributes = record._attributes
+    asserted_type = None
+    record_type = None
+    for value in attributes.get(PROV_TYPE, ()):
+        record_type = W3C_REC_TYPES.get((rec_type, value))
+        if record_type is not None:
+            asserted_type = value
+            break
+    else:
+        record_type = W3C_REC_TYPES.get((rec_type, None), rec_type)
+    record_class = bundle._record_class(record_type)
+    conversion = _voprov_conversion(record_class, record.__class__)
+
+    new_record = record_class(bundle, record._identifier)
+    new_attributes = new_record._attributes
+    extra_attributes = []
+    for attr, values in attributes.items():
+        if not values:
+            continue
+        formal_attr = conversion.get(attr._uri)
+        if formal_attr is not None:
+            new_attributes[formal_attr].update(values)
+            continue
+        if asserted_type is not None and attr == PROV_TYPE:
+            values = [value for value in values if value != asserted_type]
+            if not values:
+                continue
+        extra_attributes.append((attr, values))
+    for attr, values in extra_attributes:
+        new_attributes[attr].update(values)
+    bundle._add_record(new_record)
+    return new_record
+
+
 class VOProvEntity(ProvEntity):
     """Adaptation of prov Entity to VOProv Entity"""
 
@@ -185,11 +406,7 @@ class VOProvEntity(ProvEntity):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        entity = ProvEntity(bundle, self.identifier, self.attributes)
-        entity.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        return bundle.add_record(entity)
+        return _w3c_record(self, bundle, ProvEntity)
 
 
 class VOProvValueEntity(VOProvEntity):
@@ -358,19 +575,7 @@ class VOProvActivity(ProvActivity):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        activity = ProvActivity(bundle, self.identifier, self.extra_attributes)
-        activity.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvActivity, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        activity.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(activity)
+        return _w3c_record(self, bundle, ProvActivity)
 
 
 class VOProvAgent(ProvAgent):
@@ -452,11 +657,7 @@ class VOProvAgent(ProvAgent):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        agent = ProvAgent(bundle, self.identifier, self.attributes)
-        agent.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        return bundle.add_record(agent)
+        return _w3c_record(self, bundle, ProvAgent)
 
 
 class VOProvUsage(ProvUsage):
@@ -483,19 +684,7 @@ class VOProvUsage(ProvUsage):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        usage = ProvUsage(bundle, self.identifier, self.extra_attributes)
-        usage.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvUsage, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        usage.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(usage)
+        return _w3c_record(self, bundle, ProvUsage)
 
 
 class VOProvGeneration(ProvGeneration):
@@ -522,19 +711,7 @@ class VOProvGeneration(ProvGeneration):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        generation = ProvGeneration(bundle, self.identifier, self.extra_attributes)
-        generation.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvGeneration, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        generation.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(generation)
+        return _w3c_record(self, bundle, ProvGeneration)
 
 
 class VOProvCommunication(ProvCommunication):
@@ -548,19 +725,7 @@ class VOProvCommunication(ProvCommunication):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        communication = ProvCommunication(bundle, self.identifier, self.extra_attributes)
-        communication.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvCommunication, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        communication.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(communication)
+        return _w3c_record(self, bundle, ProvCommunication)
 
 
 class VOProvStart(ProvStart):
@@ -575,19 +740,7 @@ class VOProvStart(ProvStart):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        start = ProvStart(bundle, self.identifier, self.extra_attributes)
-        start.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvStart, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        start.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(start)
+        return _w3c_record(self, bundle, ProvStart)
 
 
 class VOProvEnd(ProvEnd):
@@ -602,19 +755,7 @@ class VOProvEnd(ProvEnd):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        end = ProvEnd(bundle, self.identifier, self.extra_attributes)
-        end.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvEnd, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        end.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(end)
+        return _w3c_record(self, bundle, ProvEnd)
 
 
 class VOProvInvalidation(ProvInvalidation):
@@ -628,19 +769,7 @@ class VOProvInvalidation(ProvInvalidation):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        invalidation = ProvInvalidation(bundle, self.identifier, self.extra_attributes)
-        invalidation.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvInvalidation, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        invalidation.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(invalidation)
+        return _w3c_record(self, bundle, ProvInvalidation)
 
 
 class VOProvDerivation(ProvDerivation):
@@ -656,19 +785,7 @@ class VOProvDerivation(ProvDerivation):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        derivation = ProvDerivation(bundle, self.identifier, self.extra_attributes)
-        derivation.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvDerivation, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        derivation.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(derivation)
+        return _w3c_record(self, bundle, ProvDerivation)
 
 
 class VOProvAttribution(ProvAttribution):
@@ -682,19 +799,7 @@ class VOProvAttribution(ProvAttribution):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        attribution = ProvAttribution(bundle, self.identifier, self.extra_attributes)
-        attribution.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvAttribution, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        attribution.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(attribution)
+        return _w3c_record(self, bundle, ProvAttribution)
 
 
 class VOProvAssociation(ProvAssociation):
@@ -708,19 +813,7 @@ class VOProvAssociation(ProvAssociation):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        association = ProvAssociation(bundle, self.identifier, self.extra_attributes)
-        association.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvAssociation, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        association.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(association)
+        return _w3c_record(self, bundle, ProvAssociation)
 
 
 class VOProvDelegation(ProvDelegation):
@@ -734,19 +827,7 @@ class VOProvDelegation(ProvDelegation):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        delegation = ProvDelegation(bundle, self.identifier, self.extra_attributes)
-        delegation.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvDelegation, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        delegation.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(delegation)
+        return _w3c_record(self, bundle, ProvDelegation)
 
 
 class VOProvInfluence(ProvInfluence):
@@ -760,19 +841,7 @@ class VOProvInfluence(ProvInfluence):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        influence = ProvInfluence(bundle, self.identifier, self.extra_attributes)
-        influence.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvInfluence, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        influence.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(influence)
+        return _w3c_record(self, bundle, ProvInfluence)
 
 
 class VOProvSpecialization(ProvSpecialization):
@@ -786,19 +855,7 @@ class VOProvSpecialization(ProvSpecialization):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        specialization = ProvSpecialization(bundle, self.identifier, self.extra_attributes)
-        specialization.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvSpecialization, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        specialization.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(specialization)
+        return _w3c_record(self, bundle, ProvSpecialization)
 
 
 class VOProvAlternate(ProvAlternate):
@@ -812,19 +869,7 @@ class VOProvAlternate(ProvAlternate):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        alternate = ProvAlternate(bundle, self.identifier, self.extra_attributes)
-        alternate.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvAlternate, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        alternate.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(alternate)
+        return _w3c_record(self, bundle, ProvAlternate)
 
 
 class VOProvMention(ProvMention, VOProvSpecialization):
@@ -839,19 +884,7 @@ class VOProvMention(ProvMention, VOProvSpecialization):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
-
-        mention = ProvMention(bundle, self.identifier, self.extra_attributes)
-        mention.add_asserted_type(self._prov_type)  # self.__class__.__name__)
-
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvMention, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        mention.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(mention)
+        return _w3c_record(self, bundle, ProvMention)
 
 
 class VOProvMembership(ProvMembership):
@@ -865,19 +898,23 @@ class VOProvMembership(ProvMembership):
         """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
         if bundle is None:
             bundle = ProvBundle()
+        return _w3c_record(self, bundle, ProvMembership)
+
 
-        membership = ProvMembership(bundle, self.identifier, self.extra_attributes)
-        membership.add_asserted_type(self._prov_type)  # self.__class__.__name__)
+def _w3c_bundle(task):
+    """
+    Converts a bundle sent by :py:meth:`VOProvBundle._add_w3c_bundles` to a worker process.
 
-        for formal in self.formal_attributes:
-            local_part = formal[0].localpart
-            value = formal[1]
-            if value:
-                for super_formal in super(VOProvMembership, self).FORMAL_ATTRIBUTES:
-                    if local_part is super_formal.localpart:
-                        membership.add_attributes({super_formal: value})
-                        break
-        return bundle.add_record(membership)
+    :param task: The URIs of the namespaces of the W3C document by prefix, the prefix, namespace URI and local part
+        of the identifier of the bundle, and the vobin encoding of the bundle.
+    :return: The vobin encoding of the W3C PROV bundle.
+    """
+    # Imported here as the binary format is only needed by the parallel conversion.
+    from voprov.serializers.vobin import decode_bundle, encode_bundle
+    namespaces, (prefix, uri, localpart), data = task
+    bundle = VOProvBundle(identifier=Namespace(prefix, uri)[localpart])
+    decode_bundle(data, bundle)
+    return encode_bundle(bundle.get_w3c(document=ProvDocument(namespaces=namespaces)))
 
 
 class VOProvNamespaceManager(NamespaceManager):
@@ -911,12 +948,57 @@ class VOProvNamespaceManager(NamespaceManager):
             self.add_namespace(namespace)
         self.add_namespaces(namespaces)
 
+    def valid_qualified_name(self, qname):
+        """
+        Resolves an identifier to a valid qualified name. A qualified name
+        whose prefix is not registered here but is registered with the same
+        namespace by a parent manager, e.g. the one of the document of a
+        bundle, is resolved against the parent instead of registering a copy
+        of its namespace here, as a prefixed string is.
+
+        :param qname: Qualified name as :py:class:`~prov.identifier.QualifiedName`
+            or a tuple (namespace, identifier).
+        :return: :py:class:`~prov.identifier.QualifiedName` or None in case of
+            failure.
+        """
+        if isinstance(qname, QualifiedName) and self.parent is not None:
+            namespace = qname.namespace
+            prefix = namespace.prefix
+            if prefix and prefix not in self:
+                parent = self.parent
+                while parent is not None and prefix not in parent:
+                    parent = parent.parent
+                if parent is not None and parent[prefix] == namespace:
+                    return parent.valid_qualified_name(qname)
+        return NamespaceManager.valid_qualified_name(self, qname)
+
+
+class _W3CNamespaceManager(NamespaceManager):
+    """
+    Namespace manager of the W3C PROV bundles converted from VOProv bundles, whose records mostly use namespaces
+    of the document.
+    """
+
+    def valid_qualified_name(self, qname):
+        """
+        Resolves an identifier to a valid qualified name. prov registers a
+        deep copy of the namespace of a qualified name whose prefix is not
+        registered here, including all the qualified names the namespace
+        caches, i.e. every name of the document in that namespace. A new
+        namespace with the same prefix and URI is registered instead.
+        """
+        if isinstance(qname, QualifiedName):
+            namespace = qname.namespace
+            if namespace.prefix and namespace.prefix not in self:
+                self.add_namespace(Namespace(namespace.prefix, namespace.uri))
+        return NamespaceManager.valid_qualified_name(self, qname)
+
 
 class VOProvBundle(ProvBundle):
     """Adaptation of prov bundle to VOProv Bundle"""
 
     def __init__(self, records=None, identifier=None, namespaces=None,
-                 document=None):
+                 document=None, compact=None):
         """
         Constructor.
 
@@ -926,14 +1008,135 @@ class VOProvBundle(ProvBundle):
         :param namespaces: Optional iterable of :py:class:`~prov.identifier.Namespace`s
             to set the document up with (default: None).
         :param document: Optional document to add to the bundle (default: None).
+        :param compact: Whether to store the VOProv records in their compact form
+            (see :py:mod:`voprov.models.voprovCompact`). Defaults to the setting of
+            the document, or False.
         """
         #  Initializing bundle-specific attributes
+        if compact is None:
+            compact = document._compact if document is not None else False
+        self._compact = compact
+        self._reset_indexes()
         super(VOProvBundle, self).__init__(records, identifier, namespaces, document)
         self._namespaces = VOProvNamespaceManager(
             namespaces,
             parent=(document._namespaces if document is not None else None)
         )
 
+    def _reset_indexes(self):
+        """Empties the record list and every record index of the bundle."""
+        self._records = list()
+        self._id_map = defaultdict(list)
+        self._type_map = defaultdict(list)
+        self._relation_map = defaultdict(list)
+        self._subject_map = defaultdict(list)
+
+    def _record_class(self, record_type):
+        """Returns the class of the records of the given type created by this bundle."""
+        if self._compact and record_type in VOPROV_COMPACT_REC_CLS:
+            return VOPROV_COMPACT_REC_CLS[record_type]
+        return PROV_REC_CLS[record_type]
+
+    def new_record(self, record_type, identifier, attributes=None,
+                   other_attributes=None):
+        """
+        Creates a new record.
+
+        :param record_type: Type of record (one of :py:const:`PROV_REC_CLS`).
+        :param identifier: Identifier for new record.
+        :param attributes: Attributes as a dictionary or list of tuples to be added
+            to the record optionally (default: None).
+        :param other_attributes: Optional other attributes as a dictionary or list
+            of tuples to be added to the record optionally (default: None).
+        """
+        attr_list = []
+        if attributes:
+            if isinstance(attributes, dict):
+                attr_list.extend(
+                    (attr, value) for attr, value in attributes.items()
+                )
+            else:
+                # expecting a list of attributes here
+                attr_list.extend(attributes)
+        if other_attributes:
+            attr_list.extend(
+                other_attributes.items() if isinstance(other_attributes, dict)
+                else other_attributes
+            )
+        new_record = self._record_class(record_type)(
+            self, self.valid_qualified_name(identifier), attr_list
+        )
+        self._add_record(new_record)
+        return new_record
+
+    def _add_record(self, record):
+        # IMPORTANT: All records need to be added to a bundle/document via this
+        # method. Otherwise, the record indexes will not be correctly updated
+        super(VOProvBundle, self)._add_record(record)
+        self._type_map[record.get_type()].append(record)
+        if record.is_relation():
+            involved = set()
+            formal_attributes = record.formal_attributes
+            for _, value in formal_attributes:
+                if isinstance(value, QualifiedName) and value not in involved:
+                    involved.add(value)
+                    self._relation_map[value].append(record)
+            if formal_attributes and isinstance(formal_attributes[0][1], QualifiedName):
+                self._subject_map[formal_attributes[0][1]].append(record)
+            document = self._root_document()
+            lineage = getattr(document, '_lineage', None)
+            if lineage is not None:
+                lineage.add_relation(record)
+            reachability = getattr(document, '_reachability', None)
+            if reachability is not None:
+                reachability.add_relation(record)
+
+    def _root_document(self):
+        """Returns the document of this bundle, or the bundle itself if it is a document or has no document."""
+        return self if self._document is None else self._document
+
+    def records_of_type(self, record_type):
+        """
+        Returns all records of the given type, in insertion order.
+
+        :param record_type:             Type of the records (e.g. :py:const:`VOPROV_ACTIVITY`).
+        :return: List of :py:class:`ProvRecord` objects.
+        """
+        return list(self._type_map.get(record_type, ()))
+
+    def relations_involving(self, identifier, attribute=None):
+        """
+        Returns all relations having the given element as one of their formal attributes.
+
+        :param identifier:              Element or identifier of the element involved in the relations.
+        :param attribute:               Optional formal attribute the element must be the value of
+                                        (e.g. :py:const:`VOPROV_ATTR_ENTITY`, default: None).
+        :return: List of :py:class:`ProvRelation` objects.
+        """
+        if isinstance(identifier, ProvRecord):
+            identifier = identifier.identifier
+        valid_id = self.valid_qualified_name(identifier)
+        relations = self._relation_map.get(valid_id, ())
+        if attribute is None:
+            return list(relations)
+        attribute = self.valid_qualified_name(attribute)
+        return [relation for relation in relations if valid_id in relation._attributes.get(attribute, ())]
+
+    def _records_identified_by(self, qualified_name):
+        """Returns the records having a qualified name as identifier, without registering its namespace."""
+        return self._id_map.get(qualified_name, ())
+
+    def _relations_involving(self, qualified_name):
+        """Returns the relations having a qualified name as formal attribute, without registering its namespace."""
+        return self._relation_map.get(qualified_name, ())
+
+    def _relations_from(self, qualified_name):
+        """
+        Returns the relations having a qualified name as first formal attribute (e.g. the activity of a usage, the
+        described element of a description), without registering its namespace.
+        """
+        return self._subject_map.get(qualified_name, ())
+
     def unified(self):
         """
         Unifies all records in the bundle that haves same identifiers
@@ -942,46 +1145,102 @@ class VOProvBundle(ProvBundle):
         """
         unified_records = self._unified_records()
         bundle = VOProvBundle(
-            records=unified_records, identifier=self.identifier
+            records=unified_records, identifier=self.identifier, compact=self._compact
         )
         return bundle
 
     def unified_relations(self):
         """
-        Unifies all relations in the bundle that have same __repr__ (i.e. type, identifier if set, e1, e2)
+        Unifies all relations in the bundle that have the same type, identifier and attributes, keeping the
+        first occurrence of each record in place (bundles of a document are unified as well).
 
-        :returns: :py:class:`VOProvBundle` -- the new unified bundle.
+        :returns: :py:class:`VOProvBundle` -- this bundle, unified.
         """
-        hash_records = []
         if self.is_document():
             for bundle in self._bundles:
                 self._bundles[bundle] = self._bundles[bundle].unified_relations()
+        seen = set()
+        unified_records = []
         for record in self._records:
-            if record.is_relation():
-                hash_records.append(hash(str(record)))
-            else:
-                hash_records.append(hash(record))
-        for hash_record in list(set(hash_records)):
-            while hash_records.count(hash_record) > 1:
-                rec_index = hash_records.index(hash_record)
-                self._records.pop(rec_index)
-                hash_records.pop(rec_index)
+            key = _record_key(record)
+            if key not in seen:
+                seen.add(key)
+                unified_records.append(record)
+        if len(unified_records) != len(self._records):
+            self._reset_indexes()
+            # The lineage graph and the reachability index of the document are built again when they are next needed,
+            # instead of replaying the relations through them.
+            document = self._root_document()
+            document._lineage = None
+            document._reachability = None
+            for record in unified_records:
+                self._add_record(record)
         return self
 
-    def get_w3c(self, document=None):
-        """get this element in the prov version which is an implementation of the W3C PROV-DM standard"""
+    def get_w3c(self, document=None, workers=None):
+        """
+        get this element in the prov version which is an implementation of the W3C PROV-DM standard
+
+        With several workers, the bundles of a document are converted in a pool of processes, while the records of
+        the document itself are converted in this process. The bundles are sent to the workers and back in the vobin
+        encoding, and added in their order, the result being the same as the one of a serial conversion.
+
+        :param document: The W3C PROV document of the converted bundle (default: None).
+        :param workers: Number of processes converting the bundles of a document (default: None, the bundles being
+            converted in this process).
+        """
         if self.is_document():
             w3c_records = ProvDocument(namespaces=self.namespaces)
         else:
-            w3c_records = ProvBundle(identifier=self.identifier, namespaces=self.namespaces, document=document)
+            w3c_records = ProvBundle(identifier=self.identifier, document=document)
+            w3c_records._namespaces = _W3CNamespaceManager(self.namespaces, parent=w3c_records._namespaces.parent)
 
         if self.is_document():
-            for bundle in self.bundles:
+            bundles = list(self.bundles)
+            if workers is not None and workers > 1 and \
+                    sum(1 for bundle in bundles if isinstance(bundle, VOProvBundle)) > 1:
+                self._add_w3c_bundles(w3c_records, bundles, workers)
+                return w3c_records
+            for bundle in bundles:
                 if isinstance(bundle, VOProvBundle):
                     w3c_records.add_bundle(bundle.get_w3c(document=w3c_records))
                 else:
                     w3c_records.add_bundle(bundle)
 
+        self._add_w3c_records(w3c_records)
+        return w3c_records
+
+    def _add_w3c_bundles(self, w3c_records, bundles, workers):
+        """
+        Converts the bundles of this document in a pool of processes and its own records in this process meanwhile,
+        see :py:meth:`get_w3c`.
+        """
+        from voprov.serializers.vobin import decode_bundle, encode_bundle
+        # The W3C bundles are converted against the namespaces the W3C document has before its records are added.
+        # The namespaces and identifiers are sent as strings, a pickled namespace carrying all the qualified names
+        # it has cached, i.e. every name of the document in that namespace.
+        namespaces = dict((namespace.prefix, namespace.uri) for namespace in w3c_records.namespaces)
+        tasks = [(namespaces, (bundle.identifier.namespace.prefix, bundle.identifier.namespace.uri,
+                               bundle.identifier.localpart), encode_bundle(bundle))
+                 for bundle in bundles if isinstance(bundle, VOProvBundle)]
+        pool = multiprocessing.Pool(min(workers, len(tasks)))
+        try:
+            w3c_bundles = pool.imap(_w3c_bundle, tasks)
+            self._add_w3c_records(w3c_records)
+            for bundle in bundles:
+                if isinstance(bundle, VOProvBundle):
+                    w3c_bundle = ProvBundle(identifier=bundle.identifier, document=w3c_records)
+                    decode_bundle(next(w3c_bundles), w3c_bundle)
+                    w3c_records.add_bundle(w3c_bundle)
+                else:
+                    w3c_records.add_bundle(bundle)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _add_w3c_records(self, w3c_records):
+        """Adds the W3C PROV version of the records of this bundle to a W3C PROV bundle."""
         if self.records:
             for record in self.records:
                 if hasattr(record, "get_w3c"):
@@ -989,7 +1248,43 @@ class VOProvBundle(ProvBundle):
                 else:
                     w3c_records.add_record(record)
 
-        return w3c_records
+    def add_w3c_records(self, records):
+        """
+        Adds the VOProv version of W3C PROV records to this bundle, restoring the VOProv classes and attributes of
+        the records converted by :py:meth:`get_w3c`, see :py:const:`W3C_REC_TYPES`. The other records get the
+        VOProv class of their type. The records are converted one at a time while iterating, e.g. over the records
+        of a :py:class:`~voprov.models.voprovW3C.VOProvW3CDocument`.
+
+        The namespaces of the records must be registered in this bundle, see :py:meth:`VOProvDocument.from_w3c`.
+
+        :param records: Iterable of W3C PROV records.
+        """
+        for record in records:
+            _voprov_record(self, record)
+
+    def _add_w3c_namespaces(self, prov_bundle):
+        """Registers the default and other namespaces of a W3C PROV bundle."""
+        default_namespace = prov_bundle._namespaces.get_default_namespace()
+        if default_namespace is not None:
+            self.set_default_namespace(default_namespace.uri)
+        for namespace in prov_bundle._namespaces.get_registered_namespaces():
+            if namespace.prefix not in self._namespaces:
+                self.add_namespace(namespace)
+
+    def w3c_view(self):
+        """
+        Returns a read-only W3C PROV view of this bundle or document, converting the records like :py:meth:`get_w3c`
+        only when they are accessed, e.g. to serialize the W3C PROV version of a document without keeping a
+        converted copy of it in memory.
+
+        :return: :py:class:`~voprov.models.voprovW3C.VOProvW3CDocument` or
+            :py:class:`~voprov.models.voprovW3C.VOProvW3CBundle`
+        """
+        # Imported here as the view imports the model.
+        from voprov.models.voprovW3C import VOProvW3CBundle, VOProvW3CDocument
+        if self.is_document():
+            return VOProvW3CDocument(self)
+        return VOProvW3CBundle(self)
 
     def activity(self, identifier, name=None, startTime=None, endTime=None, comment=None,
                  activityDescription=None, other_attributes=None):
@@ -2051,6 +2346,199 @@ class VOProvBundle(ProvBundle):
             None
         )
 
+    # Bulk record creation
+    def _add_records(self, record_type, identifiers, columns, other_attributes=None):
+        """
+        Creates records of one type from parallel columns of attribute values, giving the same records as
+        :py:meth:`new_record` called once per row. Qualified names and times are resolved once per distinct value
+        of the batch.
+
+        :param record_type:             Type of the records (one of :py:const:`PROV_REC_CLS`).
+        :param identifiers:             Iterable of identifiers, or None for anonymous relations.
+        :param columns:                 List of (attribute, iterable of values) pairs, formal attributes first. A
+                                        None iterable is skipped, as are None values in an iterable.
+        :param other_attributes:        Optional iterable of other attributes (a dictionary, a list of tuples or None)
+                                        for each record (default: None).
+        :return: List of the new records.
+        """
+        record_class = self._record_class(record_type)
+        qualified_names = {}
+        datetimes = {}
+
+        def qualified_name(record, value):
+            if isinstance(value, ProvRecord):
+                value = value.identifier
+            try:
+                return qualified_names[value]
+            except KeyError:
+                qname = qualified_names[value] = self.valid_qualified_name(value)
+                return qname
+            except TypeError:
+                return self.valid_qualified_name(value)
+
+        def literal_datetime(record, value):
+            if isinstance(value, datetime.datetime):
+                return value
+            try:
+                return datetimes[value]
+            except KeyError:
+                parsed = datetimes[value] = parse_xsd_datetime(value)
+                return parsed
+
+        def literal(record, value):
+            return record._auto_literal_conversion(value)
+
+        columns = [(attr, list(values)) for attr, values in columns if values is not None]
+        if identifiers is not None:
+            identifiers = list(identifiers)
+        if other_attributes is not None:
+            other_attributes = list(other_attributes)
+        lengths = [(attr, len(values)) for attr, values in columns]
+        if identifiers is not None:
+            lengths.insert(0, ('identifiers', len(identifiers)))
+        if other_attributes is not None:
+            lengths.append(('other_attributes', len(other_attributes)))
+        if not lengths:
+            return []
+        count = lengths[0][1]
+        for name, length in lengths:
+            if length != count:
+                raise ProvException('Expected %d values of %s, got %d' % (count, name, length))
+
+        # The formal attributes are added first, then the other attributes and the other columns, as in new_record.
+        formal_attributes = record_class.FORMAL_ATTRIBUTES or ()
+        columns = [column for column in columns if column[0] in formal_attributes] + \
+            [column for column in columns if column[0] not in formal_attributes]
+        formal_count = sum(1 for attr, _ in columns if attr in formal_attributes)
+        converters = []
+        for attr, _ in columns:
+            if attr in PROV_ATTRIBUTE_QNAMES:
+                converters.append((attr, qualified_name))
+            elif attr in PROV_ATTRIBUTE_LITERALS:
+                converters.append((attr, literal_datetime))
+            else:
+                converters.append((attr, literal))
+        rows = six.moves.zip(*[values for _, values in columns]) if columns else itertools.repeat((), count)
+        if other_attributes is None:
+            other_attributes = itertools.repeat(None)
+        if identifiers is None:
+            identifiers = itertools.repeat(None)
+
+        def add_values(record, converters, values):
+            attributes = record._attributes
+            for (attr, convert), value in six.moves.zip(converters, values):
+                if value is None:
+                    continue
+                converted = convert(record, value)
+                if converted is None:
+                    raise ProvException('Invalid value for attribute %s: %s' % (attr, value))
+                attributes[attr].add(converted)
+
+        formal_converters = converters[:formal_count]
+        other_converters = converters[formal_count:]
+        records = []
+        for identifier, row, extra in six.moves.zip(identifiers, rows, other_attributes):
+            record = record_class(self, qualified_name(None, identifier) if identifier is not None else None)
+            add_values(record, formal_converters, row[:formal_count])
+            if extra:
+                record.add_attributes(extra)
+            add_values(record, other_converters, row[formal_count:])
+            self._add_record(record)
+            records.append(record)
+        return records
+
+    def add_entities(self, identifiers, names=None, locations=None, generatedAtTimes=None, invalidatedAtTimes=None,
+                     comments=None, other_attributes=None):
+        """
+        Creates new entities in one pass, one for each identifier. The optional arguments are sequences or iterables
+        parallel to *identifiers*, a None item leaving the attribute unset, as in :py:meth:`entity`.
+
+        :param identifiers:             Identifiers for the new entities.
+        :param names:                   Human-readable names for the entities.
+        :param locations:               Paths or spatial coordinates of the entities.
+        :param generatedAtTimes:        Dates and times at which the entities were created.
+        :param invalidatedAtTimes:      Dates and times of invalidation of the entities.
+        :param comments:                Texts containing specific comments on the entities.
+        :param other_attributes:        Other attributes of each entity, as a dictionary or list of tuples.
+        :return: List of the new :py:class:`VOProvEntity` records.
+        """
+        return self._add_records(VOPROV_ENTITY, identifiers, [
+            (VOPROV_ATTR_NAME, names),
+            (VOPROV['location'], locations),
+            (VOPROV['generatedAtTime'], generatedAtTimes),
+            (VOPROV['invalidatedAtTime'], invalidatedAtTimes),
+            (VOPROV['comment'], comments),
+        ], other_attributes)
+
+    def add_activities(self, identifiers, names=None, startTimes=None, endTimes=None, comments=None,
+                       other_attributes=None):
+        """
+        Creates new activities in one pass, one for each identifier. The optional arguments are sequences or
+        iterables parallel to *identifiers*, a None item leaving the attribute unset, as in :py:meth:`activity`.
+
+        :param identifiers:             Identifiers for the new activities.
+        :param names:                   Human-readable names for the activities.
+        :param startTimes:              Start times of the activities.
+        :param endTimes:                End times of the activities.
+        :param comments:                Texts containing specific comments on the activities.
+        :param other_attributes:        Other attributes of each activity, as a dictionary or list of tuples.
+        :return: List of the new :py:class:`VOProvActivity` records.
+        """
+        return self._add_records(VOPROV_ACTIVITY, identifiers, [
+            (VOPROV_ATTR_STARTTIME, startTimes),
+            (VOPROV_ATTR_ENDTIME, endTimes),
+            (VOPROV_ATTR_NAME, names),
+            (VOPROV['comment'], comments),
+        ], other_attributes)
+
+    def add_usages(self, activities, entities, roles=None, times=None, usageDescriptions=None, identifiers=None,
+                   other_attributes=None):
+        """
+        Creates new usage records in one pass, one for each (activity, entity) pair. The optional arguments are
+        sequences or iterables parallel to *activities*, a None item leaving the attribute unset, as in
+        :py:meth:`usage`.
+
+        :param activities:              Activities or string identifiers of the using activities.
+        :param entities:                Entities or string identifiers of the used entities.
+        :param roles:                   Functions of the entities with respect to the activities.
+        :param times:                   Times of the usages.
+        :param usageDescriptions:       Identifiers of the usage descriptions describing the usages.
+        :param identifiers:             Identifiers for the new usage records (default: None).
+        :param other_attributes:        Other attributes of each usage, as a dictionary or list of tuples.
+        :return: List of the new :py:class:`VOProvUsage` records.
+        """
+        return self._add_records(VOPROV_USAGE, identifiers, [
+            (VOPROV_ATTR_ACTIVITY, activities),
+            (VOPROV_ATTR_ENTITY, entities),
+            (VOPROV_ATTR_TIME, times),
+            (VOPROV_ATTR_ROLE, roles),
+            (VOPROV['descriptor'], usageDescriptions),
+        ], other_attributes)
+
+    def add_generations(self, entities, activities, roles=None, times=None, generationDescriptions=None,
+                        identifiers=None, other_attributes=None):
+        """
+        Creates new generation records in one pass, one for each (entity, activity) pair. The optional arguments are
+        sequences or iterables parallel to *entities*, a None item leaving the attribute unset, as in
+        :py:meth:`generation`.
+
+        :param entities:                Entities or string identifiers of the generated entities.
+        :param activities:              Activities or string identifiers of the generating activities.
+        :param roles:                   Functions of the entities with respect to the activities.
+        :param times:                   Times of the generations.
+        :param generationDescriptions:  Identifiers of the generation descriptions describing the generations.
+        :param identifiers:             Identifiers for the new generation records (default: None).
+        :param other_attributes:        Other attributes of each generation, as a dictionary or list of tuples.
+        :return: List of the new :py:class:`VOProvGeneration` records.
+        """
+        return self._add_records(VOPROV_GENERATION, identifiers, [
+            (VOPROV_ATTR_ENTITY, entities),
+            (VOPROV_ATTR_ACTIVITY, activities),
+            (VOPROV_ATTR_TIME, times),
+            (VOPROV_ATTR_ROLE, roles),
+            (VOPROV['descriptor'], generationDescriptions),
+        ], other_attributes)
+
     # update alias of prov function
     wasGeneratedBy = generation
     used = usage
@@ -2081,16 +2569,22 @@ class VOProvBundle(ProvBundle):
 class VOProvDocument(ProvDocument, VOProvBundle):
     """Adaptation of prov document to VOProvenance Document."""
 
-    def __init__(self, records=None, namespaces=None):
+    def __init__(self, records=None, namespaces=None, compact=False):
         """
         Constructor.
 
         :param records: Optional records to add to the document (default: None).
         :param namespaces: Optional iterable of :py:class:`~prov.identifier.Namespace`s
             to set the document up with (default: None).
+        :param compact: Whether to store the VOProv records of the document and its
+            bundles in their compact form, using less memory per record
+            (default: False).
         """
+        self._lineage = None
+        self._reachability = None
         VOProvBundle.__init__(
-            self, records=records, identifier=None, namespaces=namespaces
+            self, records=records, identifier=None, namespaces=namespaces,
+            compact=compact
         )
         self._bundles = dict()
 
@@ -2158,7 +2652,7 @@ class VOProvDocument(ProvDocument, VOProvBundle):
         """
         if self._bundles:
             # Creating a new document for all the records
-            new_doc = VOProvDocument()
+            new_doc = VOProvDocument(compact=self._compact)
             bundled_records = itertools.chain(
                 *[b.get_records() for b in self._bundles.values()]
             )
@@ -2176,7 +2670,7 @@ class VOProvDocument(ProvDocument, VOProvBundle):
 
         :return: :py:class:`ProvDocument`
         """
-        document = VOProvDocument(self._unified_records())
+        document = VOProvDocument(self._unified_records(), compact=self._compact)
         document._namespaces = self._namespaces
         for bundle in self.bundles:
             unified_bundle = bundle.unified()
@@ -2231,7 +2725,7 @@ class VOProvDocument(ProvDocument, VOProvBundle):
                     'Cannot add a document with nested bundles as a bundle.'
                 )
             # Make it a new ProvBundle
-            new_bundle = VOProvBundle(namespaces=bundle.namespaces)
+            new_bundle = VOProvBundle(namespaces=bundle.namespaces, compact=self._compact)
             new_bundle.update(bundle)
             bundle = new_bundle
 
@@ -2253,6 +2747,10 @@ class VOProvDocument(ProvDocument, VOProvBundle):
 
         self._bundles[valid_id] = bundle
         bundle._document = self
+        if self._lineage is not None:
+            self._lineage.add_records(bundle._records)
+        if self._reachability is not None:
+            self._reachability.add_records(bundle._records)
 
     def bundle(self, identifier):
         """
@@ -2276,8 +2774,298 @@ class VOProvDocument(ProvDocument, VOProvBundle):
         self._bundles[valid_id] = b
         return b
 
+    def lineage(self):
+        """
+        Returns the graph of the elements of the document and of its bundles
+        through their relations, built the first time it is needed and then
+        kept up to date as records and bundles are added.
+
+        :return: :py:class:`~voprov.models.voprovLineage.VOProvLineage`
+        """
+        if self._lineage is None:
+            # Imported here as the lineage module is only needed by the lineage queries.
+            from voprov.models.voprovLineage import VOProvLineage
+            lineage = VOProvLineage()
+            lineage.add_records(self._records)
+            for bundle in self.bundles:
+                lineage.add_records(bundle._records)
+            self._lineage = lineage
+        return self._lineage
+
+    def ancestors(self, identifier, max_depth=None, relation_types=None):
+        """
+        Returns the elements an element depends on, directly or through other
+        elements, following by default the usages, generations, derivations
+        and communications of the document and of its bundles, e.g. the raw
+        files and the activities a data product comes from.
+
+        :param identifier: The element or its identifier.
+        :param max_depth: Optional maximum number of relations between the
+            element and its ancestors (default: None, no limit).
+        :param relation_types: Optional iterable of the types of the relations
+            followed (default:
+            :py:const:`~voprov.models.voprovLineage.LINEAGE_RELATION_TYPES`).
+        :return: List of the identifiers of the ancestors, nearest first.
+        """
+        if isinstance(identifier, ProvRecord):
+            identifier = identifier.identifier
+        return self.lineage().ancestors(self.valid_qualified_name(identifier), max_depth, relation_types)
+
+    def descendants(self, identifier, max_depth=None, relation_types=None):
+        """
+        Returns the elements depending on an element, directly or through
+        other elements, following by default the usages, generations,
+        derivations and communications of the document and of its bundles,
+        e.g. the data products made from a raw file.
+
+        :param identifier: The element or its identifier.
+        :param max_depth: Optional maximum number of relations between the
+            element and its descendants (default: None, no limit).
+        :param relation_types: Optional iterable of the types of the relations
+            followed (default:
+            :py:const:`~voprov.models.voprovLineage.LINEAGE_RELATION_TYPES`).
+        :return: List of the identifiers of the descendants, nearest first.
+        """
+        if isinstance(identifier, ProvRecord):
+            identifier = identifier.identifier
+        return self.lineage().descendants(self.valid_qualified_name(identifier), max_depth, relation_types)
+
+    def reachability(self, relation_types=None):
+        """
+        Returns the reachability index of the document, answering
+        :py:meth:`depends_on` queries in near-constant time. The index is
+        built at its first query and then updated as records and bundles are
+        added to the document.
+
+        :param relation_types: Optional iterable of the types of the relations
+            followed, the index being built again if it follows other ones
+            (default:
+            :py:const:`~voprov.models.voprovLineage.LINEAGE_RELATION_TYPES`).
+        :return: :py:class:`~voprov.models.voprovReachability.VOProvReachability`
+        """
+        if self._reachability is None or \
+                (relation_types is not None and not self._reachability.follows(relation_types)):
+            # Imported here as the reachability module imports the model.
+            from voprov.models.voprovReachability import VOProvReachability
+            self._reachability = VOProvReachability(self, relation_types)
+        return self._reachability
+
+    def load_reachability(self, source):
+        """
+        Loads the reachability index of the document saved with
+        :py:meth:`~voprov.models.voprovReachability.VOProvReachability.save`,
+        instead of building it again.
+
+        Example::
+
+            document = voprov.read('provenance.vobix')
+            document.load_reachability('provenance.vobix.reach')
+            document.depends_on('ex:product', 'ex:calibration')
+
+        :param source: Path of the file or binary stream.
+        :return: :py:class:`~voprov.models.voprovReachability.VOProvReachability`
+        """
+        from voprov.models.voprovReachability import VOProvReachability
+        self._reachability = VOProvReachability.load(source, self)
+        return self._reachability
+
+    def depends_on(self, identifier, ancestor):
+        """
+        Returns whether an element depends on another one, directly or through
+        other elements, i.e. whether the other one is among its
+        :py:meth:`ancestors`, using the :py:meth:`reachability` index.
+
+        :param identifier: The element or its identifier.
+        :param ancestor: The element it may depend on, or its identifier.
+        :return: bool
+        """
+        if isinstance(identifier, ProvRecord):
+            identifier = identifier.identifier
+        if isinstance(ancestor, ProvRecord):
+            ancestor = ancestor.identifier
+        if not isinstance(identifier, QualifiedName):
+            identifier = self.valid_qualified_name(identifier)
+        if not isinstance(ancestor, QualifiedName):
+            ancestor = self.valid_qualified_name(ancestor)
+        return self.reachability().depends_on(identifier, ancestor)
+
+    def extract_lineage(self, identifier, direction='up', depth=None, relation_types=None):
+        """
+        Returns a new document holding the lineage of an element: the element
+        and its ancestors (direction 'up') or descendants ('down'), the
+        relations followed to reach them, the descriptions of these elements
+        and relations (isDescribedBy, or the descriptor attribute of a usage
+        or generation) and the parameters and configuration
+        files configuring them (wasConfiguredBy), with their own descriptions
+        and the relations between the descriptions (isRelatedTo).
+
+        Only the records of the lineage are read, through the indexes of the
+        document and of its bundles. The records are shared with this
+        document, not copied: they still belong to their bundle in this
+        document and must not be modified through the new one. The records of
+        a bundle go to the bundle of the same identifier in the new document.
+
+        :param identifier: The element or its identifier.
+        :param direction: 'up' for the ancestors of the element, 'down' for its
+            descendants (default: 'up').
+        :param depth: Optional maximum number of relations between the element
+            and the elements of its lineage (default: None, no limit).
+        :param relation_types: Optional iterable of the types of the relations
+            followed (default:
+            :py:const:`~voprov.models.voprovLineage.LINEAGE_RELATION_TYPES`).
+        :return: :py:class:`VOProvDocument`
+        """
+        # Imported here as the lineage module is only needed by the lineage queries.
+        from voprov.models.voprovLineage import LINEAGE_RELATION_TYPES, relation_edge
+        if direction == 'up':
+            near, far = 0, 1
+        elif direction == 'down':
+            near, far = 1, 0
+        else:
+            raise ProvException('The direction of a lineage is "up" or "down", not "%s"' % direction)
+        if isinstance(identifier, ProvRecord):
+            identifier = identifier.identifier
+        start = self.valid_qualified_name(identifier)
+        followed = set(LINEAGE_RELATION_TYPES if relation_types is None else relation_types)
+        bundles = [self] + [bundle for bundle in self.bundles if isinstance(bundle, VOProvBundle)]
+        shared = set()
+        relations = []
+
+        def share(bundle, record):
+            if id(record) not in shared:
+                shared.add(id(record))
+                relations.append((bundle, record))
+
+        # The elements of the lineage, breadth first.
+        attached = [start]
+        known = {start}
+        frontier = [start]
+        level = 0
+        while frontier and (depth is None or level < depth):
+            level += 1
+            next_frontier = []
+            for qualified_name in frontier:
+                for bundle in bundles:
+                    if near == 0:
+                        relations_found = bundle._relations_from(qualified_name)
+                    else:
+                        relations_found = bundle._relations_involving(qualified_name)
+                    for relation in relations_found:
+                        if relation.get_type() not in followed:
+                            continue
+                        edge = relation_edge(relation)
+                        if edge is None or edge[near] != qualified_name:
+                            continue
+                        share(bundle, relation)
+                        if edge[far] not in known:
+                            known.add(edge[far])
+                            attached.append(edge[far])
+                            next_frontier.append(edge[far])
+            frontier = next_frontier
+
+        # The descriptions and configurations of the elements and of the identified relations, and in turn theirs,
+        # starting with the descriptions the relations refer to (e.g. the usage description of a usage).
+        for _, relation in list(relations):
+            if relation.identifier is not None and relation.identifier not in known:
+                known.add(relation.identifier)
+                attached.append(relation.identifier)
+            for descriptor in relation._attributes.get(VOPROV_ATTR_DESCRIPTOR, ()):
+                if isinstance(descriptor, QualifiedName) and descriptor not in known:
+                    known.add(descriptor)
+                    attached.append(descriptor)
+        related = []
+        for qualified_name in attached:
+            for bundle in bundles:
+                for relation in bundle._relations_from(qualified_name):
+                    rec_type = relation.get_type()
+                    if rec_type not in (VOPROV_DESCRIPTION_RELATION, VOPROV_CONFIGURATION_RELATION,
+                                        VOPROV_RELATED_TO_RELATION):
+                        continue
+                    edge = relation_edge(relation)
+                    if edge is None or edge[0] != qualified_name:
+                        continue
+                    if rec_type == VOPROV_RELATED_TO_RELATION:
+                        related.append((bundle, relation, edge[1]))
+                        continue
+                    share(bundle, relation)
+                    if edge[1] not in known:
+                        known.add(edge[1])
+                        attached.append(edge[1])
+        for bundle, relation, relator in related:
+            if relator in known:
+                share(bundle, relation)
+
+        elements = []
+        for qualified_name in attached:
+            for bundle in bundles:
+                for record in bundle._records_identified_by(qualified_name):
+                    if id(record) not in shared:
+                        shared.add(id(record))
+                        elements.append((bundle, record))
+
+        lineage = VOProvDocument(compact=self._compact)
+        lineage._add_w3c_namespaces(self)
+        targets = {id(self): lineage}
+        for bundle, record in elements + relations:
+            target = targets.get(id(bundle))
+            if target is None:
+                target = targets[id(bundle)] = lineage.bundle(bundle.identifier)
+                for namespace in bundle._namespaces.get_registered_namespaces():
+                    if namespace.prefix not in lineage._namespaces:
+                        target.add_namespace(namespace)
+            target._add_record(record)
+        return lineage
+
+    def to_csr(self, relation_types=None):
+        """
+        Returns the provenance graph of the document and of its bundles as
+        NumPy arrays in the compressed sparse row (CSR) layout, with the table
+        of the identifiers of the nodes and the codes of the relation types of
+        the edges, for graph analytics (e.g. connected components, PageRank)
+        without going through networkx. Each relation is an edge from its
+        influenced element (the value of its first formal attribute) to its
+        influencing one, e.g. from an activity to the entity it used.
+
+        Requires NumPy, and SciPy for
+        :py:meth:`~voprov.models.voprovMatrix.VOProvCSR.to_scipy`.
+
+        Example::
+
+            csr = document.to_csr([VOPROV_USAGE, VOPROV_GENERATION])
+            matrix = csr.to_scipy()
+
+        :param relation_types: Optional iterable of the types of the relations
+            kept as edges (default: None, all relations).
+        :return: :py:class:`~voprov.models.voprovMatrix.VOProvCSR`
+        """
+        # Imported here as NumPy is an optional dependency.
+        from voprov.models.voprovMatrix import document_csr
+        return document_csr(self, relation_types)
+
+    @staticmethod
+    def from_w3c(prov_document, compact=False):
+        """
+        Converts a W3C PROV document, e.g. written by another tool or by :py:meth:`get_w3c`, to a VOProv document,
+        see :py:meth:`add_w3c_records`. The records of the document and of its bundles are read through their
+        ``_records`` sequences, one at a time, so that lazy documents are converted without being copied.
+
+        :param prov_document: The :py:class:`~prov.model.ProvDocument`.
+        :param compact: Whether the VOProv document stores its records compactly (default: False).
+        :return: :py:class:`VOProvDocument`
+        """
+        document = VOProvDocument(compact=compact)
+        document._add_w3c_namespaces(prov_document)
+        document.add_w3c_records(prov_document._records)
+        for prov_bundle in prov_document.bundles:
+            bundle = document.bundle(prov_bundle.identifier)
+            bundle._add_w3c_namespaces(prov_bundle)
+            bundle.add_w3c_records(prov_bundle._records)
+        return document
+
     # Serializing and deserializing
-    def serialize(self, destination=None, format='json', **args):
+    def serialize(self, destination=None, format='json', buffer_size=-1,
+                  fsync=False, compression=None, compression_level=None,
+                  **args):
         """
         Serialize the :py:class:`ProvDocument` to the destination.
 
@@ -2285,21 +3073,41 @@ class VOProvDocument(ProvDocument, VOProvBundle):
         `:py:attr:~prov.serializers.Registry.serializers` after loading them via
         `:py:func:~prov.serializers.Registry.load_serializers()`.
 
-        :param destination: Stream object to serialize the output to. Default is
-            `None`, which serializes as a string.
+        When the destination is a file path, the output is written to a
+        temporary file in the same directory, which then replaces the
+        destination, so that the destination is never left half written.
+
+        :param destination: Stream object or file path to serialize the output
+            to. Default is `None`, which serializes as a string.
         :param format: Serialization format (default: 'json'), defaulting to
             PROV-JSON.
-        :return: Serialization in a string if no destination was given,
-            None otherwise.
+        :param buffer_size: Size in bytes of the write buffer of a file path
+            destination (default: -1, the io module default).
+        :param fsync: Flush a file path destination and its directory to disk
+            before returning (default: False).
+        :param compression: 'gzip', 'bz2' or 'lzma' to compress the output on
+            the fly, False not to compress it. By default, a file path
+            destination is compressed according to its extension (.gz, .bz2,
+            .xz) and streams are not compressed.
+        :param compression_level: The compression level, None for the default
+            of the codec.
+        :return: Serialization in a string if no destination was given, in
+            bytes if it is compressed or binary, None otherwise.
         """
         serializer = serializers.get(format)(self)
         if destination is None:
+            if compression or getattr(serializer, 'binary', False):
+                stream = io.BytesIO()
+                _serialize_compressed(serializer, stream, compression,
+                                      compression_level, args)
+                return stream.getvalue()
             stream = io.StringIO()
             serializer.serialize(stream, **args)
             return stream.getvalue()
         if hasattr(destination, "write"):
             stream = destination
-            serializer.serialize(stream, **args)
+            _serialize_compressed(serializer, stream, compression,
+                                  compression_level, args)
         else:
             location = destination
             scheme, netloc, path, params, _query, fragment = urlparse(location)
@@ -2307,18 +3115,88 @@ class VOProvDocument(ProvDocument, VOProvBundle):
                 print("WARNING: not saving as location " +
                       "is not a local file reference")
                 return
-            fd, name = tempfile.mkstemp()
-            stream = os.fdopen(fd, "wb")
-            serializer.serialize(stream, **args)
-            stream.close()
-            if hasattr(shutil, "move"):
-                shutil.move(name, path)
-            else:
-                shutil.copy(name, path)
-                os.remove(name)
+            if compression is None:
+                compression = compression_from_name(path)
+            destination_file = _DestinationFile(path, buffer_size, fsync)
+            try:
+                _serialize_compressed(serializer, destination_file.stream,
+                                      compression, compression_level, args)
+            except BaseException:
+                destination_file.discard()
+                raise
+            destination_file.commit()
+
+    def serialize_many(self, destinations, buffer_size=-1, fsync=False,
+                       compression=None, compression_level=None):
+        """
+        Serializes the :py:class:`ProvDocument` in several formats at once,
+        e.g. ``document.serialize_many({'json': 'doc.json', 'xml':
+        'doc.xml', 'provn': 'doc.provn'})``.
+
+        The formats are serialized one after the other, each output being the
+        same as :py:meth:`serialize` writes. The files are only replaced once
+        all the formats are written, none of them being if one fails.
+
+        :param destinations: Dict of the destinations by format, a destination
+            being a stream, a file path or None, like in :py:meth:`serialize`,
+            or a tuple (destination, dict of the options of the serializer).
+        :param buffer_size: See :py:meth:`serialize`.
+        :param fsync: See :py:meth:`serialize`.
+        :param compression: See :py:meth:`serialize`, for all the formats.
+        :param compression_level: See :py:meth:`serialize`.
+        :return: Dict of the serializations of the formats having no
+            destination, by format, None if all have one.
+        """
+        results = dict()
+        destination_files = []
+        try:
+            for format, destination in destinations.items():
+                args = dict()
+                if isinstance(destination, tuple):
+                    destination, args = destination
+                serializer = serializers.get(format)(self)
+                format_compression = compression
+                if destination is None:
+                    if compression or getattr(serializer, 'binary', False):
+                        stream = io.BytesIO()
+                    else:
+                        stream = io.StringIO()
+                    results[format] = stream
+                elif hasattr(destination, "write"):
+                    stream = destination
+                else:
+                    scheme, netloc, path, params, _query, fragment = \
+                        urlparse(destination)
+                    if netloc != "":
+                        print("WARNING: not saving as location " +
+                              "is not a local file reference")
+                        continue
+                    if format_compression is None:
+                        format_compression = compression_from_name(path)
+                    destination_file = _DestinationFile(path, buffer_size,
+                                                        fsync)
+                    destination_files.append(destination_file)
+                    stream = destination_file.stream
+                if format_compression:
+                    with compressed_stream(stream, format_compression, 'wb',
+                                           compression_level) as compressor:
+                        serializer.serialize(compressor, **args)
+                else:
+                    serializer.serialize(stream, **args)
+        except BaseException:
+            for destination_file in destination_files:
+                destination_file.discard()
+            raise
+        for destination_file in destination_files:
+            destination_file.commit()
+        if not results:
+            return None
+        return dict((format, stream.getvalue())
+                    for format, stream in results.items())
 
     @staticmethod
-    def deserialize(source=None, content=None, format='json', **args):
+    def deserialize(source=None, content=None, format='json',
+                    compression=None, **args):
         """
         Deserialize the :py:class:`ProvDocument` from source (a stream or a
         file path) or directly from a string content.
@@ -2335,11 +3213,22 @@ class VOProvDocument(ProvDocument, VOProvBundle):
             (default: None).
         :param format: Serialization format (default: 'json'), defaulting to
             PROV-JSON.
+        :param compression: 'gzip', 'bz2' or 'lzma' to decompress the input on
+            the fly, False not to decompress it. By default, binary inputs are
+            decompressed according to their first bytes.
         :return: :py:class:`ProvDocument`
         """
         serializer = serializers.get(format)()
 
         if content is not None:
+            if isinstance(content, six.binary_type) and compression is None:
+                compression = compression_from_head(content)
+            if compression:
+                with compressed_stream(io.BytesIO(content),
+                                       compression) as stream:
+                    return serializer.deserialize(stream, **args)
+            if getattr(serializer, 'binary', False):
+                return serializer.deserialize(io.BytesIO(content), **args)
             # io.StringIO only accepts unicode strings
             stream = io.StringIO(
                 content if not isinstance(content, six.binary_type)
@@ -2349,9 +3238,24 @@ class VOProvDocument(ProvDocument, VOProvBundle):
 
         if source is not None:
             if hasattr(source, "read"):
+                if compression is None:
+                    head, source = peek(source, _MAGIC_SIZE)
+                    compression = compression_from_head(head)
+                if compression:
+                    with compressed_stream(source, compression) as stream:
+                        return serializer.deserialize(stream, **args)
                 return serializer.deserialize(source, **args)
             else:
-                with open(source) as f:
+                if compression is None:
+                    with open(source, "rb") as f:
+                        compression = compression_from_head(
+                            f.read(_MAGIC_SIZE))
+                if compression:
+                    with open(source, "rb") as f:
+                        with compressed_stream(f, compression) as stream:
+                            return serializer.deserialize(stream, **args)
+                mode = "rb" if getattr(serializer, 'binary', False) else "r"
+                with open(source, mode) as f:
                     return serializer.deserialize(f, **args)
 
 
@@ -2401,3 +3305,30 @@ PROV_REC_CLS.update({
     VOPROV_RELATED_TO_RELATION: VOProvIsRelatedTo,
     VOPROV_REFERENCE_RELATION: VOProvHadReference,
 })
+
+#  voprov record types of the W3C PROV records, by W3C PROV record type and voprov type asserted by get_w3c(), or
+#  None for the records written by other tools
+W3C_REC_TYPES = dict()
+for _record_type in (VOPROV_ENTITY, VOPROV_ACTIVITY, VOPROV_AGENT, VOPROV_USAGE, VOPROV_GENERATION,
+                     VOPROV_COMMUNICATION, VOPROV_START, VOPROV_END, VOPROV_INVALIDATION, VOPROV_DERIVATION,
+                     VOPROV_ATTRIBUTION, VOPROV_ASSOCIATION, VOPROV_DELEGATION, VOPROV_INFLUENCE,
+                     VOPROV_SPECIALIZATION, VOPROV_ALTERNATE, VOPROV_MENTION, VOPROV_MEMBERSHIP):
+    W3C_REC_TYPES[PROV[_record_type.localpart], _record_type] = _record_type
+    W3C_REC_TYPES[PROV[_record_type.localpart], None] = _record_type
+for _record_type in (VOPROV_VALUE_ENTITY, VOPROV_DATASET_ENTITY,
+                     VOPROV_ACTIVITY_DESCRIPTION, VOPROV_USAGE_DESCRIPTION, VOPROV_GENERATION_DESCRIPTION,
+                     VOPROV_ENTITY_DESCRIPTION, VOPROV_VALUE_DESCRIPTION, VOPROV_DATASET_DESCRIPTION,
+                     VOPROV_CONFIG_FILE_DESCRIPTION, VOPROV_PARAMETER_DESCRIPTION,
+                     VOPROV_CONFIGURATION_FILE, VOPROV_CONFIGURATION_PARAMETER):
+    W3C_REC_TYPES[PROV_ENTITY, _record_type] = _record_type
+for _record_type in (VOPROV_DESCRIPTION_RELATION, VOPROV_CONFIGURATION_RELATION, VOPROV_RELATED_TO_RELATION,
+                     VOPROV_REFERENCE_RELATION):
+    W3C_REC_TYPES[PROV_INFLUENCE, _record_type] = _record_type
+del _record_type
+
+#  compact versions of the voprov classes, used by documents created with compact=True
+VOPROV_COMPACT_REC_CLS = dict(
+    (record_type, compact_record_class(record_class))
+    for record_type, record_class in PROV_REC_CLS.items()
+    if record_type.namespace.uri == VOPROV.uri
+)
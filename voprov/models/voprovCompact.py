@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+MAX_ATTRIBUTE_KEYS = 4096
+"""Maximum number of interned attribute names, the names seen once the table is full not being interned."""
+
+_ATTRIBUTE_KEYS = dict()
+"""
+Interned attribute names, shared by the compact records of all documents so that each name is kept once in memory.
+The table is never pruned, but stops growing at MAX_ATTRIBUTE_KEYS names, e.g. in a long-lived process seeing many
+distinct attribute names.
+"""
+
+
+def _intern_key(attr_name):
+    try:
+        return _ATTRIBUTE_KEYS[attr_name]
+    except KeyError:
+        if len(_ATTRIBUTE_KEYS) < MAX_ATTRIBUTE_KEYS:
+            _ATTRIBUTE_KEYS[attr_name] = attr_name
+        return attr_name
+
+
+class VOProvAttributeValues(set):
+    """Values of one attribute of a compact record, writing back the values added to it or removed from it."""
+
+    def __init__(self, attributes, attr_name, values=()):
+        set.__init__(self, values)
+        self._attributes = attributes
+        self._attr_name = attr_name
+
+    def add(self, value):
+        if value not in self:
+            set.add(self, value)
+            self._attributes._add(self._attr_name, value)
+
+    def update(self, *others):
+        for values in others:
+            for value in values:
+                self.add(value)
+
+    def discard(self, value):
+        if value in self:
+            set.discard(self, value)
+            self._attributes._remove(self._attr_name, value)
+
+    def remove(self, value):
+        if value not in self:
+            raise KeyError(value)
+        self.discard(value)
+
+    def pop(self):
+        value = set.pop(self)
+        self._attributes._remove(self._attr_name, value)
+        return value
+
+    def clear(self):
+        for value in list(self):
+            self.discard(value)
+
+    def difference_update(self, *others):
+        for values in others:
+            for value in values:
+                self.discard(value)
+
+    def intersection_update(self, *others):
+        kept = set(self).intersection(*others)
+        for value in list(self):
+            if value not in kept:
+                self.discard(value)
+
+    def symmetric_difference_update(self, other):
+        for value in set(other):
+            if value in self:
+                self.discard(value)
+            else:
+                self.add(value)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+
+class VOProvCompactAttributes(object):
+    """
+    Compact replacement for the ``defaultdict(set)`` holding the attributes of a record. The values of the formal
+    attributes are kept in a tuple following the record's FORMAL_ATTRIBUTES, the other attributes in a list of
+    (name, value) pairs with interned names, created with the first of them. Past INDEXED_SIZE other attributes,
+    their values are also indexed by name, so that adding many of them stays linear.
+    """
+    __slots__ = ('_names', '_formal', '_extra', '_index')
+
+    INDEXED_SIZE = 8
+    """Number of other attributes from which they are indexed by name."""
+
+    def __init__(self, formal_names):
+        """
+        Constructor.
+
+        :param formal_names:            The FORMAL_ATTRIBUTES of the record class.
+        """
+        self._names = formal_names
+        self._formal = (None,) * len(formal_names)
+        self._extra = None
+        self._index = None
+
+    def _extra_values(self, attr_name):
+        if self._index is not None:
+            return self._index.get(attr_name, ())
+        if not self._extra:
+            return ()
+        return [value for name, value in self._extra if name == attr_name]
+
+    def _reindex(self):
+        """Indexes the values of the other attributes by name once they are more than INDEXED_SIZE, or drops the index."""
+        if self._extra is None or len(self._extra) <= self.INDEXED_SIZE:
+            self._index = None
+            return
+        index = dict()
+        for name, value in self._extra:
+            index.setdefault(name, []).append(value)
+        self._index = index
+
+    def _values(self, attr_name):
+        values = list(self._extra_values(attr_name))
+        if attr_name in self._names:
+            value = self._formal[self._names.index(attr_name)]
+            if value is not None:
+                values.insert(0, value)
+        return values
+
+    def _add(self, attr_name, value):
+        if attr_name in self._names:
+            index = self._names.index(attr_name)
+            if self._formal[index] is None:
+                self._formal = self._formal[:index] + (value,) + self._formal[index + 1:]
+                return
+            if self._formal[index] == value:
+                return
+        if value in self._extra_values(attr_name):
+            return
+        attr_name = _intern_key(attr_name)
+        if self._extra is None:
+            self._extra = []
+        self._extra.append((attr_name, value))
+        if self._index is not None:
+            self._index.setdefault(attr_name, []).append(value)
+        elif len(self._extra) > self.INDEXED_SIZE:
+            self._reindex()
+
+    def _remove(self, attr_name, value):
+        if attr_name in self._names:
+            index = self._names.index(attr_name)
+            if self._formal[index] == value:
+                self._formal = self._formal[:index] + (None,) + self._formal[index + 1:]
+                return
+        if self._extra:
+            self._extra = [(name, other) for name, other in self._extra if name != attr_name or other != value]
+            self._reindex()
+
+    def __getitem__(self, attr_name):
+        return VOProvAttributeValues(self, attr_name, self._values(attr_name))
+
+    def __setitem__(self, attr_name, values):
+        self.__delitem__(attr_name)
+        for value in values:
+            self._add(attr_name, value)
+
+    def __delitem__(self, attr_name):
+        if attr_name in self._names:
+            index = self._names.index(attr_name)
+            self._formal = self._formal[:index] + (None,) + self._formal[index + 1:]
+        if self._extra:
+            self._extra = [(name, value) for name, value in self._extra if name != attr_name]
+            self._reindex()
+
+    def __contains__(self, attr_name):
+        return bool(self._values(attr_name))
+
+    def __iter__(self):
+        seen = set()
+        for name, value in zip(self._names, self._formal):
+            if value is not None:
+                seen.add(name)
+                yield name
+        for name, _ in self._extra or ():
+            if name not in seen:
+                seen.add(name)
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        return bool(self._extra) or any(value is not None for value in self._formal)
+
+    __nonzero__ = __bool__
+
+    def get(self, attr_name, default=None):
+        values = self._values(attr_name)
+        return set(values) if values else default
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [set(self._values(name)) for name in self]
+
+    def items(self):
+        return [(name, set(self._values(name))) for name in self]
+
+
+class VOProvCompactRecord(object):
+    """
+    Mixin storing the attributes of a record in a :py:class:`VOProvCompactAttributes` instead of prov's
+    ``defaultdict(set)``. It is combined with the VOProv record classes by :py:func:`compact_record_class`.
+    """
+
+    def __init__(self, bundle, identifier, attributes=None):
+        super(VOProvCompactRecord, self).__init__(bundle, identifier)
+        self._attributes = VOProvCompactAttributes(self.FORMAL_ATTRIBUTES or ())
+        if attributes:
+            self.add_attributes(attributes)
+
+    def copy(self):
+        """
+        Return an exact copy of this record.
+        """
+        return self.__class__(self._bundle, self.identifier, self.attributes)
+
+
+def compact_record_class(record_class):
+    """
+    Returns the compact version of a record class, having the same name and behaviour.
+
+    :param record_class:                A :py:class:`prov.model.ProvRecord` subclass.
+    """
+    return type(str(record_class.__name__), (VOProvCompactRecord, record_class), {
+        '__doc__': record_class.__doc__,
+        '__module__': record_class.__module__,
+    })
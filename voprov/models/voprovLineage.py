@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from prov.model import QualifiedName, first
+from voprov.models.constants import (VOPROV_COMMUNICATION, VOPROV_DERIVATION,
+                                     VOPROV_GENERATION, VOPROV_USAGE)
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+LINEAGE_RELATION_TYPES = (VOPROV_USAGE, VOPROV_GENERATION, VOPROV_DERIVATION, VOPROV_COMMUNICATION)
+"""Types of the relations followed by default to find the ancestors and descendants of an element."""
+
+
+class VOProvLineage(object):
+    """
+    Adjacency of the elements of a document and of its bundles through their
+    relations, the elements of different bundles having the same identifier
+    being the same node. A relation is an edge from the value of its first
+    formal attribute, the influenced element (e.g. the activity of a usage,
+    the entity of a generation), up to the value of its second one, the
+    influencing element (the entity used, the generating activity).
+
+    The edges are kept by relation type, in both directions, so that a
+    traversal only reads the edges of the elements it visits.
+    """
+
+    def __init__(self):
+        # Index of each element by URI, and qualified name of each index.
+        self._nodes = dict()
+        self._names = []
+        # Indexes of the influencing (upstream) and influenced (downstream) elements of each element, by relation
+        # type and index.
+        self._upstream = dict()
+        self._downstream = dict()
+
+    def __len__(self):
+        return len(self._names)
+
+    def _node(self, qualified_name):
+        """Returns the index of an element, adding it to the graph if needed."""
+        try:
+            return self._nodes[qualified_name._uri]
+        except KeyError:
+            node = self._nodes[qualified_name._uri] = len(self._names)
+            self._names.append(qualified_name)
+            return node
+
+    def add_relation(self, relation):
+        """
+        Adds the edge of a relation, if both its influenced and influencing
+        elements are given.
+
+        :param relation: The relation.
+        """
+        edge = relation_edge(relation)
+        if edge is None:
+            return
+        influenced, influencer = edge
+        rec_type = relation.get_type()
+        if rec_type not in self._upstream:
+            self._upstream[rec_type] = dict()
+            self._downstream[rec_type] = dict()
+        influenced = self._node(influenced)
+        influencer = self._node(influencer)
+        self._upstream[rec_type].setdefault(influenced, []).append(influencer)
+        self._downstream[rec_type].setdefault(influencer, []).append(influenced)
+
+    def add_records(self, records):
+        """
+        Adds the edges of the relations among some records.
+
+        :param records: Iterable of records.
+        """
+        for record in records:
+            if record.is_relation():
+                self.add_relation(record)
+
+    def ancestors(self, identifier, max_depth=None, relation_types=None):
+        """
+        Returns the elements an element depends on, directly or not.
+
+        :param identifier: Qualified name of the element.
+        :param max_depth: Optional maximum number of relations between the
+            element and its ancestors (default: None, no limit).
+        :param relation_types: Optional iterable of the types of the relations
+            followed (default: :py:const:`LINEAGE_RELATION_TYPES`).
+        :return: List of the qualified names of the ancestors, nearest first.
+        """
+        return self._traverse(self._upstream, identifier, max_depth, relation_types)
+
+    def descendants(self, identifier, max_depth=None, relation_types=None):
+        """
+        Returns the elements depending on an element, directly or not.
+
+        :param identifier: Qualified name of the element.
+        :param max_depth: Optional maximum number of relations between the
+            element and its descendants (default: None, no limit).
+        :param relation_types: Optional iterable of the types of the relations
+            followed (default: :py:const:`LINEAGE_RELATION_TYPES`).
+        :return: List of the qualified names of the descendants, nearest first.
+        """
+        return self._traverse(self._downstream, identifier, max_depth, relation_types)
+
+    def _traverse(self, edges, identifier, max_depth, relation_types):
+        """Walks breadth first through the edges of the given relation types, returning the elements reached."""
+        if relation_types is None:
+            relation_types = LINEAGE_RELATION_TYPES
+        followed = []
+        for rec_type in relation_types:
+            if rec_type in edges and rec_type not in followed:
+                followed.append(rec_type)
+        adjacencies = [edges[rec_type] for rec_type in followed]
+        if identifier is None:
+            return []
+        start = self._nodes.get(identifier._uri)
+        if start is None or not adjacencies:
+            return []
+        visited = {start}
+        reached = []
+        frontier = [start]
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for node in frontier:
+                for adjacency in adjacencies:
+                    for neighbour in adjacency.get(node, ()):
+                        if neighbour not in visited:
+                            visited.add(neighbour)
+                            next_frontier.append(neighbour)
+            reached.extend(next_frontier)
+            frontier = next_frontier
+        names = self._names
+        return [names[node] for node in reached]
+
+
+def relation_edge(relation):
+    """
+    Returns the influenced and influencing elements of a relation, the values
+    of its first two formal attributes, or None if one of them is not given.
+
+    :param relation: The relation.
+    :return: Tuple of two :py:class:`~prov.identifier.QualifiedName`, or None.
+    """
+    formal_names = relation.FORMAL_ATTRIBUTES
+    if not formal_names or len(formal_names) < 2:
+        return None
+    # Only the first two formal attributes are read, not all of them as with formal_attributes.
+    attributes = relation._attributes
+    influenced = first(attributes[formal_names[0]])
+    influencer = first(attributes[formal_names[1]])
+    if not isinstance(influenced, QualifiedName) or not isinstance(influencer, QualifiedName):
+        return None
+    return influenced, influencer
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import mmap
+from collections import OrderedDict, defaultdict
+
+import six
+from six.moves.collections_abc import Sequence
+
+from prov.model import ProvException, ProvRecord
+from voprov.models.model import VOProvBundle, VOProvDocument
+from voprov.serializers.vobin import RECORD_TYPE_CODES
+from voprov.serializers.vobix import VOBixIndex
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+DEFAULT_CACHE_SIZE = 10000
+"""Default number of decoded records kept by a :py:class:`VOProvMappedDocument`."""
+
+
+class _RecordCache(object):
+    """Least recently used records of a mapped document, shared by its bundles."""
+
+    def __init__(self, size):
+        self._size = size
+        self._records = OrderedDict()
+
+    def get(self, key):
+        record = self._records.pop(key, None)
+        if record is not None:
+            self._records[key] = record
+        return record
+
+    def add(self, key, record):
+        if self._size <= 0:
+            return
+        self._records[key] = record
+        while len(self._records) > self._size:
+            self._records.popitem(last=False)
+
+    def clear(self):
+        self._records.clear()
+
+    def __len__(self):
+        return len(self._records)
+
+
+class VOProvMappedRecords(Sequence):
+    """Read-only list of the records of a mapped bundle, each decoded when accessed."""
+
+    def __init__(self, bundle):
+        self._bundle = bundle
+
+    def __len__(self):
+        return self._bundle._index.record_count(self._bundle._position)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._bundle._record(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return self._bundle._record(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._bundle._record(i)
+
+
+class VOProvMappedBundle(VOProvBundle):
+    """
+    Read-only bundle of a :py:class:`VOProvMappedDocument`, decoding its
+    records only when they are accessed.
+    """
+
+    def __init__(self, index, position, document):
+        """
+        Constructor.
+
+        :param index: The :py:class:`~voprov.serializers.vobix.VOBixIndex` of the file.
+        :param position: The position of the bundle in the index.
+        :param document: The mapped document of the bundle.
+        """
+        VOProvBundle.__init__(self, identifier=index.bundle_identifier(position), document=document)
+        self._index = index
+        self._position = position
+        self._records = VOProvMappedRecords(self)
+        _add_namespaces(self, index, position)
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self._identifier)
+
+    def _record(self, record_index):
+        """Returns a record, decoding it unless it is among the most recently used ones."""
+        cache = self.document._cache
+        key = (self._position, record_index)
+        record = cache.get(key)
+        if record is None:
+            rec_type, identifier, attributes = self._index.record(self._position, record_index)
+            record = self._record_class(rec_type)(self, identifier)
+            record_attributes = record._attributes
+            for attr, value in attributes:
+                record_attributes[attr].add(value)
+            cache.add(key, record)
+        return record
+
+    def get_record(self, identifier):
+        """
+        Returns the records having the given identifier, found through the
+        index of the file.
+
+        :param identifier: The identifier of the records.
+        :return: List of :py:class:`ProvRecord` objects.
+        """
+        if identifier is None:
+            return None
+        try:
+            valid_id = self.valid_qualified_name(identifier)
+        except ProvException:
+            return None
+        if valid_id is None:
+            return None
+        return [self._record(i) for i in self._index.find(self._position, six.text_type(valid_id.uri))]
+
+    def records_of_type(self, record_type):
+        """
+        Returns all records of the given type, in insertion order. Only these
+        records are decoded, the types being kept in the index of the file.
+
+        :param record_type:             Type of the records (e.g. :py:const:`VOPROV_ACTIVITY`).
+        :return: List of :py:class:`ProvRecord` objects.
+        """
+        code = RECORD_TYPE_CODES.get(record_type, 0)
+        records = [self._record(i) for i, record_code in enumerate(self._index.record_codes(self._position))
+                   if record_code == code]
+        if code == 0:
+            records = [record for record in records if record.get_type() == record_type]
+        return records
+
+    def relations_involving(self, identifier, attribute=None):
+        """
+        Returns all relations having the given element as one of their formal
+        attributes. Every relation of the bundle is decoded.
+
+        :param identifier:              Element or identifier of the element involved in the relations.
+        :param attribute:               Optional formal attribute the element must be the value of
+                                        (e.g. :py:const:`VOPROV_ATTR_ENTITY`, default: None).
+        :return: List of :py:class:`ProvRelation` objects.
+        """
+        if isinstance(identifier, ProvRecord):
+            identifier = identifier.identifier
+        valid_id = self.valid_qualified_name(identifier)
+        if attribute is not None:
+            attribute = self.valid_qualified_name(attribute)
+        relations = []
+        for record in self._records:
+            if not record.is_relation():
+                continue
+            if attribute is None:
+                if any(value == valid_id for _, value in record.formal_attributes):
+                    relations.append(record)
+            elif valid_id in record._attributes.get(attribute, ()):
+                relations.append(record)
+        return relations
+
+    def _records_identified_by(self, qualified_name):
+        return [self._record(i) for i in self._index.find(self._position, six.text_type(qualified_name.uri))]
+
+    def _relations_involving(self, qualified_name):
+        return [record for record in self._records
+                if record.is_relation() and any(value == qualified_name for _, value in record.formal_attributes)]
+
+    def _relations_from(self, qualified_name):
+        return [record for record in self._records
+                if record.is_relation() and record.formal_attributes and
+                record.formal_attributes[0][1] == qualified_name]
+
+    def _unified_records(self):
+        id_map = defaultdict(list)
+        for record in self._records:
+            if record.identifier is not None:
+                id_map[record.identifier].append(record)
+        self._id_map = id_map
+        try:
+            return super(VOProvMappedBundle, self)._unified_records()
+        finally:
+            self._id_map = defaultdict(list)
+
+    def unified(self):
+        """
+        Unifies all records in the bundle that haves same identifiers
+
+        :returns: :py:class:`VOProvBundle` -- the new unified bundle.
+        """
+        return VOProvBundle(records=self._unified_records(), identifier=self.identifier)
+
+    def _read_only(self, *args, **kwargs):
+        raise ProvException('A %s is read-only' % self.__class__.__name__)
+
+    _add_record = _read_only
+    add_record = _read_only
+    new_record = _read_only
+    add_namespace = _read_only
+    set_default_namespace = _read_only
+    unified_relations = _read_only
+    update = _read_only
+
+
+class VOProvMappedDocument(VOProvMappedBundle, VOProvDocument):
+    """
+    Read-only view of a document saved in the vobix format, memory-mapping
+    the file and decoding the records only when they are accessed, e.g. by
+    :py:meth:`get_record`, by iterating over :py:attr:`records` or through
+    the :py:attr:`bundles`. At most ``cache_size`` decoded records are kept,
+    the least recently used ones being decoded again when accessed.
+
+    Example::
+
+        with VOProvMappedDocument('archive.vobix') as document:
+            activity = document.get_record('ex:activity_12')[0]
+    """
+
+    def __init__(self, source, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Constructor.
+
+        :param source: Path of the vobix file, or its content as bytes.
+        :param cache_size: Maximum number of decoded records kept in memory
+            (default: :py:const:`DEFAULT_CACHE_SIZE`).
+        """
+        self._file = None
+        self._mmap = None
+        if isinstance(source, six.binary_type):
+            buffer = source
+        else:
+            self._file = open(source, 'rb')
+            try:
+                buffer = self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except BaseException:
+                self._file.close()
+                raise
+        try:
+            index = VOBixIndex(buffer)
+        except BaseException:
+            self.close()
+            raise
+        self._cache = _RecordCache(cache_size)
+        VOProvBundle.__init__(self, identifier=None)
+        self._index = index
+        self._position = 0
+        self._records = VOProvMappedRecords(self)
+        _add_namespaces(self, index, 0)
+        self._bundles = dict()
+        self._lineage = None
+        self._reachability = None
+        for position in range(1, index.bundle_count):
+            bundle = VOProvMappedBundle(index, position, self)
+            self._bundles[bundle.identifier] = bundle
+
+    def __repr__(self):
+        return '<VOProvMappedDocument>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def document(self):
+        return self
+
+    def close(self):
+        """
+        Unmaps and closes the file. The records already decoded remain usable.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if hasattr(self, '_cache'):
+            self._cache.clear()
+
+    def unified(self):
+        """
+        Returns a new document containing all records having same identifiers
+        unified (including those inside bundles).
+
+        :return: :py:class:`VOProvDocument`
+        """
+        document = VOProvDocument(self._unified_records())
+        document._namespaces = self._namespaces
+        for bundle in self.bundles:
+            document.add_bundle(bundle.unified())
+        return document
+
+    add_bundle = VOProvMappedBundle._read_only
+    bundle = VOProvMappedBundle._read_only
+
+
+def _add_namespaces(bundle, index, position):
+    """Registers the namespaces of a bundle of the index, bypassing the read-only bundle methods."""
+    namespaces = bundle._namespaces
+    default_namespace = index.bundle_default_namespace(position)
+    if default_namespace is not None:
+        namespaces.set_default_namespace(default_namespace)
+    for namespace in index.bundle_namespaces(position):
+        if namespace.prefix not in namespaces:
+            namespaces.add_namespace(namespace)
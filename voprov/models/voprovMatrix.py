@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from collections import defaultdict
+
+import numpy
+
+from prov.model import PROV_REC_CLS, ProvElement, ProvRelation
+from voprov.models.voprovLineage import relation_edge
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+
+class VOProvCSR(object):
+    """
+    Provenance graph of a document and of its bundles in the compressed
+    sparse row (CSR) layout, for graph analytics with NumPy or SciPy. The
+    elements are the nodes, the elements of different bundles having the
+    same identifier being the same node, and each relation is an edge from
+    the value of its first formal attribute (e.g. the activity of a usage) to
+    the value of its second one (the entity used).
+
+    The edges of node ``i`` go to the nodes ``indices[indptr[i]:indptr[i + 1]]``,
+    their relation types being ``relation_types[edge_types[indptr[i]:indptr[i + 1]]]``.
+
+    Example::
+
+        csr = document.to_csr()
+        matrix = csr.to_scipy()
+        count, labels = scipy.sparse.csgraph.connected_components(matrix)
+    """
+
+    def __init__(self, indptr, indices, edge_types, nodes, relation_types):
+        """
+        Constructor.
+
+        :param indptr: Array of the offsets of the edges of each node in
+            ``indices``, one more than nodes.
+        :param indices: Array of the target node of each edge.
+        :param edge_types: Array of the code of the relation type of each edge.
+        :param nodes: List of the qualified names of the nodes.
+        :param relation_types: List of the relation types, by code.
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.edge_types = edge_types
+        self.nodes = nodes
+        self.relation_types = relation_types
+        self._node_index = None
+
+    def __repr__(self):
+        return '<%s: %d nodes, %d edges>' % (self.__class__.__name__, len(self.nodes), len(self.indices))
+
+    def node_index(self, identifier):
+        """
+        Returns the index of a node.
+
+        :param identifier: Qualified name of the element.
+        :return: int, or None if the element is not in the graph.
+        """
+        if self._node_index is None:
+            self._node_index = dict((node.uri, index) for index, node in enumerate(self.nodes))
+        return self._node_index.get(identifier.uri)
+
+    def to_scipy(self):
+        """
+        Returns the adjacency matrix of the graph as a
+        :py:class:`scipy.sparse.csr_matrix` of ones, sharing the arrays of
+        this graph. Relations repeated between two nodes are kept as separate
+        entries, summed by most SciPy operations.
+
+        :return: :py:class:`scipy.sparse.csr_matrix`
+        """
+        # Imported here as SciPy is only needed for the matrix.
+        from scipy.sparse import csr_matrix
+        size = len(self.nodes)
+        return csr_matrix((numpy.ones(len(self.indices)), self.indices, self.indptr), shape=(size, size))
+
+
+def document_csr(document, relation_types=None):
+    """
+    Returns the provenance graph of a document and of its bundles in the CSR
+    layout, see :py:meth:`~voprov.models.model.VOProvDocument.to_csr`.
+
+    :param document: The document.
+    :param relation_types: Optional iterable of the types of the relations
+        kept as edges (default: None, all relations).
+    :return: :py:class:`VOProvCSR`
+    """
+    records_of_type = [_records_by_type(bundle) for bundle in [document] + list(document.bundles)]
+    if relation_types is None:
+        relation_types = [rec_type for rec_type, record_class in PROV_REC_CLS.items()
+                          if issubclass(record_class, ProvRelation)]
+    element_types = [rec_type for rec_type, record_class in PROV_REC_CLS.items()
+                     if issubclass(record_class, ProvElement)]
+
+    # Index of each node by URI, the declared elements first.
+    node_index = dict()
+    nodes = []
+    for bundle_records in records_of_type:
+        for rec_type in element_types:
+            for record in bundle_records(rec_type):
+                identifier = record._identifier
+                if identifier is not None and identifier._uri not in node_index:
+                    node_index[identifier._uri] = len(nodes)
+                    nodes.append(identifier)
+
+    # One pass over the relations of the selected types, reading the two ends of each edge.
+    sources = []
+    targets = []
+    codes = []
+    kept_types = []
+    for rec_type in relation_types:
+        if rec_type in kept_types:
+            continue
+        count = len(sources)
+        for bundle_records in records_of_type:
+            for relation in bundle_records(rec_type):
+                edge = relation_edge(relation)
+                if edge is None:
+                    continue
+                influenced, influencer = edge
+                source = node_index.get(influenced._uri)
+                if source is None:
+                    source = node_index[influenced._uri] = len(nodes)
+                    nodes.append(influenced)
+                target = node_index.get(influencer._uri)
+                if target is None:
+                    target = node_index[influencer._uri] = len(nodes)
+                    nodes.append(influencer)
+                sources.append(source)
+                targets.append(target)
+        if len(sources) > count:
+            codes.append((len(kept_types), len(sources) - count))
+            kept_types.append(rec_type)
+
+    # The edges, grouped by relation type, are sorted by source node.
+    sources = numpy.array(sources, dtype=numpy.int64)
+    targets = numpy.array(targets, dtype=numpy.int64)
+    code_type = numpy.int8 if len(kept_types) < 128 else numpy.int32
+    edge_types = numpy.repeat(numpy.array([code for code, _ in codes], dtype=code_type),
+                              [count for _, count in codes])
+    order = numpy.argsort(sources, kind='stable')
+    indptr = numpy.zeros(len(nodes) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(sources, minlength=len(nodes)), out=indptr[1:])
+    return VOProvCSR(indptr, targets[order], edge_types[order], nodes, kept_types)
+
+
+def _records_by_type(bundle):
+    """
+    Returns a function giving the records of a type of a bundle, through the index of the bundle if it has one,
+    e.g. not for a prov bundle.
+    """
+    if hasattr(bundle, 'records_of_type'):
+        return bundle.records_of_type
+    type_map = defaultdict(list)
+    for record in bundle._records:
+        type_map[record.get_type()].append(record)
+    return lambda rec_type: type_map.get(rec_type, ())
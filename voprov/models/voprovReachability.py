@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import bisect
+import io
+import struct
+
+import six
+
+from prov.model import ProvException
+from voprov.models.model import _DestinationFile
+from voprov.models.voprovLineage import LINEAGE_RELATION_TYPES, relation_edge
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+MAGIC = b'VOREA\x01'
+"""Start of a saved reachability index, the last byte being the version of the format."""
+
+MAX_INTERVALS = 16
+"""
+Maximum number of intervals of a label, the nearest intervals of a longer label being merged into an approximate
+label, which may contain components the component does not depend on.
+"""
+
+# A saved index is the magic, the _HEADER and the tables it gives the size
+# of, each an array of unsigned 64-bit integers unless stated otherwise:
+# - the number of records of the document and of each of its bundles, to
+#   check that the index matches the document it is loaded for,
+# - the lengths, as unsigned 32-bit integers, then the UTF-8 bytes of the
+#   URIs of the relation types followed and of the elements,
+# - the component of each element,
+# - the offsets of the labels of the components (one more than components)
+#   and the bounds of the labels,
+# - one byte per component, 1 if its label is approximate,
+# - the offsets of the components each component depends on directly (one
+#   more than components) and these components.
+_HEADER = struct.Struct('<7Q')
+
+
+class VOProvReachability(object):
+    """
+    Reachability index of the elements of a
+    :py:class:`~voprov.models.model.VOProvDocument`, answering whether an
+    element depends on another one without walking through the elements in
+    between.
+
+    The elements are grouped in components, the elements depending on each
+    other through a cycle being in the same component. The components are
+    numbered in the order of a depth-first walk, so that the components a
+    component depends on mostly have consecutive numbers. Each component gets
+    a label, the sorted intervals of the numbers of the components it depends
+    on, and a query is a binary search in a label. Labels longer than
+    :py:const:`MAX_INTERVALS` are made approximate by merging their nearest
+    intervals: a component missing from an approximate label is still not
+    depended on, otherwise the components depended on directly are searched,
+    skipping the ones whose labels miss the component.
+
+    The index is built from the lineage graph of the document the first time
+    it is queried, and updated as relations are added to the document, the
+    labels of the components depending on the added relation being extended.
+    A relation closing a cycle makes the index built again at its next query.
+    The index can be saved next to the document, see :py:meth:`save` and
+    :py:meth:`~voprov.models.model.VOProvDocument.load_reachability`.
+    """
+
+    def __init__(self, document, relation_types=None):
+        """
+        Constructor.
+
+        :param document: The document.
+        :param relation_types: Optional iterable of the types of the relations
+            followed (default:
+            :py:const:`~voprov.models.voprovLineage.LINEAGE_RELATION_TYPES`).
+        """
+        self._document = document
+        self._relation_uris = _relation_uris(relation_types)
+        # Index of each element by URI, component of each element, label of each component and whether it is
+        # approximate.
+        self._nodes = dict()
+        self._components = []
+        self._labels = []
+        self._approximate = bytearray()
+        # Components each component depends on directly, and components depending directly on each component.
+        self._upstream = []
+        self._dependents = []
+        self._stale = True
+
+    def follows(self, relation_types):
+        """
+        Returns whether the index follows the given relation types.
+
+        :param relation_types: Iterable of relation types, or None for the
+            default ones.
+        """
+        return self._relation_uris == _relation_uris(relation_types)
+
+    def build(self):
+        """Builds the index from the lineage graph of the document."""
+        lineage = self._document.lineage()
+        count = len(lineage._names)
+        upstream = [[] for _ in range(count)]
+        for uri in self._relation_uris:
+            for rec_type in lineage._upstream:
+                if rec_type.uri == uri:
+                    for node, influencers in six.iteritems(lineage._upstream[rec_type]):
+                        upstream[node].extend(influencers)
+
+        # Tarjan's algorithm, walking without recursion. The components are numbered as they are found, after the
+        # components they depend on, so that their labels are made from labels already known.
+        index = [-1] * count
+        lowlink = [0] * count
+        on_stack = [False] * count
+        # Number of components found when each element was reached, the components found from then on being
+        # components the element depends on.
+        window = [0] * count
+        components = [-1] * count
+        labels = []
+        approximate = bytearray()
+        component_upstream = []
+        stack = []
+        counter = 0
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, position = work.pop()
+                if position == 0:
+                    index[node] = lowlink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+                    window[node] = len(labels)
+                influencers = upstream[node]
+                while position < len(influencers):
+                    influencer = influencers[position]
+                    position += 1
+                    if index[influencer] == -1:
+                        work.append((node, position))
+                        work.append((influencer, 0))
+                        break
+                    if on_stack[influencer] and index[influencer] < lowlink[node]:
+                        lowlink[node] = index[influencer]
+                else:
+                    if lowlink[node] == index[node]:
+                        component = len(labels)
+                        group = []
+                        while not group or group[-1] != node:
+                            member = stack.pop()
+                            on_stack[member] = False
+                            components[member] = component
+                            group.append(member)
+                        influencer_components = set()
+                        for member in group:
+                            influencer_components.update(components[influencer] for influencer in upstream[member])
+                        influencer_components.discard(component)
+                        start = window[node]
+                        component_labels = [(start, component)]
+                        is_approximate = False
+                        for influencer_component in influencer_components:
+                            label = labels[influencer_component]
+                            # The labels within the interval of the walk add nothing to it.
+                            if label[0] < start or label[-1] > component:
+                                component_labels.append(label)
+                                is_approximate = is_approximate or approximate[influencer_component]
+                        label, coarsened = _union(component_labels)
+                        labels.append(label)
+                        approximate.append(is_approximate or coarsened)
+                        component_upstream.append(list(influencer_components))
+                    if work:
+                        parent = work[-1][0]
+                        if lowlink[node] < lowlink[parent]:
+                            lowlink[parent] = lowlink[node]
+
+        dependents = [[] for _ in range(len(labels))]
+        for component, influencer_components in enumerate(component_upstream):
+            for influencer_component in influencer_components:
+                dependents[influencer_component].append(component)
+        self._nodes = dict(lineage._nodes)
+        self._components = components
+        self._labels = labels
+        self._approximate = approximate
+        self._upstream = component_upstream
+        self._dependents = dependents
+        self._stale = False
+
+    def depends_on(self, identifier, ancestor):
+        """
+        Returns whether an element depends on another one, i.e. whether the
+        other one is among its ancestors.
+
+        :param identifier: Qualified name of the element.
+        :param ancestor: Qualified name of the element it may depend on.
+        :return: bool
+        """
+        if self._stale:
+            self.build()
+        if identifier is None or ancestor is None:
+            return False
+        node = self._nodes.get(identifier.uri)
+        other = self._nodes.get(ancestor.uri)
+        if node is None or other is None or node == other:
+            return False
+        return self._reaches(self._components[node], self._components[other])
+
+    def _reaches(self, component, target):
+        """Returns whether a component is, or depends on, another one."""
+        if component == target:
+            return True
+        labels = self._labels
+        if not _contains(labels[component], target):
+            return False
+        approximate = self._approximate
+        if not approximate[component]:
+            return True
+        # Depth-first search through the components depended on, whose labels may contain the target.
+        seen = {component}
+        pending = [component]
+        while pending:
+            for influencer in self._upstream[pending.pop()]:
+                if influencer == target:
+                    return True
+                if influencer in seen or not _contains(labels[influencer], target):
+                    continue
+                if not approximate[influencer]:
+                    return True
+                seen.add(influencer)
+                pending.append(influencer)
+        return False
+
+    def _node(self, qualified_name):
+        """Returns the index of an element, adding it to the index in a component of its own if needed."""
+        try:
+            return self._nodes[qualified_name.uri]
+        except KeyError:
+            node = self._nodes[qualified_name.uri] = len(self._components)
+            component = len(self._labels)
+            self._components.append(component)
+            self._labels.append((component, component))
+            self._approximate.append(False)
+            self._upstream.append([])
+            self._dependents.append([])
+            return node
+
+    def add_relation(self, relation):
+        """
+        Updates the index with a relation added to the document.
+
+        :param relation: The relation.
+        """
+        if self._stale or relation.get_type().uri not in self._relation_uris:
+            return
+        edge = relation_edge(relation)
+        if edge is None:
+            return
+        component = self._components[self._node(edge[0])]
+        target = self._components[self._node(edge[1])]
+        if self._reaches(component, target):
+            # Already known, through other relations.
+            return
+        if self._reaches(target, component):
+            # The relation closes a cycle, merging components.
+            self._stale = True
+            return
+        # The components depending on the influenced element, which do not already depend on the influencing one,
+        # are found before any label changes, then get the label of the influencing one.
+        updated = [component]
+        seen = {component}
+        for dependent in updated:
+            for other in self._dependents[dependent]:
+                if other not in seen and not self._reaches(other, target):
+                    seen.add(other)
+                    updated.append(other)
+        labels = self._labels
+        approximate = self._approximate
+        label = labels[target]
+        for dependent in updated:
+            if not _covers(labels[dependent], label):
+                labels[dependent], coarsened = _union([labels[dependent], label])
+                approximate[dependent] = approximate[dependent] or approximate[target] or coarsened
+        self._upstream[component].append(target)
+        self._dependents[target].append(component)
+
+    def add_records(self, records):
+        """
+        Updates the index with the relations among records added to the
+        document.
+
+        :param records: Iterable of records.
+        """
+        for record in records:
+            if record.is_relation():
+                self.add_relation(record)
+
+    def save(self, destination):
+        """
+        Saves the index, e.g. next to the serialized document, to be loaded
+        with :py:meth:`~voprov.models.model.VOProvDocument.load_reachability`
+        instead of being built again.
+
+        Example::
+
+            document.serialize('provenance.vobix', format='vobix')
+            document.reachability().save('provenance.vobix.reach')
+
+        :param destination: Path of the file, written through a temporary file
+            next to it, or binary stream.
+        """
+        if self._stale:
+            self.build()
+        if isinstance(destination, six.string_types):
+            destination_file = _DestinationFile(destination)
+            try:
+                self._write(destination_file.stream)
+            except BaseException:
+                destination_file.discard()
+                raise
+            destination_file.commit()
+        else:
+            self._write(destination)
+
+    def _write(self, stream):
+        if isinstance(stream, io.TextIOBase):
+            raise TypeError('A reachability index is binary, a binary stream is needed')
+        record_counts = _record_counts(self._document)
+        uris = [None] * len(self._nodes)
+        for uri, node in six.iteritems(self._nodes):
+            uris[node] = uri
+        strings = [six.text_type(uri).encode('utf-8') for uri in list(self._relation_uris) + uris]
+        label_offsets = _offsets(self._labels)
+        upstream_offsets = _offsets(self._upstream)
+
+        stream.write(MAGIC)
+        stream.write(_HEADER.pack(
+            len(record_counts), len(self._relation_uris), len(uris), len(self._labels), label_offsets[-1],
+            upstream_offsets[-1], sum(len(data) for data in strings)))
+        _write_integers(stream, 'Q', record_counts)
+        _write_integers(stream, 'I', [len(data) for data in strings])
+        stream.write(b''.join(strings))
+        _write_integers(stream, 'Q', self._components)
+        _write_integers(stream, 'Q', label_offsets)
+        _write_integers(stream, 'Q', [bound for label in self._labels for bound in label])
+        stream.write(bytes(self._approximate))
+        _write_integers(stream, 'Q', upstream_offsets)
+        _write_integers(stream, 'Q', [component for components in self._upstream for component in components])
+
+    @classmethod
+    def load(cls, source, document):
+        """
+        Loads an index saved with :py:meth:`save` for a document.
+
+        :param source: Path of the file or binary stream.
+        :param document: The document the index was saved with.
+        :return: :py:class:`VOProvReachability`
+        """
+        if isinstance(source, six.string_types):
+            with io.open(source, 'rb') as stream:
+                data = stream.read()
+        else:
+            data = source.read()
+        if not isinstance(data, bytes):
+            raise TypeError('A reachability index is binary, a binary stream is needed')
+        if data[:len(MAGIC)] != MAGIC:
+            raise ProvException('Not a reachability index, or an unsupported version of it')
+        try:
+            (records_count, types_count, nodes_count, components_count, bounds_count, upstream_count,
+             strings_size) = _HEADER.unpack_from(data, len(MAGIC))
+            offset = len(MAGIC) + _HEADER.size
+            record_counts, offset = _read_integers(data, offset, 'Q', records_count)
+            if record_counts != _record_counts(document):
+                raise ProvException('The reachability index does not match the records of the document')
+            lengths, offset = _read_integers(data, offset, 'I', types_count + nodes_count)
+            strings = []
+            for length in lengths:
+                strings.append(data[offset:offset + length].decode('utf-8'))
+                offset += length
+            components, offset = _read_integers(data, offset, 'Q', nodes_count)
+            label_offsets, offset = _read_integers(data, offset, 'Q', components_count + 1)
+            bounds, offset = _read_integers(data, offset, 'Q', bounds_count)
+            approximate = bytearray(data[offset:offset + components_count])
+            offset += components_count
+            upstream_offsets, offset = _read_integers(data, offset, 'Q', components_count + 1)
+            upstream, offset = _read_integers(data, offset, 'Q', upstream_count)
+        except struct.error:
+            raise ProvException('The reachability index is truncated')
+        if len(approximate) != components_count:
+            raise ProvException('The reachability index is truncated')
+
+        index = cls(document)
+        index._relation_uris = tuple(strings[:types_count])
+        index._nodes = dict((uri, node) for node, uri in enumerate(strings[types_count:]))
+        index._components = components
+        index._labels = [tuple(bounds[label_offsets[i]:label_offsets[i + 1]]) for i in range(components_count)]
+        index._approximate = approximate
+        index._upstream = [upstream[upstream_offsets[i]:upstream_offsets[i + 1]] for i in range(components_count)]
+        index._dependents = [[] for _ in range(components_count)]
+        for component, influencer_components in enumerate(index._upstream):
+            for influencer_component in influencer_components:
+                index._dependents[influencer_component].append(component)
+        index._stale = False
+        return index
+
+
+def _relation_uris(relation_types):
+    """Returns the URIs of relation types, without duplicates, in their order."""
+    if relation_types is None:
+        relation_types = LINEAGE_RELATION_TYPES
+    uris = []
+    for rec_type in relation_types:
+        if rec_type.uri not in uris:
+            uris.append(rec_type.uri)
+    return tuple(uris)
+
+
+def _record_counts(document):
+    """Returns the number of records of a document and of each of its bundles."""
+    return [len(document._records)] + [len(bundle._records) for bundle in document.bundles]
+
+
+def _union(labels):
+    """
+    Returns the union of labels, as the sorted bounds of disjoint intervals, and whether the nearest intervals were
+    merged to keep at most MAX_INTERVALS of them.
+    """
+    intervals = []
+    for label in labels:
+        intervals.extend(zip(label[0::2], label[1::2]))
+    intervals.sort()
+    bounds = []
+    for low, high in intervals:
+        if bounds and low <= bounds[-1] + 1:
+            if high > bounds[-1]:
+                bounds[-1] = high
+        else:
+            bounds.extend((low, high))
+    if len(bounds) <= 2 * MAX_INTERVALS:
+        return tuple(bounds), False
+    # Only the MAX_INTERVALS - 1 widest gaps between the intervals are kept.
+    gaps = sorted(range(1, len(bounds) - 1, 2), key=lambda i: bounds[i + 1] - bounds[i], reverse=True)
+    kept = sorted(gaps[:MAX_INTERVALS - 1])
+    coarse = [bounds[0]]
+    for i in kept:
+        coarse.extend((bounds[i], bounds[i + 1]))
+    coarse.append(bounds[-1])
+    return tuple(coarse), True
+
+
+def _contains(label, component):
+    """Returns whether the intervals of a label contain a component."""
+    position = bisect.bisect_right(label, component)
+    return position % 2 == 1 or (position > 0 and label[position - 1] == component)
+
+
+def _covers(label, other):
+    """Returns whether the intervals of a label contain all the intervals of another one."""
+    for i in range(0, len(other), 2):
+        position = bisect.bisect_right(label, other[i])
+        if not (position % 2 == 1 or (position > 0 and label[position - 1] == other[i])):
+            return False
+        if position % 2 == 0:
+            # other[i] is the upper bound of an interval of the label.
+            position -= 1
+        if label[position] < other[i + 1]:
+            return False
+    return True
+
+
+def _offsets(lists):
+    """Returns the offsets of lists written one after the other, one more than the lists."""
+    offsets = [0]
+    for values in lists:
+        offsets.append(offsets[-1] + len(values))
+    return offsets
+
+
+def _write_integers(stream, type_code, values):
+    stream.write(struct.pack(str('<%d%s' % (len(values), type_code)), *values))
+
+
+def _read_integers(data, offset, type_code, count):
+    integers = struct.Struct(str('<%d%s' % (count, type_code)))
+    return list(integers.unpack_from(data, offset)), offset + integers.size
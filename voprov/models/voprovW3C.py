@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from six.moves.collections_abc import Sequence
+
+from prov.model import ProvBundle, ProvDocument, ProvException, QualifiedName
+from voprov.models.model import VOProvBundle, _W3CNamespaceManager
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+
+class VOProvW3CRecords(Sequence):
+    """Read-only list of the W3C PROV records of a view, each converted from its VOProv record when accessed."""
+
+    def __init__(self, bundle, records):
+        """
+        Constructor.
+
+        :param bundle: The W3C PROV view the records are converted in.
+        :param records: The records of the VOProv bundle.
+        """
+        self._bundle = bundle
+        self._records = records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._bundle._w3c_record(record) for record in self._records[i]]
+        return self._bundle._w3c_record(self._records[i])
+
+    def __iter__(self):
+        for record in self._records:
+            yield self._bundle._w3c_record(record)
+
+
+class VOProvW3CBundle(ProvBundle):
+    """
+    Read-only W3C PROV view of a :py:class:`~voprov.models.model.VOProvBundle`,
+    converting its records like :py:meth:`~voprov.models.model.VOProvBundle.get_w3c`
+    each time they are accessed, instead of keeping a converted copy of them.
+    The records created while converting are not kept either, but the
+    namespaces they register are registered when the view is created.
+    """
+
+    def __init__(self, source, document=None):
+        """
+        Constructor.
+
+        :param source: The VOProv bundle.
+        :param document: The W3C PROV view of the document of the bundle (default: None).
+        """
+        ProvBundle.__init__(self, identifier=source.identifier, document=document)
+        self._namespaces = _W3CNamespaceManager(source.namespaces, parent=self._namespaces.parent)
+        self._source = source
+        self._records = VOProvW3CRecords(self, source._records)
+        _register_namespaces(self, source._records)
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self._identifier)
+
+    def _w3c_record(self, record):
+        """Returns the W3C PROV version of a record of the VOProv bundle."""
+        if hasattr(record, "get_w3c"):
+            return record.get_w3c(self)
+        return self.add_record(record)
+
+    def _add_record(self, record):
+        # The records are converted again each time they are accessed.
+        pass
+
+    def get_record(self, identifier):
+        """
+        Returns the W3C PROV version of the records having the given
+        identifier in the VOProv bundle.
+
+        :param identifier: The identifier of the records.
+        :return: List of :py:class:`ProvRecord` objects.
+        """
+        records = self._source.get_record(identifier)
+        if records is None:
+            return None
+        return [self._w3c_record(record) for record in records]
+
+    def _read_only(self, *args, **kwargs):
+        raise ProvException('A %s is read-only' % self.__class__.__name__)
+
+    add_namespace = _read_only
+    set_default_namespace = _read_only
+    update = _read_only
+
+
+class VOProvW3CDocument(VOProvW3CBundle, ProvDocument):
+    """
+    Read-only W3C PROV view of a :py:class:`~voprov.models.model.VOProvDocument`,
+    converting its records and the ones of its bundles only when they are
+    accessed, e.g. by prov's serializers. Serializing the view writes the
+    same content as serializing the document returned by
+    :py:meth:`~voprov.models.model.VOProvBundle.get_w3c`, without keeping
+    the converted records in memory.
+
+    Example::
+
+        document.w3c_view().serialize('provenance.xml', format='xml')
+    """
+
+    def __init__(self, source):
+        """
+        Constructor.
+
+        :param source: The VOProv document.
+        """
+        ProvDocument.__init__(self, namespaces=source.namespaces)
+        self._source = source
+        self._records = VOProvW3CRecords(self, source._records)
+        _register_namespaces(self, source._records)
+        for bundle in source.bundles:
+            if isinstance(bundle, VOProvBundle):
+                bundle = VOProvW3CBundle(bundle, self)
+            self._bundles[bundle.identifier] = bundle
+
+    def __repr__(self):
+        return '<VOProvW3CDocument>'
+
+    add_bundle = VOProvW3CBundle._read_only
+    bundle = VOProvW3CBundle._read_only
+
+
+def _register_namespaces(bundle, records):
+    """
+    Registers in a view the namespaces its records get when they are converted, e.g. the namespaces of a bundle
+    coming from its document, prov's serializers writing the namespaces before the records.
+    """
+    namespaces = bundle._namespaces
+    # The namespaces are registered once per namespace object.
+    seen = set()
+    for record in records:
+        qualified_names = [record._identifier]
+        for attr, values in record._attributes.items():
+            qualified_names.append(attr)
+            qualified_names.extend(value for value in values if isinstance(value, QualifiedName))
+        for qualified_name in qualified_names:
+            if qualified_name is not None and id(qualified_name.namespace) not in seen:
+                seen.add(id(qualified_name.namespace))
+                namespaces.valid_qualified_name(qualified_name)
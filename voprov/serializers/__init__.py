@@ -2,14 +2,18 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
-from voprov.serializers.provn import VOProvNSerializer
-from voprov.serializers.xml import VOProvXMLSerializer
+import importlib
+
+from six.moves.collections_abc import MutableMapping
+
 from prov import Error
+from voprov.serializers.sniff import guess_format
 
 __author__ = 'Jean-Francois Sornay'
 __email__ = 'jeanfrancois.sornay@gmail.com'
 __all__ = [
-    'get'
+    'get',
+    'guess_format'
 ]
 
 
@@ -24,20 +28,60 @@ class Registry:
     serializers = None
     """Property caching all available serializers in a dict."""
 
+    import_paths = {
+        'json': 'voprov.serializers.provjson.VOProvJSONSerializer',
+        'rdf': 'prov.serializers.provrdf.ProvRDFSerializer',
+        'provn': 'voprov.serializers.provn.VOProvNSerializer',
+        'xml': 'voprov.serializers.xml.VOProvXMLSerializer',
+        'vobin': 'voprov.serializers.vobin.VOProvBinarySerializer',
+        'vobix': 'voprov.serializers.vobix.VOProvIndexedBinarySerializer'
+    }
+    """Import path of the serializer class of each format, imported on its first use."""
+
     @staticmethod
     def load_serializers():
         """Loads all available serializers into the registry."""
-        from prov.serializers.provjson import ProvJSONSerializer
-        from voprov.serializers.provn import VOProvNSerializer
-        from voprov.serializers.xml import VOProvXMLSerializer
-        from prov.serializers.provrdf import ProvRDFSerializer
-
-        Registry.serializers = {
-            'json': ProvJSONSerializer,
-            'rdf': ProvRDFSerializer,
-            'provn': VOProvNSerializer,
-            'xml': VOProvXMLSerializer
-        }
+        Registry.serializers = LazySerializers(Registry.import_paths)
+
+
+class LazySerializers(MutableMapping):
+    """
+    Dict of the serializer classes, importing the module of a serializer only the first time its format is
+    requested, so that e.g. rdflib is not imported unless RDF is used. A custom format is registered by assigning its
+    serializer class, e.g. ``Registry.serializers['fmt'] = MySerializer``.
+    """
+
+    def __init__(self, import_paths):
+        """
+        Constructor.
+
+        :param import_paths:            Dict of the import paths of the serializer classes, by format name.
+        """
+        self._import_paths = dict(import_paths)
+        self._classes = dict()
+
+    def __getitem__(self, format_name):
+        try:
+            return self._classes[format_name]
+        except KeyError:
+            module_name, class_name = self._import_paths[format_name].rsplit('.', 1)
+            serializer = getattr(importlib.import_module(module_name), class_name)
+            self._classes[format_name] = serializer
+            return serializer
+
+    def __setitem__(self, format_name, serializer):
+        self._classes[format_name] = serializer
+        self._import_paths[format_name] = '%s.%s' % (serializer.__module__, serializer.__name__)
+
+    def __delitem__(self, format_name):
+        del self._import_paths[format_name]
+        self._classes.pop(format_name, None)
+
+    def __iter__(self):
+        return iter(self._import_paths)
+
+    def __len__(self):
+        return len(self._import_paths)
 
 
 def get(format_name):
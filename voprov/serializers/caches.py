@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from prov import Error
+from prov.model import Literal, parse_xsd_datetime, parse_xsd_types
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+__all__ = [
+    'ValueCaches'
+]
+
+
+class ValueCaches(object):
+    """
+    Mixin of the deserializers keeping the qualified names, datetimes and typed literals they parse, documents
+    repeating the same values many times.
+    """
+
+    value_error = Error
+    """Exception raised for a value which cannot be parsed."""
+
+    def _reset_value_caches(self):
+        """Empties the caches, e.g. before parsing a new document."""
+        self._names_bundle = None
+        self._qualified_names = dict()
+        self._datetimes = dict()
+        self._literals = dict()
+
+    def _qualified_name(self, bundle, name):
+        """
+        Returns the qualified name of a string in a bundle, caching it until
+        the bundle or its namespaces change.
+        """
+        if bundle is not self._names_bundle:
+            self._names_bundle = bundle
+            self._qualified_names = dict()
+        try:
+            return self._qualified_names[name]
+        except KeyError:
+            qualified_name = bundle.valid_qualified_name(name)
+            if qualified_name is None:
+                raise self.value_error('invalid qualified name "%s"' % name)
+            self._qualified_names[name] = qualified_name
+            return qualified_name
+
+    def _typed_literal(self, value, datatype):
+        """
+        Returns the Python value of a typed literal, like the records convert
+        it, caching it for the rest of the parsing.
+        """
+        key = (value, datatype)
+        try:
+            return self._literals[key]
+        except KeyError:
+            converted = parse_xsd_types(value, datatype)
+            if converted is None:
+                converted = Literal(value, datatype)
+            self._literals[key] = converted
+            return converted
+
+    def _datetime(self, value):
+        """
+        Returns the datetime of a string, caching it for the rest of the
+        parsing.
+        """
+        try:
+            return self._datetimes[value]
+        except KeyError:
+            self._datetimes[value] = parse_xsd_datetime(value)
+            return self._datetimes[value]
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import os
+
+import six
+
+from prov import Error
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+__all__ = [
+    'compressed_stream',
+    'compression_from_head',
+    'compression_from_name',
+    'strip_compression_extension'
+]
+
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'lzma',
+    '.lzma': 'lzma',
+}
+"""Compressions guessed from a file extension."""
+
+COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'lzma'),
+)
+"""Compressions guessed from the first bytes of a content."""
+
+
+class CompressionError(Error):
+    """Exception for the case a compression is unknown or not available."""
+    pass
+
+
+def compression_from_name(name):
+    """
+    Returns the compression of a file from its extension, or None.
+
+    :param name:                The file name or path.
+    """
+    if not isinstance(name, six.string_types):
+        return None
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(name)[1].lower())
+
+
+def compression_from_head(head):
+    """
+    Returns the compression of a content from its first bytes, or None.
+
+    :param head:                The start of the content, as bytes. Text is never compressed.
+    """
+    if not isinstance(head, bytes):
+        return None
+    for magic, compression in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def strip_compression_extension(name):
+    """
+    Returns a file name without its compression extension, e.g. doc.xml for doc.xml.gz.
+
+    :param name:                The file name or path.
+    """
+    if compression_from_name(name):
+        return os.path.splitext(name)[0]
+    return name
+
+
+def compressed_stream(stream, compression, mode='rb', level=None):
+    """
+    Wraps a binary stream to compress what is written to it or decompress what is read from it, on the fly.
+    Closing the returned stream flushes the compressed data but does not close the wrapped stream.
+
+    :param stream:              The binary stream.
+    :param compression:         'gzip', 'bz2' or 'lzma'.
+    :param mode:                'rb' to decompress or 'wb' to compress.
+    :param level:               The compression level, 0-9 for gzip and lzma and 1-9 for bz2, or None for the
+                                default of the codec.
+    """
+    if isinstance(stream, io.TextIOBase):
+        raise TypeError('A binary stream is needed for %s compression' % compression)
+    if compression == 'gzip':
+        import gzip
+        if level is None:
+            level = 9
+        # No file name in the gzip header, the stream may be a temporary file.
+        return gzip.GzipFile(filename='', mode=mode, compresslevel=level, fileobj=stream)
+    if compression == 'bz2':
+        if six.PY2:
+            raise CompressionError('bz2 compression of streams requires Python 3')
+        import bz2
+        if level is None:
+            level = 9
+        return bz2.BZ2File(stream, mode=mode, compresslevel=level)
+    if compression == 'lzma':
+        try:
+            import lzma
+        except ImportError:
+            try:
+                from backports import lzma
+            except ImportError:
+                raise CompressionError('lzma compression requires the lzma module (backports.lzma on Python 2)')
+        if mode.startswith('r'):
+            return lzma.LZMAFile(stream, mode=mode)
+        return lzma.LZMAFile(stream, mode=mode, preset=level)
+    raise CompressionError('Unknown compression "%s"' % compression)
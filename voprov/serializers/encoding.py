@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import datetime
+
+import six
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+__all__ = [
+    'RecordEncoding'
+]
+
+
+class RecordEncoding(object):
+    """
+    Type, identifier and attributes of a record, read once by a serializer
+    before it writes the record.
+    """
+    __slots__ = ('record', 'rec_type', 'identifier', 'values', '_attributes')
+
+    def __init__(self, record):
+        """
+        Constructor.
+
+        :param record: The record.
+        """
+        self.record = record
+        self.rec_type = record.get_type()
+        self.identifier = six.text_type(record._identifier) if record._identifier else None
+        # The attributes of the record and their values, as (attribute, list of values) pairs.
+        self.values = [(attr, list(values)) for attr, values in record._attributes.items() if values]
+        self._attributes = None
+
+    @property
+    def attributes(self):
+        """List of the (attribute, value) pairs of the record, like :py:attr:`prov.model.ProvRecord.attributes`."""
+        if self._attributes is None:
+            self._attributes = [(attr, value) for attr, values in self.values for value in values]
+        return self._attributes
+
+    @staticmethod
+    def text(value):
+        """Returns the text of an attribute value, the ISO format of a datetime."""
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return six.text_type(value)
@@ -0,0 +1,569 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import codecs
+import datetime
+import io
+import json
+import re
+
+import six
+
+from prov import Error
+from prov.constants import PROV_ATTRIBUTES_ID_MAP, PROV_QUALIFIEDNAME, XSD_ANYURI
+from prov.identifier import Identifier, QualifiedName
+from prov.model import Literal, first
+from prov.serializers import Serializer
+from prov.serializers.provjson import LITERAL_XSDTYPE_MAP
+from voprov.models.constants import *
+from voprov.serializers.caches import ValueCaches
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+CHUNK_SIZE = 65536
+"""Approximate number of characters written or read at once."""
+
+# Mapping of the PROV-JSON record sections to the VOProv record types.
+JSON_RECORD_IDS_MAP = dict((name, rec_type) for rec_type, name in
+                           PROV_N_MAP.items()
+                           if rec_type.namespace.uri == VOPROV.uri and
+                           PROV_BASE_CLS.get(rec_type) == rec_type)
+# Mapping of the names of the formal attributes to the VOProv attributes,
+# the PROV names being read as their VOProv counterpart.
+JSON_ATTRIBUTES_ID_MAP = dict()
+for _attr in PROV_ATTRIBUTE_QNAMES | PROV_ATTRIBUTE_LITERALS:
+    if isinstance(_attr, QualifiedName) and _attr.namespace.uri == VOPROV.uri:
+        JSON_ATTRIBUTES_ID_MAP[six.text_type(_attr)] = _attr
+        if 'prov:' + _attr.localpart in PROV_ATTRIBUTES_ID_MAP:
+            JSON_ATTRIBUTES_ID_MAP['prov:' + _attr.localpart] = _attr
+del _attr
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class VOProvJSONException(Error):
+    """Exception for the case a PROV-JSON content cannot be read."""
+    pass
+
+
+class VOProvJSONSerializer(ValueCaches, Serializer):
+    """
+    PROV-JSON serializer for :class:`~voprov.models.model.VOProvDocument`,
+    writing and reading the records one by one instead of building the whole
+    JSON structure in memory.
+
+    The records are written by record type section, and the sections are
+    read with the standard :py:mod:`json` module record by record. The
+    records are encoded with :py:mod:`json` too, or with the faster
+    `orjson <https://github.com/ijl/orjson>`_ package when it is chosen as
+    backend, the output then being compact JSON.
+    """
+
+    value_error = VOProvJSONException
+
+    def __init__(self, document=None):
+        """
+        Constructor.
+
+        :param document: Document to serialize.
+        """
+        super(VOProvJSONSerializer, self).__init__(document)
+        self._reset_value_caches()
+
+    def serialize(self, stream, backend='json', chunk_size=CHUNK_SIZE,
+                  **kwargs):
+        """
+        Serializes a :class:`~voprov.models.model.VOProvDocument` instance to
+        `PROV-JSON <https://provenance.ecs.soton.ac.uk/prov-json/>`_.
+
+        The sections, record identifiers and attributes are in the order of
+        :py:class:`prov.serializers.provjson.ProvJSONSerializer`, the
+        anonymous records being numbered in the order they are written.
+
+        :param stream: Where to save the output.
+        :param backend: 'json' or 'orjson' to choose the module encoding the
+            records (default: 'json'). orjson writes compact JSON and
+            takes no option of :py:func:`json.dumps`.
+        :param chunk_size: Approximate number of characters written at once
+            (default: CHUNK_SIZE).
+        :param kwargs: Options of :py:func:`json.dumps`, e.g. indent.
+        """
+        writer = _json_writer(backend, kwargs)
+        output = _ChunkedOutput(stream, chunk_size)
+        for text in self.iter_json(writer):
+            output.write(text)
+        output.flush()
+
+    def iter_json(self, writer, bundle=None, _level=0):
+        """
+        Generates the PROV-JSON representation of the document or of one of
+        its bundles piece by piece, a record at most being encoded at once.
+
+        :param writer: The _JSONWriter formatting the output.
+        :param bundle: The bundle, the document being serialized by default.
+        """
+        if bundle is None:
+            bundle = self.document
+        prefixes = _prefixes(bundle)
+
+        # The sections in the order of their first record.
+        sections = []
+        section_types = dict()
+        for rec_type in _record_types(bundle):
+            label = PROV_N_MAP[rec_type]
+            if label not in section_types:
+                sections.append(label)
+                section_types[label] = []
+            section_types[label].append(rec_type)
+
+        yield writer.open(_level)
+        first_item = True
+        if prefixes:
+            yield writer.key('prefix', _level, first_item)
+            yield writer.value(prefixes, _level + 1)
+            first_item = False
+
+        anonymous_count = 0
+        for label in sections:
+            yield writer.key(label, _level, first_item)
+            first_item = False
+            yield writer.open(_level + 1)
+            first_record = True
+            written = set()
+            for record in _section_records(bundle, section_types[label]):
+                identifier = record._identifier
+                if identifier is None:
+                    anonymous_count += 1
+                    key = '_:id%d' % anonymous_count
+                    content = _record_json(record)
+                else:
+                    if identifier in written:
+                        continue
+                    written.add(identifier)
+                    key = six.text_type(identifier)
+                    # Records of the same section and identifier are grouped.
+                    same = [other for other in _records_identified_by(bundle, identifier)
+                            if PROV_N_MAP[other.get_type()] == label]
+                    if len(same) > 1:
+                        content = [_record_json(other) for other in same]
+                    else:
+                        content = _record_json(record)
+                yield writer.key(key, _level + 1, first_record)
+                yield writer.value(content, _level + 2)
+                first_record = False
+            yield writer.close(_level + 1, first_record)
+
+        if bundle.is_document() and bundle.has_bundles():
+            yield writer.key('bundle', _level, first_item)
+            first_item = False
+            yield writer.open(_level + 1)
+            first_bundle = True
+            for sub_bundle in bundle.bundles:
+                yield writer.key(six.text_type(sub_bundle.identifier),
+                                 _level + 1, first_bundle)
+                first_bundle = False
+                for text in self.iter_json(writer, sub_bundle, _level + 2):
+                    yield text
+            yield writer.close(_level + 1, first_bundle)
+        yield writer.close(_level, first_item)
+
+    def deserialize(self, stream, chunk_size=CHUNK_SIZE, **kwargs):
+        """
+        Deserializes a `PROV-JSON <https://provenance.ecs.soton.ac.uk/prov-json/>`_
+        content to a :class:`~voprov.models.model.VOProvDocument` instance,
+        using the VOProv record classes.
+
+        The content is read in chunks and each record is created as soon as
+        it is decoded.
+
+        :param stream: Input data, a text or binary stream.
+        :param chunk_size: Approximate number of characters read at once
+            (default: CHUNK_SIZE).
+        """
+        # Imported here as the model imports the serializers.
+        from voprov.models.model import VOProvDocument
+
+        if not isinstance(stream, io.TextIOBase):
+            stream = codecs.getreader('utf-8')(stream)
+        self._reset_value_caches()
+        reader = _JSONReader(stream, chunk_size)
+        document = VOProvDocument()
+        self._read_container(reader, document)
+        if reader.next_char():
+            raise VOProvJSONException('Extra data after the document')
+        return document
+
+    def _read_container(self, reader, bundle):
+        """
+        Reads the namespaces, records and, for the document, the bundles of a
+        PROV-JSON container.
+        """
+        # Imported here as the model imports the serializers.
+        from voprov.models.model import VOProvBundle
+
+        # Records read before the prefixes, which they may use.
+        pending = []
+        for key in reader.items():
+            if key == 'prefix':
+                prefixes = reader.value()
+                for prefix, uri in prefixes.items():
+                    if prefix == 'default':
+                        bundle.set_default_namespace(uri)
+                    elif prefix not in bundle._namespaces:
+                        bundle.add_namespace(prefix, uri)
+                self._names_bundle = None
+                for rec_type, rec_id, content in pending:
+                    self.deserialize_records(bundle, rec_type, rec_id, content)
+                pending = None
+            elif key == 'bundle' and bundle.is_document():
+                for bundle_id in reader.items():
+                    sub_bundle = VOProvBundle(document=bundle)
+                    self._read_container(reader, sub_bundle)
+                    bundle.add_bundle(sub_bundle, bundle_id)
+            else:
+                try:
+                    rec_type = JSON_RECORD_IDS_MAP[key]
+                except KeyError:
+                    raise VOProvJSONException('Unknown record type "%s"' % key)
+                for rec_id in reader.items():
+                    content = reader.value()
+                    if pending is None:
+                        self.deserialize_records(bundle, rec_type, rec_id,
+                                                 content)
+                    else:
+                        pending.append((rec_type, rec_id, content))
+        for rec_type, rec_id, content in pending or ():
+            self.deserialize_records(bundle, rec_type, rec_id, content)
+
+    def deserialize_records(self, bundle, rec_type, rec_id, content):
+        """
+        Creates the records of a PROV-JSON identifier in a bundle or document.
+
+        :param bundle: The bundle or document to add the records to.
+        :param rec_type: The type of the records.
+        :param rec_id: The identifier, anonymous identifiers starting with _:.
+        :param content: The attributes of the record, or a list of them for
+            several records.
+        """
+        identifier = None if rec_id.startswith('_:') else rec_id
+        elements = [content] if isinstance(content, dict) else content
+        for element in elements:
+            attributes = []
+            # Extra memberships, PROV-JSON allowing several entities.
+            extra_members = None
+            for attr_name, values in element.items():
+                attr = JSON_ATTRIBUTES_ID_MAP.get(attr_name)
+                if attr is not None:
+                    # Qualified names are given as strings, like the record
+                    # methods do, for the namespaces to be registered the
+                    # same way.
+                    if isinstance(values, list):
+                        if len(values) > 1:
+                            if rec_type == VOPROV_MEMBERSHIP and \
+                                    attr == VOPROV_ATTR_ENTITY:
+                                extra_members = values[1:]
+                            else:
+                                raise VOProvJSONException(
+                                    'The attribute %s of %s has several '
+                                    'values' % (attr_name, rec_id))
+                        value = values[0]
+                    else:
+                        value = values
+                    if attr in PROV_ATTRIBUTE_LITERALS:
+                        value = self._datetime(value)
+                    attributes.append((attr, value))
+                else:
+                    attr = self._qualified_name(bundle, attr_name)
+                    if isinstance(values, list):
+                        attributes.extend((attr, self._json_value(bundle, value))
+                                          for value in values)
+                    else:
+                        attributes.append((attr, self._json_value(bundle, values)))
+            bundle.new_record(rec_type, identifier, attributes)
+            if extra_members:
+                collection = dict(attributes)[VOPROV_ATTR_COLLECTION]
+                for member in extra_members:
+                    bundle.membership(collection, member)
+
+    def _json_value(self, bundle, value):
+        """
+        Returns the Python value of a PROV-JSON attribute value, like the
+        records convert it.
+        """
+        if not isinstance(value, dict):
+            return value
+        literal = value['$']
+        if 'lang' in value:
+            return Literal(literal, langtag=value['lang'])
+        datatype = value.get('type')
+        if datatype is None:
+            return self._typed_literal(literal, None)
+        datatype = self._qualified_name(bundle, datatype)
+        if datatype == XSD_ANYURI:
+            return Identifier(literal)
+        if datatype == PROV_QUALIFIEDNAME:
+            return self._qualified_name(bundle, literal)
+        return self._typed_literal(literal, datatype)
+
+
+def _records_identified_by(bundle, identifier):
+    """
+    Returns the records of a bundle having an identifier, without going through get_record(), which registers the
+    namespace of the identifier in the bundle being written.
+    """
+    if hasattr(bundle, '_records_identified_by'):
+        return bundle._records_identified_by(identifier)
+    return bundle._id_map.get(identifier, ())
+
+
+def _json_writer(backend, kwargs):
+    """Returns the _JSONWriter of a backend, see :py:meth:`VOProvJSONSerializer.serialize`."""
+    if backend == 'orjson':
+        if orjson is None:
+            raise VOProvJSONException('The orjson package is not '
+                                      'installed')
+        if kwargs:
+            raise VOProvJSONException('The orjson backend takes no '
+                                      'option of json.dumps()')
+        writer = _ORJSONWriter()
+    elif backend == 'json':
+        if kwargs.get('sort_keys'):
+            raise VOProvJSONException('The records are written in the '
+                                      'order of the document, sort_keys '
+                                      'is not supported')
+        writer = _JSONWriter(**kwargs)
+    else:
+        raise VOProvJSONException('Unknown JSON backend "%s"' % backend)
+    return writer
+
+
+def _prefixes(bundle):
+    """Returns the PROV-JSON prefixes of a bundle or document."""
+    prefixes = dict()
+    for namespace in bundle._namespaces.get_registered_namespaces():
+        prefixes[namespace.prefix] = namespace.uri
+    if bundle._namespaces._default:
+        prefixes['default'] = bundle._namespaces._default.uri
+    return prefixes
+
+
+def _record_types(bundle):
+    """Returns the record types of a bundle, in the order of their first record."""
+    type_map = getattr(bundle, '_type_map', None)
+    if type_map or not bundle._records:
+        return list(type_map or ())
+    types = []
+    seen = set()
+    for record in bundle._records:
+        rec_type = record.get_type()
+        if rec_type not in seen:
+            seen.add(rec_type)
+            types.append(rec_type)
+    return types
+
+
+def _section_records(bundle, rec_types):
+    """Returns the records of a section, of one or more record types, in the order of the bundle."""
+    if len(rec_types) == 1 and getattr(bundle, 'records_of_type', None):
+        return bundle.records_of_type(rec_types[0])
+    rec_types = set(rec_types)
+    return (record for record in bundle._records if record.get_type() in rec_types)
+
+
+def _record_json(record):
+    """Returns the JSON structure of the attributes of a record, as prov writes them."""
+    record_json = {}
+    for attr, values in record._attributes.items():
+        if not values:
+            continue
+        attr_name = six.text_type(attr)
+        if attr in PROV_ATTRIBUTE_QNAMES:
+            record_json[attr_name] = six.text_type(first(values))
+        elif attr in PROV_ATTRIBUTE_LITERALS:
+            record_json[attr_name] = first(values).isoformat()
+        elif len(values) == 1:
+            record_json[attr_name] = _json_representation(first(values))
+        else:
+            record_json[attr_name] = [_json_representation(value)
+                                      for value in values]
+    return record_json
+
+
+def _json_representation(value):
+    if isinstance(value, Literal):
+        if value.langtag:
+            return {'$': value.value, 'lang': value.langtag}
+        return {'$': value.value, 'type': six.text_type(value.datatype)}
+    elif isinstance(value, datetime.datetime):
+        return {'$': value.isoformat(), 'type': 'xsd:dateTime'}
+    elif isinstance(value, QualifiedName):
+        return {'$': six.text_type(value), 'type': PROV_QUALIFIEDNAME._str}
+    elif isinstance(value, Identifier):
+        return {'$': value.uri, 'type': 'xsd:anyURI'}
+    elif type(value) in LITERAL_XSDTYPE_MAP:
+        return {'$': value, 'type': LITERAL_XSDTYPE_MAP[type(value)]}
+    return value
+
+
+class _JSONWriter(object):
+    """Formats the pieces of a JSON object with the json module, following the options of :py:func:`json.dumps`."""
+
+    def __init__(self, **kwargs):
+        indent = kwargs.get('indent')
+        if indent is not None and not isinstance(indent, six.string_types):
+            indent = ' ' * indent
+        self._indent = indent
+        separators = kwargs.get('separators')
+        if separators is None:
+            separators = (', ', ': ') if indent is None else (',', ': ')
+            kwargs['separators'] = separators
+        self._item_separator, self._key_separator = separators
+        self._encoder = json.JSONEncoder(**kwargs)
+
+    def _newline(self, level):
+        return '\n' + self._indent * level if self._indent is not None \
+            else ''
+
+    def open(self, level):
+        return '{'
+
+    def key(self, key, level, first_item):
+        return ('' if first_item else self._item_separator) + \
+            self._newline(level + 1) + self._encode(key) + self._key_separator
+
+    def value(self, value, level):
+        text = self._encode(value)
+        if self._indent is not None and level:
+            # Strings are escaped, the only line breaks are the indentation.
+            text = text.replace('\n', self._newline(level))
+        return text
+
+    def close(self, level, empty):
+        return '}' if empty else self._newline(level) + '}'
+
+    def _encode(self, value):
+        return self._encoder.encode(value)
+
+
+class _ORJSONWriter(_JSONWriter):
+    """Formats the pieces of a compact JSON object with orjson."""
+
+    def __init__(self):
+        super(_ORJSONWriter, self).__init__(separators=(',', ':'))
+
+    def _encode(self, value):
+        try:
+            return orjson.dumps(value).decode('utf-8')
+        except (TypeError, orjson.JSONEncodeError):
+            # E.g. an integer of more than 64 bits.
+            return self._encoder.encode(value)
+
+
+class _ChunkedOutput(object):
+    """Writes pieces of text to a text or binary stream in chunks."""
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self._stream = stream
+        self._encode = not isinstance(stream, io.TextIOBase)
+        self._chunk_size = chunk_size
+        self._chunk = []
+        self._length = 0
+
+    def write(self, text):
+        self._chunk.append(text)
+        self._length += len(text)
+        if self._length >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        content = ''.join(self._chunk)
+        self._stream.write(content.encode('utf-8') if self._encode
+                           else content)
+        self._chunk = []
+        self._length = 0
+
+
+class _JSONReader(object):
+    """Reads the members of JSON objects from a text stream, decoding their values with the json module."""
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._position = 0
+        self._decoder = json.JSONDecoder()
+
+    def _read(self):
+        """Appends the next chunk of the stream to the buffer, returning False at the end of the stream."""
+        remaining = self._buffer[self._position:]
+        # Reading at least as much as what is buffered keeps the decoding
+        # of a large value linear.
+        data = self._stream.read(max(self._chunk_size, len(remaining)))
+        if not data:
+            return False
+        self._buffer = remaining + data
+        self._position = 0
+        return True
+
+    def next_char(self):
+        """Skips the whitespaces and returns the next character, without consuming it, or '' at the end."""
+        while True:
+            self._position = _WHITESPACE.match(self._buffer,
+                                               self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._read():
+                return ''
+
+    def expect(self, chars):
+        char = self.next_char()
+        if not char or char not in chars:
+            raise VOProvJSONException(
+                'Expected %s instead of %s' % (' or '.join(repr(c) for c in chars),
+                                               repr(char) if char else 'the end'))
+        self._position += 1
+        return char
+
+    def value(self):
+        """Decodes the next JSON value."""
+        self.next_char()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer,
+                                                      self._position)
+            except ValueError as error:
+                if self._read():
+                    continue
+                raise VOProvJSONException('Invalid JSON: %s' % error)
+            if end == len(self._buffer) and \
+                    not isinstance(value, (dict, list, six.string_types)) \
+                    and self._read():
+                # A number or a constant may go on in the next chunk.
+                continue
+            self._position = end
+            return value
+
+    def items(self):
+        """
+        Generates the keys of the next JSON object, the value of each key
+        being read by the caller before the next key is generated.
+        """
+        self.expect('{')
+        if self.next_char() == '}':
+            self._position += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, six.string_types):
+                raise VOProvJSONException('Expected a key instead of %r' % key)
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
@@ -2,24 +2,430 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import codecs
+import re
+
+from prov import Error
+from prov.model import DEFAULT_NAMESPACES, PROV_REC_CLS, Literal, ProvElement
 from prov.serializers.provn import *
+from voprov.models.constants import *
+from voprov.serializers.caches import ValueCaches
+
+# Mapping of the PROV-N record names to the VOProv record types.
+PROVN_RECORD_IDS_MAP = dict((name, rec_type) for rec_type, name in
+                            PROV_N_MAP.items()
+                            if rec_type.namespace.uri == VOPROV.uri)
+# Record names of subtypes, mapped to their base type and their subtype.
+PROVN_SUBTYPE_IDS_MAP = dict((name, (PROV_BASE_CLS[rec_type], rec_type)) for
+                             rec_type, name in ADDITIONAL_N_MAP.items()
+                             if rec_type.namespace.uri == VOPROV.uri and
+                             rec_type in PROV_BASE_CLS)
+
+_HEADER = re.compile(r"""
+    \s*(?:
+        (?P<keyword>document|endDocument|endBundle)
+      | bundle\s+(?P<bundle>\S+)
+      | prefix\s+(?P<prefix>[^\s<]+)\s*<(?P<prefix_uri>[^>]*)>
+      | default\s*<(?P<default_uri>[^>]*)>
+    )\s*(?://.*)?$""", re.VERBOSE)
+
+_TOKEN = re.compile(r"""
+    (?:\s+|//[^\n]*|/\*.*?\*/)*
+    (?:
+        (?P<string>\"\"\"(?:[^"\\]|\\.|"(?!""))*\"\"\"|"(?:[^"\\\n]|\\.)*")
+      | (?P<qname>'[^'\n]*')
+      | (?P<iri><[^<>\s]*>)
+      | (?P<lang>@[A-Za-z0-9-]+)
+      | (?P<punct>%%|[(),;=\[\]])
+      | (?P<word>(?!/[/*])[^\s(),;=\[\]"'<@](?:[^\s(),;=\[\]%]|%(?!%))*
+                 (?:[ \t]+[^\s(),;=\[\]"'<@%](?:[^\s(),;=\[\]%]|%(?!%))*)*)
+      | (?P<end>\s*$)
+      | (?P<error>.)
+    )""", re.VERBOSE | re.DOTALL)
+
+CHUNK_SIZE = 65536
+"""Default number of characters written at once when serializing."""
+
+_INTEGER = re.compile(r"[+-]?\d+$")
+_ITEM_ENDS = frozenset((',', ';', '[', ')'))
+
+
+class ProvNException(Error):
+    """Exception for the case a PROV-N document cannot be parsed."""
+    pass
 
 
-class VOProvNSerializer(ProvNSerializer):
+def _iter_header(bundle, newline):
+    """Generates the start of the PROV-N representation of a bundle or document, up to its records."""
+    #  if this is the document, start the document;
+    # otherwise, start the bundle
+    yield 'document' if bundle.is_document() \
+        else 'bundle %s' % bundle._identifier
+
+    default_namespace = bundle._namespaces.get_default_namespace()
+    if default_namespace:
+        yield newline + 'default <%s>' % default_namespace.uri
+
+    registered_namespaces = bundle._namespaces.get_registered_namespaces()
+    for namespace in registered_namespaces:
+        yield newline + 'prefix %s <%s>' % (namespace.prefix,
+                                            namespace.uri)
+
+    if default_namespace or registered_namespaces:
+        #  a blank line between the prefixes and the assertions
+        yield newline
+
+
+class _Incomplete(Exception):
+    """Raised while parsing a statement continuing on the next lines."""
+    pass
+
+
+class VOProvNSerializer(ValueCaches, ProvNSerializer):
     """PROV-N serializer for ProvDocument
 
     """
-    def serialize(self, stream, **kwargs):
+    value_error = ProvNException
+
+    def __init__(self, document=None):
+        """
+        Constructor.
+
+        :param document: Document to serialize.
+        """
+        super(VOProvNSerializer, self).__init__(document)
+        self._reset_value_caches()
+
+    def serialize(self, stream, chunk_size=CHUNK_SIZE, **kwargs):
         """
         Serializes a :class:`voprov.models.model.VOProvDocument` instance to a
         `PROV-N <http://www.w3.org/TR/prov-n/>`_.
 
+        The output is the same as :py:meth:`~prov.model.ProvBundle.get_provn`
+        but is written in chunks, without building the whole text first.
+
         :param stream: Where to save the output.
+        :param chunk_size: Approximate number of characters written at once
+            (default: CHUNK_SIZE).
         """
-        provn_content = self.document.get_provn()
-        if not isinstance(stream, io.TextIOBase):
-            provn_content = provn_content.encode('utf-8')
-        stream.write(provn_content)
+        encode = not isinstance(stream, io.TextIOBase)
+        chunk = []
+        length = 0
+        for text in self.iter_provn():
+            chunk.append(text)
+            length += len(text)
+            if length >= chunk_size:
+                content = ''.join(chunk)
+                stream.write(content.encode('utf-8') if encode else content)
+                chunk = []
+                length = 0
+        content = ''.join(chunk)
+        stream.write(content.encode('utf-8') if encode else content)
+
+    def iter_provn(self, bundle=None, _indent_level=0):
+        """
+        Generates the PROV-N representation of the document or of one of its
+        bundles piece by piece, each record being a piece. Joined, the pieces
+        are :py:meth:`~prov.model.ProvBundle.get_provn`.
+
+        :param bundle: The bundle, the document being serialized by default.
+        """
+        if bundle is None:
+            bundle = self.document
+        indentation = '' + ('  ' * _indent_level)
+        newline = '\n' + ('  ' * (_indent_level + 1))
+
+        for text in _iter_header(bundle, newline):
+            yield text
+
+        #  adding all the records
+        for record in bundle._records:
+            yield newline + record.get_provn()
+        if bundle.is_document():
+            # Print out bundles
+            for sub_bundle in bundle.bundles:
+                yield newline
+                for text in self.iter_provn(sub_bundle, _indent_level + 1):
+                    yield text
+
+        #  closing the structure
+        yield '\n' + indentation + (
+            'endDocument' if bundle.is_document() else 'endBundle'
+        )
 
     def deserialize(self, stream, **kwargs):
-        super(VOProvNSerializer, self).deserialize(stream, **kwargs)
+        """
+        Deserialize from `PROV-N <http://www.w3.org/TR/prov-n/>`_
+        representation to a :class:`~voprov.models.model.VOProvDocument`
+        instance.
+
+        The input is read line by line and each record is created as soon as
+        its statement is complete, using the VOProv record classes. Formal
+        attributes are read back the way
+        :py:meth:`~prov.model.ProvRecord.get_provn` writes them, i.e.
+        unquoted.
+
+        :param stream: Input data, a text or binary stream.
+        """
+        # Imported here as the model imports the serializers.
+        from voprov.models.model import VOProvDocument
+
+        if not isinstance(stream, io.TextIOBase):
+            stream = codecs.getreader('utf-8')(stream)
+
+        document = None
+        bundle = None
+        statement = None
+        line_number = 0
+        for line_number, line in enumerate(stream, 1):
+            if statement is not None:
+                statement += line
+            else:
+                header = _HEADER.match(line)
+                if header is None:
+                    if _TOKEN.match(line).lastgroup == 'end':
+                        # Blank or comment line.
+                        continue
+                    statement, start = line, line_number
+                elif header.group('keyword') == 'document':
+                    if document is not None:
+                        raise ProvNException(
+                            'line %d: nested document' % line_number)
+                    document = bundle = VOProvDocument()
+                    continue
+                elif document is None:
+                    raise ProvNException(
+                        'line %d: expected "document"' % line_number)
+                elif header.group('keyword') == 'endDocument':
+                    if bundle is not document:
+                        raise ProvNException(
+                            'line %d: unexpected "endDocument"' % line_number)
+                    return document
+                elif header.group('keyword') == 'endBundle':
+                    if bundle is document:
+                        raise ProvNException(
+                            'line %d: unexpected "endBundle"' % line_number)
+                    bundle = document
+                    continue
+                elif header.group('bundle'):
+                    if bundle is not document:
+                        raise ProvNException(
+                            'line %d: nested bundle' % line_number)
+                    bundle = document.bundle(header.group('bundle'))
+                    continue
+                elif header.group('prefix'):
+                    self._names_bundle = None
+                    _add_namespace(bundle, header.group('prefix'),
+                                   header.group('prefix_uri'))
+                    continue
+                else:
+                    self._names_bundle = None
+                    bundle.set_default_namespace(header.group('default_uri'))
+                    continue
+            if document is None:
+                raise ProvNException(
+                    'line %d: expected "document"' % line_number)
+            try:
+                self.deserialize_record(statement, bundle)
+            except _Incomplete:
+                continue
+            except (Error, ValueError, KeyError) as error:
+                raise ProvNException('line %d: %s' % (start, error))
+            statement = None
+
+        if statement is not None:
+            raise ProvNException('line %d: unterminated statement' % start)
+        raise ProvNException(
+            'line %d: missing "endDocument"' % line_number)
+
+    def deserialize_record(self, statement, bundle):
+        """
+        Creates the record described by a PROV-N statement in a bundle or
+        document.
+
+        :param statement: The text of the statement.
+        :param bundle: The bundle or document to add the record to.
+        :return: The new record, or None if the statement is only comments.
+        """
+        tokens = _tokenize(statement)
+        if not tokens:
+            return None
+        try:
+            name, identifier, items, others = _parse_record(statement, tokens)
+        except IndexError:
+            # Ran past the last token.
+            raise _Incomplete()
+
+        if name in PROVN_SUBTYPE_IDS_MAP:
+            rec_type, subtype = PROVN_SUBTYPE_IDS_MAP[name]
+            attributes = [(PROV_TYPE, subtype)]
+        elif name in PROVN_RECORD_IDS_MAP:
+            rec_type = PROVN_RECORD_IDS_MAP[name]
+            attributes = []
+        else:
+            raise ProvNException('unknown record "%s"' % name)
+
+        record_class = PROV_REC_CLS[rec_type]
+        if issubclass(record_class, ProvElement):
+            if not items:
+                raise ProvNException('missing identifier')
+            identifier = items.pop(0)
+        formal_attributes = record_class.FORMAL_ATTRIBUTES or ()
+        if len(items) > len(formal_attributes):
+            raise ProvNException('too many attributes for "%s"' % name)
+
+        # Qualified names are given as strings, like the record methods do,
+        # for the namespaces to be registered the same way.
+        formal = []
+        for attr, value in zip(formal_attributes, items):
+            if value == '-':
+                continue
+            if attr in PROV_ATTRIBUTE_LITERALS:
+                value = self._datetime(value)
+            formal.append((attr, value))
+        attributes[:0] = formal
+
+        qualified_name = self._qualified_name
+        for key, kind, value, qualifier in others:
+            if kind == 'qname':
+                value = qualified_name(bundle, value)
+            elif kind == '%%':
+                value = self._typed_literal(
+                    value, qualified_name(bundle, qualifier))
+            elif kind == 'lang':
+                value = Literal(value, langtag=qualifier)
+            attributes.append((key, value))
+
+        if identifier == '-':
+            identifier = None
+        return bundle.new_record(rec_type, identifier, attributes)
+
+
+def _parse_record(statement, tokens):
+    """
+    Parses the tokens of a record statement, raising IndexError when the
+    statement is not complete.
+
+    :param statement: The text of the statement.
+    :param tokens: The tokens of the statement.
+    :return: A (record name, relation identifier, formal attribute values,
+        other attributes) tuple. The formal attribute values are the text
+        written, the other attributes are (name, kind, value, datatype or
+        language) tuples, kind being the one of the value token or '%%' and
+        'lang' for literals.
+    """
+    kind, name, _, _ = tokens[0]
+    if kind != 'word':
+        raise ProvNException('unexpected "%s"' % name)
+    if tokens[1][0] != '(':
+        raise ProvNException('expected "(" after "%s"' % name)
+
+    # Formal attributes, written unquoted, and the relation identifier.
+    identifier = None
+    items = []
+    position = 2
+    kind = tokens[position][0]
+    while kind != ')' and kind != '[':
+        first = last = position
+        if tokens[first][0] in _ITEM_ENDS:
+            raise ProvNException('missing value before "%s"' %
+                                 tokens[first][1])
+        while tokens[position][0] not in _ITEM_ENDS:
+            last = position
+            position += 1
+        value = statement[tokens[first][2]:tokens[last][3]]
+        kind = tokens[position][0]
+        if kind == ';' and identifier is None and not items:
+            identifier = value
+        else:
+            items.append(value)
+        if kind == ',' or kind == ';':
+            position += 1
+            kind = tokens[position][0]
+
+    # Other attributes.
+    others = []
+    if kind == '[':
+        kind = ','
+        while kind == ',':
+            key, equal, value = tokens[position + 1:position + 4]
+            if key[0] != 'word' or equal[0] != '=':
+                raise ProvNException('invalid attribute "%s"' % key[1])
+            position += 4
+            kind = tokens[position][0]
+            if kind == '%%' or kind == 'lang':
+                if value[0] != 'string':
+                    raise ProvNException('invalid value "%s"' % value[1])
+                qualifier = tokens[position + 1][1] if kind == '%%' \
+                    else tokens[position][1][1:]
+                others.append((key[1], kind, value[1], qualifier))
+                position += 2 if kind == '%%' else 1
+                kind = tokens[position][0]
+            elif value[0] == 'word':
+                others.append((key[1], 'int', int(value[1]), None)
+                              if _INTEGER.match(value[1]) else
+                              (key[1], 'word', value[1], None))
+            elif value[0] == 'string' or value[0] == 'qname':
+                others.append((key[1], value[0], value[1], None))
+            else:
+                raise ProvNException('invalid value "%s"' % value[1])
+        if kind != ']':
+            raise ProvNException('expected "]" instead of "%s"' %
+                                 tokens[position][1])
+        position += 1
+        kind = tokens[position][0]
+    if kind != ')':
+        raise ProvNException('expected ")" instead of "%s"' %
+                             tokens[position][1])
+    if position + 1 != len(tokens):
+        raise ProvNException('unexpected "%s"' % tokens[position + 1][1])
+    return name, identifier, items, others
+
+
+def _tokenize(statement):
+    """
+    Splits a PROV-N statement into (kind, value, start, end) tokens. The
+    kind of the punctuation tokens is the punctuation itself, the value of
+    the strings and qualified names is unquoted.
+
+    :param statement: The text of the statement.
+    """
+    tokens = []
+    append = tokens.append
+    for token in _TOKEN.finditer(statement):
+        group = kind = token.lastgroup
+        value = token.group(kind)
+        if kind == 'punct':
+            kind = value
+        elif kind == 'string':
+            if value.startswith('"""'):
+                value = value[3:-3]
+            else:
+                value = value[1:-1]
+            if '\\"' in value:
+                value = value.replace('\\"', '"')
+        elif kind == 'qname':
+            value = value[1:-1]
+        elif kind == 'end':
+            break
+        elif kind == 'error':
+            if value in ('"', "'", '<', '/'):
+                # Unterminated string, qualified name, IRI or comment.
+                raise _Incomplete()
+            raise ProvNException('invalid character "%s"' % value)
+        start, end = token.span(group)
+        append((kind, value, start, end))
+    return tokens
+
+
+def _add_namespace(bundle, prefix, uri):
+    """
+    Registers a namespace declared in PROV-N in a bundle, unless it is one of
+    the default namespaces.
+
+    :param bundle: The bundle or document.
+    :param prefix: The prefix of the namespace.
+    :param uri: The URI of the namespace.
+    """
+    if prefix not in DEFAULT_NAMESPACES and prefix not in bundle._namespaces:
+        bundle.add_namespace(prefix, uri)
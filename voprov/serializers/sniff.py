@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import re
+
+import six
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+__all__ = [
+    'guess_format'
+]
+
+FORMAT_EXTENSIONS = {
+    '.json': ('json', {}),
+    '.xml': ('xml', {}),
+    '.provx': ('xml', {}),
+    '.provn': ('provn', {}),
+    '.rdf': ('rdf', {'rdf_format': 'xml'}),
+    '.owl': ('rdf', {'rdf_format': 'xml'}),
+    '.ttl': ('rdf', {'rdf_format': 'turtle'}),
+    '.nt': ('rdf', {'rdf_format': 'nt'}),
+    '.trig': ('rdf', {'rdf_format': 'trig'}),
+    '.vobin': ('vobin', {}),
+    '.vobix': ('vobix', {}),
+}
+"""Formats, and their deserializer options, guessed from a file extension."""
+
+SNIFF_SIZE = 4096
+"""Number of bytes or characters read from the start of a source to guess its format."""
+
+_COMMENTS = re.compile(r'(\s+|//[^\n]*(\n|$)|/\*.*?\*/|#[^\n]*(\n|$)|<!--.*?-->|<\?.*?\?>)', re.DOTALL)
+_TURTLE_START = re.compile(r'(@prefix|@base|prefix\s|base\s|<[a-z][a-z0-9+.-]*:[^\s<>"]*>)', re.IGNORECASE)
+_RDF_XML_ROOT = re.compile(r'<([\w.-]+:)?RDF[\s>]')
+
+
+def guess_format(head, name=None):
+    """
+    Guesses the format of a serialized document from its first bytes or characters and, when they are not
+    conclusive, from the extension of its file name.
+
+    :param head:                The start of the content, as text or bytes.
+    :param name:                The file name or path of the content, if any.
+    :return:                    A (format, deserializer options) tuple, or (None, {}) if the format is unknown.
+    """
+    if isinstance(head, bytes):
+        if head.startswith(b'VOBIN'):
+            return 'vobin', {}
+        if head.startswith(b'VOBIX'):
+            return 'vobix', {}
+        head = head.decode('utf-8', 'ignore')
+    head = head.lstrip('\ufeff')
+
+    # Skip the leading whitespaces, comments and XML declarations.
+    position = 0
+    match = _COMMENTS.match(head, position)
+    while match and match.end() > position:
+        position = match.end()
+        match = _COMMENTS.match(head, position)
+    content = head[position:]
+
+    if content.startswith('{'):
+        return 'json', {}
+    if content.startswith('document'):
+        return 'provn', {}
+    if _TURTLE_START.match(content):
+        return 'rdf', {}
+    if content.startswith('<'):
+        if _RDF_XML_ROOT.match(content):
+            return 'rdf', {'rdf_format': 'xml'}
+        return 'xml', {}
+
+    if isinstance(name, six.string_types):
+        extension = os.path.splitext(name)[1].lower()
+        if extension in FORMAT_EXTENSIONS:
+            file_format, options = FORMAT_EXTENSIONS[extension]
+            return file_format, dict(options)
+    return None, {}
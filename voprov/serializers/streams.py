@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+__all__ = [
+    'buffered',
+    'peek',
+    'seekable'
+]
+
+
+def seekable(stream):
+    """Returns whether a stream can be sought, False when it cannot tell."""
+    try:
+        return stream.seekable()
+    except (AttributeError, ValueError):
+        return False
+
+
+def peek(stream, size):
+    """
+    Reads the start of a stream without consuming it.
+
+    :param stream: A text or binary stream.
+    :param size: The number of bytes or characters to read.
+    :return: A (head, stream) tuple, where stream reads from the start of the
+        head again.
+    """
+    if seekable(stream):
+        position = stream.tell()
+        head = stream.read(size)
+        try:
+            stream.seek(position)
+            return head, stream
+        except (io.UnsupportedOperation, OSError):
+            # E.g. a decompressing stream reading a pipe, which claims to be seekable but has to seek its source.
+            pass
+    else:
+        head = stream.read(size)
+    if isinstance(head, bytes):
+        return head, PeekedBinaryStream(head, stream)
+    return head, PeekedTextStream(head, stream)
+
+
+def buffered(stream):
+    """
+    Reads the rest of a stream into an in-memory, seekable stream.
+
+    :param stream: A text or binary stream.
+    """
+    content = stream.read()
+    if isinstance(content, bytes):
+        return io.BytesIO(content)
+    return io.StringIO(content)
+
+
+class PeekedStream(object):
+    """Stream reading first the head already read from another stream, then the rest of that stream."""
+
+    def __init__(self, head, stream):
+        self._head = head
+        self._stream = stream
+        self.name = getattr(stream, "name", None)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        head = self._head
+        if not head:
+            return self._stream.read(size)
+        if size is None or size < 0:
+            self._head = head[:0]
+            return head + self._stream.read()
+        self._head = head[size:]
+        head = head[:size]
+        if len(head) < size:
+            head += self._stream.read(size - len(head))
+        return head
+
+    def readline(self, size=-1):
+        head = self._head
+        if not head:
+            return self._stream.readline(size)
+        end = head.find(b"\n" if isinstance(head, bytes) else "\n") + 1
+        if end and (size is None or size < 0 or end <= size):
+            self._head = head[end:]
+            return head[:end]
+        if size is not None and 0 <= size <= len(head):
+            return self.read(size)
+        self._head = head[:0]
+        if size is None or size < 0:
+            return head + self._stream.readline()
+        return head + self._stream.readline(size - len(head))
+
+
+class PeekedTextStream(PeekedStream, io.TextIOBase):
+    pass
+
+
+class PeekedBinaryStream(PeekedStream, io.BufferedIOBase):
+    pass
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import datetime
+import io
+import struct
+
+import six
+from dateutil.tz import tzoffset
+
+from prov import Error
+from prov.identifier import Identifier, Namespace, QualifiedName
+from prov.model import PROV_REC_CLS, Literal
+from prov.serializers import Serializer
+from voprov.models.constants import *
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+MAGIC = b'VOBIN\x01'
+"""Start of a vobin content, the last byte being the version of the format."""
+
+CHUNK_SIZE = 65536
+"""Number of bytes written or read at once."""
+
+# Record types by code, the code of a type being its index + 1. Code 0 is
+# followed by the qualified name of a type missing from this list. Types may
+# only be appended to keep the existing codes.
+RECORD_TYPES = (
+    VOPROV_ENTITY, VOPROV_ACTIVITY, VOPROV_AGENT, VOPROV_USAGE,
+    VOPROV_GENERATION, VOPROV_COMMUNICATION, VOPROV_START, VOPROV_END,
+    VOPROV_INVALIDATION, VOPROV_DERIVATION, VOPROV_ATTRIBUTION,
+    VOPROV_ASSOCIATION, VOPROV_DELEGATION, VOPROV_INFLUENCE,
+    VOPROV_SPECIALIZATION, VOPROV_ALTERNATE, VOPROV_MENTION,
+    VOPROV_MEMBERSHIP, VOPROV_VALUE_ENTITY, VOPROV_DATASET_ENTITY,
+    VOPROV_ACTIVITY_DESCRIPTION, VOPROV_USAGE_DESCRIPTION,
+    VOPROV_GENERATION_DESCRIPTION, VOPROV_ENTITY_DESCRIPTION,
+    VOPROV_VALUE_DESCRIPTION, VOPROV_DATASET_DESCRIPTION,
+    VOPROV_CONFIG_FILE_DESCRIPTION, VOPROV_PARAMETER_DESCRIPTION,
+    VOPROV_CONFIGURATION_FILE, VOPROV_CONFIGURATION_PARAMETER,
+    VOPROV_DESCRIPTION_RELATION, VOPROV_CONFIGURATION_RELATION,
+    VOPROV_RELATED_TO_RELATION, VOPROV_REFERENCE_RELATION,
+    PROV_ENTITY, PROV_ACTIVITY, PROV_GENERATION, PROV_USAGE,
+    PROV_COMMUNICATION, PROV_START, PROV_END, PROV_INVALIDATION,
+    PROV_DERIVATION, PROV_AGENT, PROV_ATTRIBUTION, PROV_ASSOCIATION,
+    PROV_DELEGATION, PROV_INFLUENCE, PROV_SPECIALIZATION, PROV_ALTERNATE,
+    PROV_MENTION, PROV_MEMBERSHIP,
+)
+RECORD_TYPE_CODES = dict((rec_type, code) for code, rec_type in
+                         enumerate(RECORD_TYPES, 1))
+
+# Tags of the attribute values.
+_STRING = 1
+_INTEGER = 2
+_FLOAT = 3
+_TRUE = 4
+_FALSE = 5
+_DATETIME = 6
+_AWARE_DATETIME = 7
+_QUALIFIED_NAME = 8
+_LITERAL = 9
+_LANG_LITERAL = 10
+_IDENTIFIER = 11
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_DOUBLE = struct.Struct('<d')
+
+
+class VOBinException(Error):
+    """Exception for the case a vobin content cannot be read or written."""
+    pass
+
+
+class VOProvBinarySerializer(Serializer):
+    """
+    Compact binary serializer for :class:`~voprov.models.model.VOProvDocument`.
+
+    The strings, namespaces and qualified names are written once, the first
+    time they are used, and referred to by their index afterwards. Numbers
+    are written as variable-length integers (varints), the record types as
+    codes of :py:const:`RECORD_TYPES` and the attribute values with a tag
+    telling their type, so that they are read back as the same Python values.
+    """
+
+    binary = True
+    """The format is binary, it is written to and read from binary streams."""
+
+    def serialize(self, stream, **kwargs):
+        """
+        Serializes a :class:`~voprov.models.model.VOProvDocument` instance to
+        the vobin format.
+
+        :param stream: Where to save the output, a binary stream.
+        """
+        if isinstance(stream, io.TextIOBase):
+            raise TypeError('vobin is a binary format, a binary stream is '
+                            'needed')
+        writer = _Writer(stream)
+        writer.raw(MAGIC)
+        document = self.document
+        self._write_bundle(writer, document)
+        bundles = list(document.bundles)
+        writer.varint(len(bundles))
+        for bundle in bundles:
+            writer.qualified_name(bundle.identifier)
+            self._write_bundle(writer, bundle)
+        writer.flush()
+
+    def _write_bundle(self, writer, bundle):
+        """
+        Writes the namespaces and the records of a bundle or document.
+        """
+        default_namespace = bundle._namespaces.get_default_namespace()
+        if default_namespace is None:
+            writer.varint(0)
+        else:
+            writer.varint(1)
+            writer.string(default_namespace.uri)
+        namespaces = list(bundle._namespaces.get_registered_namespaces())
+        writer.varint(len(namespaces))
+        for namespace in namespaces:
+            writer.namespace(namespace)
+
+        records = bundle._records
+        writer.varint(len(records))
+        for record in records:
+            rec_type = record.get_type()
+            code = RECORD_TYPE_CODES.get(rec_type)
+            if code is None:
+                writer.varint(0)
+                writer.qualified_name(rec_type)
+            else:
+                writer.varint(code)
+            writer.qualified_name(record.identifier)
+            attributes = record.attributes
+            writer.varint(len(attributes))
+            for attr, value in attributes:
+                writer.qualified_name(attr)
+                writer.value(value)
+
+    def deserialize(self, stream, **kwargs):
+        """
+        Deserializes a vobin content to a
+        :class:`~voprov.models.model.VOProvDocument` instance, using the
+        VOProv record classes.
+
+        :param stream: Input data, a binary stream.
+        """
+        # Imported here as the model imports the serializers.
+        from voprov.models.model import VOProvDocument
+
+        if isinstance(stream, io.TextIOBase):
+            raise TypeError('vobin is a binary format, a binary stream is '
+                            'needed')
+        reader = _Reader(stream)
+        if bytes(reader.read(len(MAGIC))) != MAGIC:
+            raise VOBinException('Not a vobin content, or an unsupported '
+                                 'version of the format')
+        document = VOProvDocument()
+        self._read_bundle(reader, document)
+        for _ in range(reader.varint()):
+            bundle = document.bundle(reader.qualified_name())
+            self._read_bundle(reader, bundle)
+        return document
+
+    def _read_bundle(self, reader, bundle):
+        """
+        Reads the namespaces and the records of a bundle or document.
+        """
+        if reader.varint():
+            bundle.set_default_namespace(reader.string())
+        for _ in range(reader.varint()):
+            namespace = reader.namespace()
+            if namespace.prefix not in bundle._namespaces:
+                bundle.add_namespace(namespace)
+
+        # The values being already converted, the records are filled
+        # directly instead of through add_attributes().
+        record_classes = dict()
+        for _ in range(reader.varint()):
+            code = reader.varint()
+            if code == 0:
+                rec_type = reader.qualified_name()
+            else:
+                try:
+                    rec_type = RECORD_TYPES[code - 1]
+                except IndexError:
+                    raise VOBinException('Unknown record type code %d' % code)
+            try:
+                record_class = record_classes[rec_type]
+            except KeyError:
+                record_class = record_classes[rec_type] = \
+                    _record_class(bundle, rec_type)
+            record = record_class(bundle, reader.qualified_name())
+            attributes = record._attributes
+            for _ in range(reader.varint()):
+                attr = reader.qualified_name()
+                attributes[attr].add(reader.value())
+            bundle._add_record(record)
+
+
+def encode_bundle(bundle):
+    """
+    Encodes the namespaces and the records of a bundle in the vobin format,
+    without the header of a vobin content, e.g. to send them to another
+    process, see :py:func:`decode_bundle`.
+
+    :param bundle: The bundle, VOProv or W3C PROV.
+    :return: The encoding, as bytes.
+    """
+    stream = io.BytesIO()
+    writer = _Writer(stream)
+    VOProvBinarySerializer()._write_bundle(writer, bundle)
+    writer.flush()
+    return stream.getvalue()
+
+
+def decode_bundle(data, bundle):
+    """
+    Adds the namespaces and the records encoded by :py:func:`encode_bundle`
+    to a bundle, as records of the classes of the bundle.
+
+    :param data: The encoding, as bytes.
+    :param bundle: The bundle, VOProv or W3C PROV.
+    """
+    VOProvBinarySerializer()._read_bundle(_Reader(io.BytesIO(data)), bundle)
+
+
+def _record_class(bundle, rec_type):
+    """Returns the class of the records of a type in a bundle, the W3C PROV bundles using the prov classes."""
+    if hasattr(bundle, '_record_class'):
+        return bundle._record_class(rec_type)
+    return PROV_REC_CLS[rec_type]
+
+
+class _Writer(object):
+    """Buffered writer of the vobin encoding, keeping the tables of the strings, namespaces and qualified names."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffer = bytearray()
+        self._strings = dict()
+        self._namespaces = dict()
+        self._qualified_names = dict()
+
+    def flush(self):
+        self._stream.write(bytes(self._buffer))
+        del self._buffer[:]
+
+    def raw(self, data):
+        self._buffer += data
+        if len(self._buffer) >= CHUNK_SIZE:
+            self.flush()
+
+    def varint(self, number):
+        buffer = self._buffer
+        while number >= 0x80:
+            buffer.append((number & 0x7f) | 0x80)
+            number >>= 7
+        buffer.append(number)
+        if len(buffer) >= CHUNK_SIZE:
+            self.flush()
+
+    def string(self, text):
+        """Writes a string, as 0 and its UTF-8 bytes the first time, as its index + 1 afterwards."""
+        index = self._strings.get(text)
+        if index is not None:
+            self.varint(index + 1)
+            return
+        self._strings[text] = len(self._strings)
+        data = text.encode('utf-8')
+        self.varint(0)
+        self.varint(len(data))
+        self.raw(data)
+
+    def namespace(self, namespace):
+        """Writes a namespace, as 0, its prefix and URI the first time, as its index + 1 afterwards."""
+        key = (namespace.prefix, namespace.uri)
+        index = self._namespaces.get(key)
+        if index is not None:
+            self.varint(index + 1)
+            return
+        self._namespaces[key] = len(self._namespaces)
+        self.varint(0)
+        self.string(namespace.prefix)
+        self.string(namespace.uri)
+
+    def qualified_name(self, qualified_name):
+        """
+        Writes a qualified name, as 0 if it is None, as 1, its namespace and local part the first time, as its
+        index + 2 afterwards.
+        """
+        if qualified_name is None:
+            self.varint(0)
+            return
+        namespace = qualified_name.namespace
+        key = (namespace.prefix, namespace.uri, qualified_name.localpart)
+        index = self._qualified_names.get(key)
+        if index is not None:
+            self.varint(index + 2)
+            return
+        self._qualified_names[key] = len(self._qualified_names)
+        self.varint(1)
+        self.namespace(namespace)
+        self.string(qualified_name.localpart)
+
+    def value(self, value):
+        """Writes an attribute value, as the tag of its type and its encoding."""
+        if isinstance(value, six.string_types):
+            self.varint(_STRING)
+            self.string(value)
+        elif isinstance(value, bool):
+            self.varint(_TRUE if value else _FALSE)
+        elif isinstance(value, six.integer_types):
+            self.varint(_INTEGER)
+            # Zigzag encoding of the signed integers.
+            self.varint(value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            self.varint(_FLOAT)
+            self.raw(_DOUBLE.pack(value))
+        elif isinstance(value, datetime.datetime):
+            offset = value.utcoffset()
+            if offset is None:
+                self.varint(_DATETIME)
+            else:
+                self.varint(_AWARE_DATETIME)
+                seconds = offset.days * 86400 + offset.seconds
+                self.varint(seconds * 2 if seconds >= 0 else -seconds * 2 - 1)
+            delta = value.replace(tzinfo=None) - _EPOCH
+            microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+            self.varint(microseconds * 2 if microseconds >= 0 else -microseconds * 2 - 1)
+        elif isinstance(value, QualifiedName):
+            self.varint(_QUALIFIED_NAME)
+            self.qualified_name(value)
+        elif isinstance(value, Literal):
+            if value.langtag:
+                self.varint(_LANG_LITERAL)
+                self.string(six.text_type(value.value))
+                self.string(six.text_type(value.langtag))
+            else:
+                self.varint(_LITERAL)
+                self.string(six.text_type(value.value))
+                self.qualified_name(value.datatype)
+        elif isinstance(value, Identifier):
+            self.varint(_IDENTIFIER)
+            self.string(value.uri)
+        else:
+            raise VOBinException('Cannot write a value of type %s' % type(value).__name__)
+
+
+class _Reader(object):
+    """Buffered reader of the vobin encoding, rebuilding the tables of the strings, namespaces and qualified names."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffer = bytearray()
+        self._position = 0
+        self._strings = []
+        self._namespaces = []
+        self._qualified_names = []
+
+    def _fill(self, size):
+        """Reads from the stream until size bytes are available in the buffer."""
+        buffer = self._buffer[self._position:]
+        while len(buffer) < size:
+            data = self._stream.read(max(CHUNK_SIZE, size - len(buffer)))
+            if not data:
+                raise VOBinException('Unexpected end of the vobin content')
+            buffer += data
+        self._buffer = buffer
+        self._position = 0
+
+    def read(self, size):
+        if self._position + size > len(self._buffer):
+            self._fill(size)
+        position = self._position
+        self._position = position + size
+        return self._buffer[position:position + size]
+
+    def varint(self):
+        result = 0
+        shift = 0
+        while True:
+            if self._position >= len(self._buffer):
+                self._fill(1)
+            byte = self._buffer[self._position]
+            self._position += 1
+            if byte < 0x80:
+                return result | (byte << shift)
+            result |= (byte & 0x7f) << shift
+            shift += 7
+
+    def signed_varint(self):
+        number = self.varint()
+        return -((number + 1) >> 1) if number & 1 else number >> 1
+
+    def string(self):
+        index = self.varint()
+        if index:
+            return self._strings[index - 1]
+        text = self.read(self.varint()).decode('utf-8')
+        self._strings.append(text)
+        return text
+
+    def namespace(self):
+        index = self.varint()
+        if index:
+            return self._namespaces[index - 1]
+        namespace = Namespace(self.string(), self.string())
+        self._namespaces.append(namespace)
+        return namespace
+
+    def qualified_name(self):
+        index = self.varint()
+        if index > 1:
+            return self._qualified_names[index - 2]
+        if index == 0:
+            return None
+        namespace = self.namespace()
+        qualified_name = namespace[self.string()]
+        self._qualified_names.append(qualified_name)
+        return qualified_name
+
+    def value(self):
+        tag = self.varint()
+        if tag == _STRING:
+            return self.string()
+        if tag == _QUALIFIED_NAME:
+            return self.qualified_name()
+        if tag == _INTEGER:
+            return self.signed_varint()
+        if tag == _FLOAT:
+            return _DOUBLE.unpack(bytes(self.read(_DOUBLE.size)))[0]
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _DATETIME or tag == _AWARE_DATETIME:
+            tzinfo = tzoffset(None, self.signed_varint()) if tag == _AWARE_DATETIME else None
+            value = _EPOCH + datetime.timedelta(microseconds=self.signed_varint())
+            return value.replace(tzinfo=tzinfo) if tzinfo is not None else value
+        if tag == _LITERAL:
+            return Literal(self.string(), self.qualified_name())
+        if tag == _LANG_LITERAL:
+            return Literal(self.string(), langtag=self.string())
+        if tag == _IDENTIFIER:
+            return Identifier(self.string())
+        raise VOBinException('Unknown value tag %d' % tag)
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import bisect
+import io
+import struct
+
+import six
+
+from prov.identifier import Namespace
+from prov.serializers import Serializer
+from voprov.serializers.vobin import (RECORD_TYPES, RECORD_TYPE_CODES,
+                                      VOBinException, _Reader, _Writer)
+
+__author__ = 'Jean-Francois Sornay'
+__email__ = 'jeanfrancois.sornay@gmail.com'
+
+MAGIC = b'VOBIX\x01'
+"""Start and end of a vobix content, the last byte being the version of the format."""
+
+# A vobix content is the magic, the records, the index and a trailer made of
+# the position of the index and the magic again. The index starts with the
+# _HEADER, giving the position of the fixed-size tables which follow it:
+# - the strings, as the offsets of their UTF-8 bytes (one more than strings)
+#   followed by the bytes themselves,
+# - the namespaces, as the indexes of their prefix and URI strings,
+# - the qualified names, as the indexes of their namespace and local part,
+# - the bundles, the document first, as _BUNDLE entries pointing to their
+#   namespace indexes, the offsets of their records (one more than records,
+#   the last one being the end of the records), the record type codes and the
+#   (qualified name, record) indexes of the identified records, sorted by
+#   identifier URI.
+# The records are encoded as in vobin, except that the strings, namespaces and
+# qualified names are always written as their index in the tables (+ 1 for
+# the qualified names, 0 being None), so that any record can be decoded alone.
+_HEADER = struct.Struct('<9Q')
+_BUNDLE = struct.Struct('<9Q')
+_TRAILER = struct.Struct('<Q')
+_OFFSET = struct.Struct('<Q')
+_PAIR = struct.Struct('<II')
+
+
+class VOProvIndexedBinarySerializer(Serializer):
+    """
+    Indexed binary serializer for :class:`~voprov.models.model.VOProvDocument`.
+
+    The vobix format stores the records as vobin does, followed by tables of
+    the strings, namespaces, qualified names and record offsets, so that a
+    record can be found and decoded without reading the rest of the content.
+    See :class:`~voprov.models.voprovMapped.VOProvMappedDocument` to open a
+    vobix file as a lazy, read-only document.
+    """
+
+    binary = True
+    """The format is binary, it is written to and read from binary streams."""
+
+    def serialize(self, stream, **kwargs):
+        """
+        Serializes a :class:`~voprov.models.model.VOProvDocument` instance to
+        the vobix format.
+
+        :param stream: Where to save the output, a binary stream.
+        """
+        if isinstance(stream, io.TextIOBase):
+            raise TypeError('vobix is a binary format, a binary stream is '
+                            'needed')
+        writer = _IndexedWriter(stream)
+        writer.raw(MAGIC)
+        document = self.document
+        bundles = [self._write_records(writer, document)]
+        for bundle in document.bundles:
+            bundles.append(self._write_records(writer, bundle))
+        index_position = writer.tell()
+
+        # The tables follow the header, their positions are known beforehand.
+        strings = [text.encode('utf-8') for text in writer.strings]
+        position = index_position + _HEADER.size
+        strings_position = position
+        position += _OFFSET.size * (len(strings) + 1)
+        blob_position = position
+        position += sum(len(data) for data in strings)
+        namespaces_position = position
+        position += _PAIR.size * len(writer.namespaces)
+        qualified_names_position = position
+        position += _PAIR.size * len(writer.qualified_names)
+        bundles_position = position
+        position += _BUNDLE.size * len(bundles)
+        writer.raw(_HEADER.pack(
+            len(strings), strings_position, blob_position,
+            len(writer.namespaces), namespaces_position,
+            len(writer.qualified_names), qualified_names_position,
+            len(bundles), bundles_position))
+
+        offset = 0
+        for data in strings:
+            writer.raw(_OFFSET.pack(offset))
+            offset += len(data)
+        writer.raw(_OFFSET.pack(offset))
+        for data in strings:
+            writer.raw(data)
+        for prefix, uri in writer.namespaces:
+            writer.raw(_PAIR.pack(prefix, uri))
+        for namespace, localpart in writer.qualified_names:
+            writer.raw(_PAIR.pack(namespace, localpart))
+
+        # Bundle entries, then the tables of each bundle.
+        for identifier, default, namespaces, offsets, codes, identifiers \
+                in bundles:
+            namespaces_size = 4 * len(namespaces)
+            offsets_size = _OFFSET.size * len(offsets)
+            codes_size = 2 * len(codes)
+            writer.raw(_BUNDLE.pack(
+                identifier, default, position, len(namespaces),
+                position + namespaces_size, len(codes),
+                position + namespaces_size + offsets_size,
+                position + namespaces_size + offsets_size + codes_size,
+                len(identifiers)))
+            position += (namespaces_size + offsets_size + codes_size +
+                         _PAIR.size * len(identifiers))
+        for _, _, namespaces, offsets, codes, identifiers in bundles:
+            writer.raw(struct.pack('<%dI' % len(namespaces), *namespaces))
+            writer.raw(struct.pack('<%dQ' % len(offsets), *offsets))
+            writer.raw(struct.pack('<%dH' % len(codes), *codes))
+            for _, qualified_name, record_index in identifiers:
+                writer.raw(_PAIR.pack(qualified_name, record_index))
+        writer.raw(_TRAILER.pack(index_position))
+        writer.raw(MAGIC)
+        writer.flush()
+
+    def _write_records(self, writer, bundle):
+        """
+        Writes the records of a bundle or document.
+
+        :return: The (identifier, default namespace, namespaces, record
+            offsets, record type codes, sorted identifiers) of the bundle
+            entry.
+        """
+        identifier = writer.qualified_name_index(bundle.identifier)
+        default_namespace = bundle._namespaces.get_default_namespace()
+        default = 0 if default_namespace is None else \
+            writer.string_index(default_namespace.uri) + 1
+        namespaces = [writer.namespace_index(namespace) for namespace
+                      in bundle._namespaces.get_registered_namespaces()]
+        offsets = []
+        codes = []
+        identifiers = []
+        for record in bundle._records:
+            offsets.append(writer.tell())
+            rec_type = record.get_type()
+            code = RECORD_TYPE_CODES.get(rec_type, 0)
+            codes.append(code)
+            writer.varint(code)
+            if code == 0:
+                writer.qualified_name(rec_type)
+            writer.qualified_name(record.identifier)
+            if record.identifier is not None:
+                identifiers.append((
+                    six.text_type(record.identifier.uri),
+                    writer.qualified_name_index(record.identifier),
+                    len(codes) - 1))
+            attributes = record.attributes
+            writer.varint(len(attributes))
+            for attr, value in attributes:
+                writer.qualified_name(attr)
+                writer.value(value)
+        offsets.append(writer.tell())
+        # Sorted by URI, then by position of the record.
+        identifiers.sort()
+        return identifier, default, namespaces, offsets, codes, identifiers
+
+    def deserialize(self, stream, **kwargs):
+        """
+        Deserializes a vobix content to a
+        :class:`~voprov.models.model.VOProvDocument` instance, using the
+        VOProv record classes. The whole content is decoded, see
+        :class:`~voprov.models.voprovMapped.VOProvMappedDocument` to only
+        decode the records used.
+
+        :param stream: Input data, a binary stream.
+        """
+        # Imported here as the model imports the serializers.
+        from voprov.models.model import VOProvDocument
+
+        if isinstance(stream, io.TextIOBase):
+            raise TypeError('vobix is a binary format, a binary stream is '
+                            'needed')
+        index = VOBixIndex(stream.read())
+        document = VOProvDocument()
+        self._read_records(index, 0, document)
+        for position in range(1, index.bundle_count):
+            bundle = document.bundle(index.bundle_identifier(position))
+            self._read_records(index, position, bundle)
+        return document
+
+    def _read_records(self, index, position, bundle):
+        """
+        Reads the namespaces and the records of a bundle or document.
+        """
+        default_namespace = index.bundle_default_namespace(position)
+        if default_namespace is not None:
+            bundle.set_default_namespace(default_namespace)
+        for namespace in index.bundle_namespaces(position):
+            if namespace.prefix not in bundle._namespaces:
+                bundle.add_namespace(namespace)
+        for record_index in range(index.record_count(position)):
+            rec_type, identifier, attributes = index.record(position,
+                                                            record_index)
+            record = bundle._record_class(rec_type)(bundle, identifier)
+            record_attributes = record._attributes
+            for attr, value in attributes:
+                record_attributes[attr].add(value)
+            bundle._add_record(record)
+
+
+class VOBixIndex(object):
+    """
+    Random access to the content of a vobix buffer, e.g. a memory-mapped
+    file. The strings, namespaces and qualified names are decoded the first
+    time they are used and kept, the records each time they are requested.
+    """
+
+    def __init__(self, buffer):
+        """
+        Constructor.
+
+        :param buffer: The vobix content, bytes or a :py:class:`mmap.mmap`.
+        """
+        size = len(buffer)
+        if size < 2 * len(MAGIC) + _TRAILER.size or \
+                buffer[:len(MAGIC)] != MAGIC or \
+                buffer[size - len(MAGIC):] != MAGIC:
+            raise VOBinException('Not a vobix content, or an unsupported '
+                                 'version of the format')
+        self._buffer = buffer
+        index_position = _TRAILER.unpack_from(
+            buffer, size - len(MAGIC) - _TRAILER.size)[0]
+        (self._string_count, self._strings_position, self._blob_position,
+         self._namespace_count, self._namespaces_position,
+         self._qualified_name_count, self._qualified_names_position,
+         self.bundle_count, bundles_position) = \
+            _HEADER.unpack_from(buffer, index_position)
+        self._bundles = [
+            _BUNDLE.unpack_from(buffer, bundles_position + _BUNDLE.size * i)
+            for i in range(self.bundle_count)
+        ]
+        self._strings = dict()
+        self._namespaces = dict()
+        self._qualified_names = dict()
+
+    def string(self, index):
+        try:
+            return self._strings[index]
+        except KeyError:
+            start, end = struct.unpack_from(
+                '<2Q', self._buffer,
+                self._strings_position + _OFFSET.size * index)
+            start += self._blob_position
+            text = self._strings[index] = \
+                bytes(self._buffer[start:self._blob_position + end]
+                      ).decode('utf-8')
+            return text
+
+    def namespace(self, index):
+        try:
+            return self._namespaces[index]
+        except KeyError:
+            prefix, uri = _PAIR.unpack_from(
+                self._buffer, self._namespaces_position + _PAIR.size * index)
+            namespace = self._namespaces[index] = \
+                Namespace(self.string(prefix), self.string(uri))
+            return namespace
+
+    def qualified_name(self, index):
+        """Returns the qualified name of an index of the table, + 1, or None for 0."""
+        if index == 0:
+            return None
+        try:
+            return self._qualified_names[index]
+        except KeyError:
+            namespace, localpart = _PAIR.unpack_from(
+                self._buffer,
+                self._qualified_names_position + _PAIR.size * (index - 1))
+            qualified_name = self._qualified_names[index] = \
+                self.namespace(namespace)[self.string(localpart)]
+            return qualified_name
+
+    def bundle_identifier(self, position):
+        """Returns the identifier of the bundle at a position, 0 being the document."""
+        return self.qualified_name(self._bundles[position][0])
+
+    def bundle_default_namespace(self, position):
+        default = self._bundles[position][1]
+        return self.string(default - 1) if default else None
+
+    def bundle_namespaces(self, position):
+        entry = self._bundles[position]
+        return [self.namespace(index) for index in
+                struct.unpack_from('<%dI' % entry[3], self._buffer, entry[2])]
+
+    def record_count(self, position):
+        return self._bundles[position][5]
+
+    def record_codes(self, position):
+        """Returns the record type codes of a bundle, 0 being a type missing from :py:const:`RECORD_TYPES`."""
+        entry = self._bundles[position]
+        return struct.unpack_from('<%dH' % entry[5], self._buffer, entry[6])
+
+    def find(self, position, uri):
+        """
+        Returns the indexes of the records of a bundle having the given
+        identifier, in the order of the records.
+
+        :param position: The position of the bundle, 0 being the document.
+        :param uri: The URI of the identifier.
+        """
+        entry = self._bundles[position]
+        identifiers = _SortedIdentifiers(self, entry[7], entry[8])
+        low = bisect.bisect_left(identifiers, uri)
+        indexes = []
+        for i in range(low, entry[8]):
+            if identifiers[i] != uri:
+                break
+            indexes.append(identifiers.record_index(i))
+        return indexes
+
+    def record(self, position, record_index):
+        """
+        Decodes a record of a bundle.
+
+        :param position: The position of the bundle, 0 being the document.
+        :param record_index: The position of the record in the bundle.
+        :return: The (type, identifier, attributes) of the record, the
+            attributes being a list of (qualified name, value).
+        """
+        entry = self._bundles[position]
+        if not 0 <= record_index < entry[5]:
+            raise IndexError('record index out of range')
+        start, end = struct.unpack_from(
+            '<2Q', self._buffer, entry[4] + _OFFSET.size * record_index)
+        reader = _IndexedReader(self, io.BytesIO(self._buffer[start:end]))
+        code = reader.varint()
+        if code == 0:
+            rec_type = reader.qualified_name()
+        else:
+            try:
+                rec_type = RECORD_TYPES[code - 1]
+            except IndexError:
+                raise VOBinException('Unknown record type code %d' % code)
+        identifier = reader.qualified_name()
+        attributes = [(reader.qualified_name(), reader.value())
+                      for _ in range(reader.varint())]
+        return rec_type, identifier, attributes
+
+
+class _SortedIdentifiers(object):
+    """Sequence of the sorted identifier URIs of a bundle, for the bisect module."""
+
+    def __init__(self, index, position, count):
+        self._index = index
+        self._position = position
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        qualified_name = _PAIR.unpack_from(
+            self._index._buffer, self._position + _PAIR.size * i)[0]
+        return six.text_type(self._index.qualified_name(qualified_name).uri)
+
+    def record_index(self, i):
+        return _PAIR.unpack_from(
+            self._index._buffer, self._position + _PAIR.size * i)[1]
+
+
+class _IndexedWriter(_Writer):
+    """Writer of the vobix records, referring to the strings, namespaces and qualified names by their index only."""
+
+    def __init__(self, stream):
+        super(_IndexedWriter, self).__init__(stream)
+        self._written = 0
+        self.strings = []
+        self.namespaces = []
+        self.qualified_names = []
+
+    def flush(self):
+        self._written += len(self._buffer)
+        super(_IndexedWriter, self).flush()
+
+    def tell(self):
+        return self._written + len(self._buffer)
+
+    def string_index(self, text):
+        index = self._strings.get(text)
+        if index is None:
+            index = self._strings[text] = len(self.strings)
+            self.strings.append(text)
+        return index
+
+    def namespace_index(self, namespace):
+        key = (namespace.prefix, namespace.uri)
+        index = self._namespaces.get(key)
+        if index is None:
+            index = self._namespaces[key] = len(self.namespaces)
+            self.namespaces.append((self.string_index(namespace.prefix),
+                                    self.string_index(namespace.uri)))
+        return index
+
+    def qualified_name_index(self, qualified_name):
+        """Returns the index of a qualified name in the table + 1, or 0 for None."""
+        if qualified_name is None:
+            return 0
+        namespace = qualified_name.namespace
+        key = (namespace.prefix, namespace.uri, qualified_name.localpart)
+        index = self._qualified_names.get(key)
+        if index is None:
+            index = self._qualified_names[key] = len(self.qualified_names)
+            self.qualified_names.append(
+                (self.namespace_index(namespace),
+                 self.string_index(qualified_name.localpart)))
+        return index + 1
+
+    def string(self, text):
+        self.varint(self.string_index(text))
+
+    def namespace(self, namespace):
+        self.varint(self.namespace_index(namespace))
+
+    def qualified_name(self, qualified_name):
+        self.varint(self.qualified_name_index(qualified_name))
+
+
+class _IndexedReader(_Reader):
+    """Reader of one vobix record, resolving the strings, namespaces and qualified names through the index."""
+
+    def __init__(self, index, stream):
+        super(_IndexedReader, self).__init__(stream)
+        self._index = index
+
+    def string(self):
+        return self._index.string(self.varint())
+
+    def namespace(self):
+        return self._index.namespace(self.varint())
+
+    def qualified_name(self):
+        return self._index.qualified_name(self.varint())
@@ -2,8 +2,12 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import codecs
+import operator
+
 from prov.serializers.provxml import *
 from voprov.models.constants import *
+from voprov.serializers.encoding import RecordEncoding
 
 # Create a dictionary containing all top-level PROV XML elements for an easy
 # mapping.
@@ -12,12 +16,46 @@ FULL_NAMES_MAP.update(ADDITIONAL_N_MAP)
 # Inverse mapping.
 FULL_PROV_RECORD_IDS_MAP = dict((FULL_NAMES_MAP[rec_type_id], rec_type_id) for
                                 rec_type_id in FULL_NAMES_MAP)
+# Namespaces of the record elements accepted when deserializing.
+_RECORD_NAMESPACES = (VOPROV.uri, PROV.uri)
+
+# To enable a mapping of Python types to XML and back, the XSD type must be
+# written for these types. Add long and int on Python 2, only int on
+# Python 3.
+_ALWAYS_CHECK = (bool, datetime.datetime, float,
+                 prov.identifier.Identifier) + tuple(six.integer_types)
+_INTERNATIONALIZED_STRING = PROV["InternationalizedString"]
+_XSD_BOOLEAN = six.text_type(XSD_BOOLEAN)
+_XSD_STRING = six.text_type(XSD_STRING)
+_XSD_DOUBLE = six.text_type(XSD_DOUBLE)
+_XSD_INT = six.text_type(XSD_INT)
+_XSD_DATETIME = six.text_type(XSD_DATETIME)
+_XSD_ANYURI = six.text_type(XSD_ANYURI)
+_sort_key = operator.itemgetter(0, 1, 2)
+
+# Tags of the elements and attributes, by namespace and local name, and of
+# those of the voprov and xsi namespaces by local name.
+_TAGS = dict()
+_PROV_TAGS = dict()
+_XSI_TAGS = dict()
 
 
 class VOProvXMLSerializer(ProvXMLSerializer):
     """PROV-XML serializer for :class:`~voprov.models.model.VOProvDocument`
     """
-    def serialize(self, stream, force_types=False, **kwargs):
+    def __init__(self, document=None):
+        """
+        Constructor.
+
+        :param document: Document to serialize.
+        """
+        super(VOProvXMLSerializer, self).__init__(document)
+        self._document_nsmap = None
+        self._default_nsmap = None
+        self._attribute_infos = dict()
+        self._ranks = dict()
+
+    def serialize(self, stream, force_types=False, streaming=False, **kwargs):
         """
         Serializes a :class:`~voprov.models.model.VOProvDocument` instance to `PROV-XML
         <http://www.w3.org/TR/prov-xml/>`_.
@@ -31,22 +69,62 @@ class VOProvXMLSerializer(ProvXMLSerializer):
             done in the official PROV-XML specification. Furthermore the
             types will always be set if the Python type requires it. False
             is a good default and it should rarely require changing.
+        :type streaming: boolean, optional
+        :param streaming: Write the records one at a time instead of building
+            the whole XML tree first, so that memory stays bounded by the
+            largest record. The elements and xsi:types written are the same.
+            Off by default.
         """
+        if streaming:
+            self.serialize_streaming(stream, force_types=force_types)
+            return
         xml_root = self.serialize_bundle(bundle=self.document,
                                          force_types=force_types)
         for bundle in self.document.bundles:
             self.serialize_bundle(bundle=bundle, element=xml_root,
                                   force_types=force_types)
-        # No encoding must be specified when writing to String object which
-        # does not have the concept of an encoding as it should already
-        # represent unicode code points.
-        et = etree.ElementTree(xml_root)
+        _write_tree(stream, xml_root)
+
+    def serialize_streaming(self, stream, force_types=False):
+        """
+        Serializes a :class:`~voprov.models.model.VOProvDocument` instance to
+        PROV-XML, writing each record to the stream as soon as it is
+        converted.
+
+        :param stream: Where to save the output, a text or binary stream.
+        :type force_types: boolean, optional
+        :param force_types: See :py:meth:`serialize`.
+        """
         if isinstance(stream, io.TextIOBase):
-            stream.write(etree.tostring(et, xml_declaration=True,
-                                        pretty_print=True).decode('utf-8'))
-        else:
-            et.write(stream, pretty_print=True, xml_declaration=True,
-                     encoding="UTF-8")
+            stream = _TextStreamWriter(stream)
+        with etree.xmlfile(stream, encoding="UTF-8") as xf:
+            xf.write_declaration()
+            with xf.element(_ns_prov("document"),
+                            nsmap=self._bundle_nsmap(self.document)):
+                self._stream_records(xf, self.document, force_types, 1)
+                for bundle in self.document.bundles:
+                    xf.write("\n  ")
+                    attrs = {_ns_prov("id"): six.text_type(
+                        bundle.identifier)} if bundle.identifier else {}
+                    with xf.element(_ns_prov("bundleContent"), attrs,
+                                    nsmap=self._bundle_nsmap(bundle)):
+                        self._stream_records(xf, bundle, force_types, 2)
+                        xf.write("\n  ")
+                xf.write("\n")
+
+    def _stream_records(self, xf, bundle, force_types, level):
+        """
+        Writes the records of a bundle or document to an open
+        :py:func:`lxml.etree.xmlfile`.
+
+        :param xf: The xmlfile context to write to.
+        :param bundle: The bundle or document.
+        :param force_types: See :py:meth:`serialize`.
+        :param level: Indentation level of the records.
+        """
+        for record in bundle._records:
+            _stream_record(xf, self._record_elements(record, force_types),
+                           level)
 
     def serialize_bundle(self, bundle, element=None, force_types=False):
         """
@@ -63,23 +141,20 @@ class VOProvXMLSerializer(ProvXMLSerializer):
             types will always be set if the Python type requires it. False
             is a good default and it should rarely require changing.
         """
-        # Build the namespace map for lxml and attach it to the root XML
-        # element. No dictionary comprehension in Python 2.6!
-        nsmap = dict((ns.prefix, ns.uri) for ns in
-                     self.document._namespaces.get_registered_namespaces())
-        if self.document._namespaces._default:
-            nsmap[None] = self.document._namespaces._default.uri
-        for namespace in bundle.namespaces:
-            if namespace not in nsmap:
-                nsmap[namespace.prefix] = namespace.uri
+        xml_bundle_root = self._bundle_element(bundle, element)
+        for record in bundle._records:
+            _add_record_element(xml_bundle_root,
+                                self._record_elements(record, force_types))
+        return xml_bundle_root
 
-        for key, value in DEFAULT_NAMESPACES.items():
-            uri = value.uri
-            if value.prefix == "xsd":
-                # The XSD namespace for some reason has no hash at the end
-                # for PROV XML, but for all other serializations it does.
-                uri = uri.rstrip("#")
-            nsmap[value.prefix] = uri
+    def _bundle_element(self, bundle, element=None):
+        """
+        Creates the XML element of a bundle or document, without its records.
+
+        :param bundle: The bundle or document.
+        :param element: The XML element of the document, for a bundle.
+        """
+        nsmap = self._bundle_nsmap(bundle)
 
         if element is not None:
             xml_bundle_root = etree.SubElement(
@@ -90,102 +165,289 @@ class VOProvXMLSerializer(ProvXMLSerializer):
         if bundle.identifier:
             xml_bundle_root.attrib[_ns_prov("id")] = \
                 six.text_type(bundle.identifier)
+        return xml_bundle_root
 
-        for record in bundle._records:
-            rec_type = record.get_type()
-            identifier = six.text_type(record._identifier) \
-                if record._identifier else None
+    def _bundle_nsmap(self, bundle):
+        """
+        Builds the namespace map for lxml of a bundle or document, the part
+        common to all the bundles being built once per document.
+
+        :param bundle: The bundle or document.
+        """
+        if bundle is self.document or self._document_nsmap is None:
+            # Build the namespace map for lxml and attach it to the root XML
+            # element. No dictionary comprehension in Python 2.6!
+            nsmap = dict((ns.prefix, ns.uri) for ns in
+                         self.document._namespaces.get_registered_namespaces())
+            if self.document._namespaces._default:
+                nsmap[None] = self.document._namespaces._default.uri
+            self._document_nsmap = nsmap
+            default_nsmap = []
+            for key, value in DEFAULT_NAMESPACES.items():
+                uri = value.uri
+                if value.prefix == "xsd":
+                    # The XSD namespace for some reason has no hash at the end
+                    # for PROV XML, but for all other serializations it does.
+                    uri = uri.rstrip("#")
+                default_nsmap.append((value.prefix, uri))
+            self._default_nsmap = default_nsmap
+
+        nsmap = dict(self._document_nsmap)
+        for namespace in bundle.namespaces:
+            if namespace not in nsmap:
+                nsmap[namespace.prefix] = namespace.uri
+        for prefix, uri in self._default_nsmap:
+            nsmap[prefix] = uri
+        return nsmap
+
+    def _record_elements(self, record, force_types=False):
+        """
+        Converts a record to the description of its PROV XML element.
+
+        What only depends on the attribute names, i.e. their tags, their
+        position in the element and which xsi:type rules apply to them, is
+        computed once per attribute, see :py:meth:`_attribute_info`.
+
+        :param record: The record to convert.
+        :param force_types: See :py:meth:`serialize`.
+        :return: Tuple (tag, attributes, children) with the attributes a
+            dictionary or None, and children a list of tuples (tag, list of
+            (attribute, value) pairs, text) for the record's attributes.
+        """
+        encoding = RecordEncoding(record)
+        rec_type = encoding.rec_type
+        identifier = encoding.identifier
+
+        if identifier:
+            attrs = {_ns_prov("id"): identifier}
+        else:
+            attrs = None
+
+        # Derive the record label from its attributes which is sometimes
+        # needed, only records having a voprov:type being specialized.
+        attributes = encoding.attributes
+        for attr, values in encoding.values:
+            if attr._uri == VOPROV_TYPE._uri:
+                attributes = list(attributes)
+                rec_label = self._derive_record_label(rec_type, attributes)
+                break
+        else:
+            rec_label = FULL_NAMES_MAP[rec_type]
 
-            if identifier:
-                attrs = {_ns_prov("id"): identifier}
+        # The order of sorted_attributes(): the formal attributes, label,
+        # location, role, type and value, then the other attributes, each
+        # group sorted by name and value.
+        ranks, other_rank = self._attribute_ranks(rec_type)
+        sorted_items = []
+        for attr, value in attributes:
+            info = self._attribute_info(attr)
+            sorted_items.append((
+                ranks.get(attr._uri, other_rank), info.name,
+                six.text_type(value.value if hasattr(value, "value")
+                              else value), info, value))
+        if len(sorted_items) > 1:
+            sorted_items.sort(key=_sort_key)
+
+        xsi_type = _ns_xsi("type")
+        children = []
+        for _rank, _name, _text, info, value in sorted_items:
+            subattrs = []
+            has_xsi_type = False
+            value_type = type(value)
+            if isinstance(value, prov.model.Literal):
+                if value.datatype is not None and \
+                        value.datatype != _INTERNATIONALIZED_STRING:
+                    subattrs.append((xsi_type, "%s:%s" % (
+                        value.datatype.namespace.prefix,
+                        value.datatype.localpart)))
+                    has_xsi_type = True
+                if value.langtag is not None:
+                    subattrs.append((_ns_xml("lang"), value.langtag))
+                v = value.value
+                # A literal is written as "value" %% datatype, never
+                # starting with voprov:.
+                voprov_value = False
             else:
-                attrs = None
-
-            # Derive the record label from its attributes which is sometimes
-            # needed.
-            attributes = list(record.attributes)
-            rec_label = self._derive_record_label(rec_type, attributes)
-
-            elem = etree.SubElement(xml_bundle_root,
-                                    _ns_prov(rec_label), attrs)
-
-            for attr, value in sorted_attributes(rec_type, attributes):
-                subelem = etree.SubElement(
-                    elem, _ns(attr.namespace.uri, attr.localpart))
-                if isinstance(value, prov.model.Literal):
-                    if value.datatype not in \
-                            [None, PROV["InternationalizedString"]]:
-                        subelem.attrib[_ns_xsi("type")] = "%s:%s" % (
-                            value.datatype.namespace.prefix,
-                            value.datatype.localpart)
-                    if value.langtag is not None:
-                        subelem.attrib[_ns_xml("lang")] = value.langtag
-                    v = value.value
-                elif isinstance(value, prov.model.QualifiedName):
-                    if attr not in PROV_ATTRIBUTE_QNAMES:
-                        subelem.attrib[_ns_xsi("type")] = "xsd:QName"
+                if isinstance(value, prov.model.QualifiedName):
+                    if not info.is_qname:
+                        subattrs.append((xsi_type, "xsd:QName"))
+                        has_xsi_type = True
                     v = six.text_type(value)
-                elif isinstance(value, datetime.datetime):
-                    v = value.isoformat()
                 else:
-                    v = six.text_type(value)
+                    v = encoding.text(value)
+                # The text of a datetime is written in ISO format, neither
+                # of them starting with voprov:.
+                voprov_value = v.startswith("voprov:")
 
-                # xsd type inference.
-                #
-                # This is a bit messy and there are all kinds of special
-                # rules but it appears to get the job done.
-                #
-                # If it is a type element and does not yet have an
-                # associated xsi type, try to infer it from the value.
-                # The not startswith("prov:") check is a little bit hacky to
-                # avoid type interference when the type is a standard prov
-                # type.
-                #
-                # To enable a mapping of Python types to XML and back,
-                # the XSD type must be written for these types.
-                ALWAYS_CHECK = [bool, datetime.datetime, float,
-                                prov.identifier.Identifier]
-                # Add long and int on Python 2, only int on Python 3.
-                ALWAYS_CHECK.extend(six.integer_types)
-                ALWAYS_CHECK = tuple(ALWAYS_CHECK)
-                if (force_types or
-                        type(value) in ALWAYS_CHECK or
-                        attr in [PROV_TYPE, PROV_LOCATION, PROV_VALUE]) and \
-                        _ns_xsi("type") not in subelem.attrib and \
-                        not six.text_type(value).startswith("voprov:") and \
-                        not (attr in PROV_ATTRIBUTE_QNAMES and v) and \
-                        attr not in [PROV_ATTR_TIME, PROV_LABEL]:
-                    xsd_type = None
-                    if isinstance(value, bool):
-                        xsd_type = XSD_BOOLEAN
-                        v = v.lower()
-                    elif isinstance(value, six.string_types):
-                        xsd_type = XSD_STRING
-                    elif isinstance(value, float):
-                        xsd_type = XSD_DOUBLE
-                    elif isinstance(value, six.integer_types):
-                        xsd_type = XSD_INT
-                    elif isinstance(value, datetime.datetime):
-                        # Exception of the exception, while technically
-                        # still correct, do not write XSD dateTime type for
-                        # attributes in the PROV namespaces as the type is
-                        # already declared in the XSD and PROV XML also does
-                        # not specify it in the docs.
-                        if attr.namespace.prefix != "prov" \
-                                or "time" not in attr.localpart.lower():
-                            xsd_type = XSD_DATETIME
-                    elif isinstance(value, prov.identifier.Identifier):
-                        xsd_type = XSD_ANYURI
-
-                    if xsd_type is not None:
-                        subelem.attrib[_ns_xsi("type")] = \
-                            six.text_type(xsd_type)
-
-                if attr in PROV_ATTRIBUTE_QNAMES and v:
-                    subelem.attrib[_ns_prov("ref")] = v
-                else:
-                    subelem.text = v
-        return xml_bundle_root
+            # xsd type inference.
+            #
+            # This is a bit messy and there are all kinds of special
+            # rules but it appears to get the job done.
+            #
+            # If it is a type element and does not yet have an
+            # associated xsi type, try to infer it from the value.
+            # The not startswith("prov:") check is a little bit hacky to
+            # avoid type interference when the type is a standard prov
+            # type.
+            #
+            # To enable a mapping of Python types to XML and back,
+            # the XSD type must be written for these types.
+            if (force_types or value_type in _ALWAYS_CHECK or
+                    info.always_typed) and \
+                    not has_xsi_type and \
+                    not voprov_value and \
+                    not (info.is_qname and v) and \
+                    not info.never_typed:
+                xsd_type = None
+                if isinstance(value, bool):
+                    xsd_type = _XSD_BOOLEAN
+                    v = v.lower()
+                elif isinstance(value, six.string_types):
+                    xsd_type = _XSD_STRING
+                elif isinstance(value, float):
+                    xsd_type = _XSD_DOUBLE
+                elif isinstance(value, six.integer_types):
+                    xsd_type = _XSD_INT
+                elif isinstance(value, datetime.datetime):
+                    # Exception of the exception, while technically
+                    # still correct, do not write XSD dateTime type for
+                    # attributes in the PROV namespaces as the type is
+                    # already declared in the XSD and PROV XML also does
+                    # not specify it in the docs.
+                    if info.datetime_typed:
+                        xsd_type = _XSD_DATETIME
+                elif isinstance(value, prov.identifier.Identifier):
+                    xsd_type = _XSD_ANYURI
+
+                if xsd_type is not None:
+                    subattrs.append((xsi_type, xsd_type))
+
+            if info.is_qname and v:
+                subattrs.append((_ns_prov("ref"), v))
+                children.append((info.tag, subattrs, None))
+            else:
+                children.append((info.tag, subattrs, v))
+        return _ns_prov(rec_label), attrs, children
+
+    def _attribute_info(self, attr):
+        """
+        Returns the :py:class:`_AttributeInfo` of an attribute, computed on
+        its first use by the serializer.
+        """
+        info = self._attribute_infos.get(id(attr))
+        # The attribute is kept by its info, its id cannot be reused.
+        if info is None or info.attr is not attr:
+            info = self._attribute_infos[id(attr)] = _AttributeInfo(attr)
+        return info
+
+    def _attribute_ranks(self, rec_type):
+        """
+        Returns the ranks of the attributes sorted first in the elements of a
+        record type, like :py:func:`prov.model.sorted_attributes`, by URI,
+        and the rank of the other attributes.
+        """
+        if rec_type in self._ranks:
+            return self._ranks[rec_type]
+        order = list(prov.model.PROV_REC_CLS[rec_type].FORMAL_ATTRIBUTES)
+        order.extend([PROV_LABEL, PROV_LOCATION, PROV_ROLE, PROV_TYPE,
+                      PROV_VALUE])
+        ranks = dict()
+        for rank, attr in enumerate(order):
+            ranks.setdefault(attr.uri, rank)
+        self._ranks[rec_type] = ranks, len(order)
+        return self._ranks[rec_type]
+
+    def deserialize(self, stream, **kwargs):
+        """
+        Deserialize from `PROV-XML <http://www.w3.org/TR/prov-xml/>`_
+        representation to a :class:`~voprov.models.model.VOProvDocument`
+        instance.
+
+        The input is parsed incrementally: each record is created as soon as
+        its element is complete and the element is then discarded, so memory
+        does not grow with the size of the input.
+
+        :param stream: Input data, a text or binary stream.
+        """
+        # Imported here as the model imports the serializers.
+        from voprov.models.model import VOProvDocument
+
+        if isinstance(stream, io.TextIOBase):
+            stream = _TextStreamReader(stream)
+
+        document = VOProvDocument()
+        bundle = document
+        depth = 0
+        for event, element in etree.iterparse(
+                stream, events=("start", "end"), remove_comments=True,
+                huge_tree=True):
+            if event == "start":
+                if depth == 0:
+                    _add_namespaces(document, element.nsmap)
+                elif depth == 1 and element.tag == _ns_prov("bundleContent"):
+                    bundle = document.bundle(
+                        identifier=_element_identifier(element))
+                    # lxml's nsmap includes the namespaces inherited from the document element.
+                    inherited = element.getparent().nsmap
+                    _add_namespaces(bundle, dict(
+                        (prefix, uri) for prefix, uri in element.nsmap.items()
+                        if inherited.get(prefix) != uri))
+                depth += 1
+                continue
+
+            depth -= 1
+            record_depth = 1 if bundle is document else 2
+            if depth == 1 and element.tag == _ns_prov("bundleContent"):
+                bundle = document
+            elif depth == record_depth:
+                self.deserialize_record(element, bundle)
+            else:
+                continue
+            # Free the processed elements.
+            element.clear()
+            parent = element.getparent()
+            while element.getprevious() is not None:
+                del parent[0]
+        return document
+
+    def deserialize_record(self, element, bundle):
+        """
+        Creates the record described by a PROV-XML element in a bundle or
+        document, using the VOProv record classes.
+
+        :param element: The etree element of the record.
+        :param bundle: The bundle or document to add the record to.
+        :return: The new record, or None if the element was ignored.
+        """
+        qname = etree.QName(element)
+        if qname.namespace not in _RECORD_NAMESPACES:
+            raise ProvXMLException("Non PROV element discovered in "
+                                   "document or bundle.")
+        # Ignore the <voprov:other> element storing non-PROV information.
+        if qname.localname == "other":
+            warnings.warn(
+                "Document contains non-PROV information in "
+                "<voprov:other>. It will be ignored in this package.",
+                UserWarning)
+            return None
+
+        attributes = _extract_attributes(element)
+
+        # Map the record type to its base type.
+        q_prov_name = FULL_PROV_RECORD_IDS_MAP[qname.localname]
+        rec_type = PROV_BASE_CLS[q_prov_name]
+        if rec_type != q_prov_name:
+            # Keep the subtype the way serialize_bundle() expects it.
+            attributes.append((VOPROV_TYPE, q_prov_name))
+
+        if _ns_xsi("type") in element.attrib:
+            value = xml_qname_to_QualifiedName(
+                element, element.attrib[_ns_xsi("type")]
+            )
+            attributes.append((PROV["type"], value))
+
+        return bundle.new_record(rec_type, _element_identifier(element),
+                                 attributes)
 
     def _derive_record_label(self, rec_type, attributes):
         """
@@ -210,16 +472,195 @@ class VOProvXMLSerializer(ProvXMLSerializer):
         return rec_label
 
 
+class _AttributeInfo(object):
+    """What the PROV-XML element of an attribute depends on, apart from its value."""
+    __slots__ = ('attr', 'name', 'tag', 'is_qname', 'always_typed',
+                 'never_typed', 'datetime_typed')
+
+    def __init__(self, attr):
+        self.attr = attr
+        self.name = six.text_type(attr)
+        self.tag = _ns(attr.namespace.uri, attr.localpart)
+        self.is_qname = attr in PROV_ATTRIBUTE_QNAMES
+        # Attributes whose xsd type is inferred whatever their value.
+        self.always_typed = attr in [PROV_TYPE, PROV_LOCATION, PROV_VALUE]
+        self.never_typed = attr in [PROV_ATTR_TIME, PROV_LABEL]
+        self.datetime_typed = attr.namespace.prefix != "prov" \
+            or "time" not in attr.localpart.lower()
+
+
+def _write_tree(stream, xml_root):
+    """Writes an XML tree to a text or binary stream."""
+    # No encoding must be specified when writing to String object which
+    # does not have the concept of an encoding as it should already
+    # represent unicode code points.
+    et = etree.ElementTree(xml_root)
+    if isinstance(stream, io.TextIOBase):
+        stream.write(etree.tostring(et, xml_declaration=True,
+                                    pretty_print=True).decode('utf-8'))
+    else:
+        et.write(stream, pretty_print=True, xml_declaration=True,
+                 encoding="UTF-8")
+
+
+class _TextStreamWriter(object):
+    """Binary file-like object decoding the UTF-8 written to it into a text stream."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def write(self, data):
+        self._stream.write(self._decoder.decode(data))
+
+    def flush(self):
+        self._stream.write(self._decoder.decode(b"", final=True))
+        self._stream.flush()
+
+
+class _TextStreamReader(object):
+    """Binary file-like object encoding to UTF-8 the text read from a text stream."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def read(self, size=-1):
+        return self._stream.read(size).encode("utf-8")
+
+
+def _stream_record(xf, record_elements, level):
+    """
+    Writes a record described by :py:meth:`VOProvXMLSerializer._record_elements`
+    to an open :py:func:`lxml.etree.xmlfile`.
+    """
+    rec_tag, rec_attrs, children = record_elements
+    indent = "\n" + "  " * level
+    sub_indent = indent + "  "
+    xf.write(indent)
+    with xf.element(rec_tag, rec_attrs or {}):
+        for tag, attrs, text in children:
+            xf.write(sub_indent)
+            # lxml's xmlfile maps the XML namespace to a new prefix
+            # instead of the reserved xml: one.
+            attrs = dict(("xml:lang" if key == _ns_xml("lang")
+                          else key, value) for key, value in attrs)
+            with xf.element(tag, attrs):
+                if text:
+                    xf.write(text)
+        if children:
+            xf.write(indent)
+
+
+def _add_record_element(parent, record_elements):
+    """
+    Adds the element of a record described by
+    :py:meth:`VOProvXMLSerializer._record_elements` to a bundle element.
+    """
+    rec_tag, rec_attrs, children = record_elements
+    elem = etree.SubElement(parent, rec_tag, rec_attrs)
+    for tag, attrs, text in children:
+        subelem = etree.SubElement(elem, tag)
+        for key, value in attrs:
+            subelem.attrib[key] = value
+        subelem.text = text
+
+
+def _add_namespaces(bundle, nsmap):
+    """
+    Registers in a bundle the namespaces declared on its XML element, except
+    for the default ones and those already in its document.
+
+    :param bundle: The bundle or document.
+    :param nsmap: The namespaces declared on the etree element, by prefix.
+    """
+    document = bundle.document
+    for prefix, uri in nsmap.items():
+        if prefix is None:
+            bundle.set_default_namespace(uri)
+        elif prefix not in DEFAULT_NAMESPACES and \
+                prefix not in bundle._namespaces and \
+                (document is None or prefix not in document._namespaces):
+            bundle.add_namespace(prefix, uri)
+
+
+def _element_identifier(element):
+    """
+    Returns the qualified name in the id attribute of an element, if any.
+
+    :param element: The lxml.etree.Element instance.
+    """
+    rec_id = element.attrib.get(_ns_prov("id"))
+    if rec_id is not None:
+        # Try to make a qualified name out of it!
+        rec_id = xml_qname_to_QualifiedName(element, rec_id)
+    return rec_id
+
+
+def _extract_attributes(element):
+    """
+    Extract the PROV attributes from an etree element.
+
+    :param element: The lxml.etree.Element instance.
+    """
+    attributes = []
+    for subel in element:
+        sqname = etree.QName(subel)
+        _t = xml_qname_to_QualifiedName(
+            subel, "%s:%s" % (subel.prefix, sqname.localname)
+        )
+
+        for key, value in subel.attrib.items():
+            if key == _ns_xsi("type"):
+                datatype = xml_qname_to_QualifiedName(subel, value)
+                if datatype == XSD_QNAME:
+                    _v = xml_qname_to_QualifiedName(subel, subel.text)
+                elif _t in PROV_ATTRIBUTE_LITERALS:
+                    # Times are parsed by the record itself.
+                    _v = subel.text
+                else:
+                    _v = prov.model.Literal(subel.text, datatype)
+            elif key == _ns_prov("ref"):
+                _v = xml_qname_to_QualifiedName(subel, value)
+            elif key == _ns_xml("lang"):
+                _v = prov.model.Literal(subel.text, langtag=value)
+            else:
+                warnings.warn(
+                    "The element '%s' contains an attribute %s='%s' "
+                    "which is not representable in the prov module's "
+                    "internal data model and will thus be ignored." %
+                    (_t, six.text_type(key), six.text_type(value)),
+                    UserWarning)
+
+        if not subel.attrib:
+            _v = subel.text
+
+        attributes.append((_t, _v))
+
+    return attributes
+
+
 def _ns(ns, tag):
-    return "{%s}%s" % (ns, tag)
+    try:
+        return _TAGS[ns, tag]
+    except KeyError:
+        _TAGS[ns, tag] = "{%s}%s" % (ns, tag)
+        return _TAGS[ns, tag]
 
 
 def _ns_prov(tag):
-    return _ns(DEFAULT_NAMESPACES['voprov'].uri, tag)
+    try:
+        return _PROV_TAGS[tag]
+    except KeyError:
+        _PROV_TAGS[tag] = _ns(DEFAULT_NAMESPACES['voprov'].uri, tag)
+        return _PROV_TAGS[tag]
 
 
 def _ns_xsi(tag):
-    return _ns(DEFAULT_NAMESPACES['xsi'].uri, tag)
+    try:
+        return _XSI_TAGS[tag]
+    except KeyError:
+        _XSI_TAGS[tag] = _ns(DEFAULT_NAMESPACES['xsi'].uri, tag)
+        return _XSI_TAGS[tag]
 
 
 def _ns_xml(tag):